@@ -0,0 +1,149 @@
+"""Admission control: per-route concurrency caps and token-bucket rate limits"""
+
+import math
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from metrics import admission_rejections_total
+from config import (
+    logger,
+    ADMISSION_CONTROL_ENABLED,
+    ADMISSION_RETRY_AFTER_SECONDS,
+    ADMISSION_LIMITS
+)
+
+
+class TokenBucket:
+    """`rate` tokens por segundo con capacidad `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume un token; retorna 0 si lo había o los segundos hasta el siguiente"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RouteLimiter:
+    """Límites de una ruta; todo ocurre en el event loop, sin locks"""
+
+    def __init__(self, route: str, max_concurrency: int, rate: float, burst: int):
+        self.route = route
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self.in_flight = 0
+        self._counters = {"admitted": 0, "rejected_concurrency": 0, "rejected_rate": 0}
+
+    def admit(self) -> Optional[int]:
+        """
+        Returns:
+            None si la petición entra, o los segundos de Retry-After si se rechaza
+        """
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            return self._reject("concurrency", ADMISSION_RETRY_AFTER_SECONDS)
+
+        if self.bucket is not None:
+            wait = self.bucket.take()
+            if wait > 0:
+                return self._reject("rate", math.ceil(wait))
+
+        self.in_flight += 1
+        self._counters["admitted"] += 1
+        return None
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "rate": self.bucket.rate if self.bucket else None,
+            "burst": self.bucket.capacity if self.bucket else None,
+            **self._counters
+        }
+
+    def _reject(self, reason: str, retry_after: int) -> int:
+        self._counters[f"rejected_{reason}"] += 1
+        admission_rejections_total.inc(route=self.route, reason=reason)
+        return max(1, retry_after)
+
+
+class AdmissionController:
+    """Limitadores por "MÉTODO /ruta" (rutas sin parámetros de path)"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, float, int]], enabled: bool = True):
+        self.enabled = enabled
+        self.limiters = {
+            route: RouteLimiter(route, max_concurrency, rate, burst)
+            for route, (max_concurrency, rate, burst) in limits.items()
+        }
+
+    def limiter_for(self, method: str, path: str) -> Optional[RouteLimiter]:
+        if not self.enabled:
+            return None
+        return self.limiters.get(f"{method} {path.rstrip('/') or '/'}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "routes": {route: limiter.stats() for route, limiter in self.limiters.items()}
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Middleware ASGI que aplica el control de admisión antes del routing:
+    las peticiones que exceden los límites reciben 429 con Retry-After sin
+    ocupar workers, conexiones a la BD ni cupos del LLM, y las admitidas
+    mantienen una latencia acotada.
+    """
+
+    def __init__(self, app: ASGIApp, controller: "AdmissionController"):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.controller.limiter_for(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = limiter.admit()
+        if retry_after is not None:
+            logger.warning(f"Admission rejected {limiter.route} (retry after {retry_after}s)")
+            response = JSONResponse(
+                status_code=429,
+                content={
+                    "error": f"Too many requests for {limiter.route}",
+                    "error_type": "AdmissionRejected",
+                    "detail": f"Retry after {retry_after} seconds"
+                },
+                headers={"Retry-After": str(retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+admission_controller = AdmissionController(ADMISSION_LIMITS, enabled=ADMISSION_CONTROL_ENABLED)
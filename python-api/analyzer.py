@@ -1,13 +1,47 @@
+import asyncio
+import hashlib
 import json
 import re
-from huggingface_hub import InferenceClient
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+from huggingface_hub import AsyncInferenceClient
 
-from models import TicketAnalysis
-from config import logger, HF_API_TOKEN, HF_MODEL_ID
+from models import (
+    AnalysisStage,
+    ClassificationResult,
+    TicketAnalysis,
+    TicketCategory,
+    TicketSentiment
+)
+from cache import AnalysisCache
+from config import (
+    logger,
+    ANALYZER_BACKEND,
+    LLM_RESILIENCE_ENABLED,
+    LLM_FALLBACK,
+    LLM_HEDGE_BACKEND,
+    LLM_HEDGE_MODEL_ID,
+    LLM_HEDGE_MAX_CONCURRENCY,
+    HF_API_TOKEN,
+    HF_MODEL_ID,
+    LLM_MAX_CONCURRENCY,
+    LLM_TIMEOUT_SECONDS,
+    LLM_STRUCTURED_OUTPUT,
+    LLM_MAX_TOKENS,
+    LLM_REPAIR_INVALID_OUTPUT,
+    LLM_PACK_SIZE,
+    LLM_PACK_MAX_CHARS,
+    ANALYSIS_CACHE_ENABLED,
+    ANALYSIS_CACHE_MAX_ENTRIES,
+    ANALYSIS_CACHE_TTL_SECONDS,
+    ANALYSIS_CACHE_PATH
+)
 from exceptions import LLMAnalysisError
+from metrics import LatencyTracker, llm_errors_total, llm_requests_total, span
 
 
-SYSTEM_PROMPT = """
+SYSTEM_PROMPT_HEADER = """
 You are an expert AI system specialized in classifying customer support tickets.
 
 Your task is to analyze a support ticket and return a STRICT JSON object that follows EXACTLY this schema:
@@ -24,7 +58,9 @@ Rules:
 - Do NOT include explanations, comments, or text outside the JSON.
 - The output MUST be valid JSON that can be parsed by a machine.
 
-Category definitions:
+"""
+
+CLASSIFICATION_GUIDE = """Category definitions:
 - Técnico: system errors, bugs, crashes, connection issues, access problems, app not working, performance issues.
 - Facturación: payments, invoices, charges, refunds, pricing, subscriptions, billing issues.
 - Comercial: product information, sales inquiries, quotes, plans, demos, general questions about services.
@@ -41,89 +77,708 @@ Confidence scale:
 - Below 0.5: highly uncertain (avoid unless strictly necessary)
 """
 
+SYSTEM_PROMPT = SYSTEM_PROMPT_HEADER + CLASSIFICATION_GUIDE
 
-def analyze_ticket(description: str) -> TicketAnalysis:
-    logger.info(f"Analyzing ticket with LLM: {description[:50]}...")
-    # Mensajes para API conversacional (chat)
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {
-            "role": "user",
-            "content": (
-                f"Ticket:\n\"\"\"{description}\"\"\"\n\n"
-                "Remember:\n"
-                "- Output ONLY valid JSON.\n"
-                "- No markdown.\n"
-                "- No text outside JSON."
-            ),
+# Con response_format el backend garantiza el formato: basta con las definiciones
+STRUCTURED_SYSTEM_PROMPT = (
+    "You classify customer support tickets. Reply with the JSON object only.\n\n"
+    + CLASSIFICATION_GUIDE
+)
+
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string", "enum": [category.value for category in TicketCategory]},
+        "sentiment": {"type": "string", "enum": [sentiment.value for sentiment in TicketSentiment]},
+        "confidence": {"type": "number", "minimum": 0, "maximum": 1}
+    },
+    "required": ["category", "sentiment", "confidence"],
+    "additionalProperties": False
+}
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "ticket_analysis", "schema": ANALYSIS_SCHEMA, "strict": True}
+}
+
+# El objeto es plano: la generación puede cortarse en la primera llave de cierre
+STOP_SEQUENCES = ["}"]
+
+# Varios tickets por llamada: el prompt de sistema se paga una vez por paquete
+PACKED_SYSTEM_PROMPT = (
+    "You classify several customer support tickets at once. Each ticket is preceded by its index, "
+    "like [0]. Reply with ONLY a JSON object of the form "
+    '{"results": [{"index": 0, "category": "...", "sentiment": "...", "confidence": 0.0}, ...]} '
+    "with exactly one entry per ticket.\n\n"
+    + CLASSIFICATION_GUIDE
+)
+
+PACKED_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "ticket_analyses",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer", "minimum": 0},
+                            **ANALYSIS_SCHEMA["properties"]
+                        },
+                        "required": ["index", *ANALYSIS_SCHEMA["required"]],
+                        "additionalProperties": False
+                    }
+                }
+            },
+            "required": ["results"],
+            "additionalProperties": False
         },
+        "strict": True
+    }
+}
+
+REPAIR_INSTRUCTION = (
+    "Your previous reply was not a valid JSON object for the required schema. "
+    "Reply again with ONLY the corrected JSON object."
+)
+
+# Versión del prompt: cambia automáticamente al editar SYSTEM_PROMPT
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT + STRUCTURED_SYSTEM_PROMPT + PACKED_SYSTEM_PROMPT).encode("utf-8")
+).hexdigest()[:12]
+
+# Caché de análisis por contenido (modelo + prompt forman parte de la clave)
+analysis_cache: Optional[AnalysisCache] = (
+    AnalysisCache(
+        namespace=f"{HF_MODEL_ID}:{PROMPT_VERSION}",
+        max_entries=ANALYSIS_CACHE_MAX_ENTRIES,
+        ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+        disk_path=ANALYSIS_CACHE_PATH or None
+    )
+    if ANALYSIS_CACHE_ENABLED
+    else None
+)
+
+
+# Modelos cuyo backend rechazó response_format: se les pide JSON solo por prompt
+_plain_json_models: Set[str] = set()
+
+
+def _client_key(client: Any) -> str:
+    # Por modelo: el rechazo es del endpoint, no de una instancia concreta del cliente
+    return str(getattr(client, "model", None) or id(client))
+
+
+def _uses_structured_output(client: Any) -> bool:
+    return LLM_STRUCTURED_OUTPUT and _client_key(client) not in _plain_json_models
+
+
+def _build_messages(
+    description: str,
+    invalid_reply: Optional[str] = None,
+    structured: bool = False
+) -> List[Dict[str, str]]:
+    """
+    Construye los mensajes de chat para clasificar un ticket.
+    Con `invalid_reply` añade la respuesta fallida y la petición de corregirla.
+    """
+    if structured:
+        messages = [
+            {"role": "system", "content": STRUCTURED_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Ticket:\n\"\"\"{description}\"\"\""},
+        ]
+    else:
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": (
+                    f"Ticket:\n\"\"\"{description}\"\"\"\n\n"
+                    "Remember:\n"
+                    "- Output ONLY valid JSON.\n"
+                    "- No markdown.\n"
+                    "- No text outside JSON."
+                ),
+            },
+        ]
+    if invalid_reply is not None:
+        messages.append({"role": "assistant", "content": invalid_reply})
+        messages.append({"role": "user", "content": REPAIR_INSTRUCTION})
+    return messages
+
+
+def _build_packed_messages(descriptions: Sequence[str]) -> List[Dict[str, str]]:
+    """Mensajes de chat para clasificar varios tickets en una sola llamada"""
+    tickets = "\n\n".join(
+        f"[{position}]\n\"\"\"{description}\"\"\"" for position, description in enumerate(descriptions)
+    )
+    return [
+        {"role": "system", "content": PACKED_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Tickets:\n{tickets}"},
     ]
 
-    # Inicializamos el cliente de Hugging Face una vez por llamada
-    try:
-        client = InferenceClient(model=HF_MODEL_ID, token=HF_API_TOKEN)
-        logger.info("Hugging Face client initialized")
-    except Exception as e:
-        logger.error(f"Failed to initialize HF client: {e}")
-        raise LLMAnalysisError("Failed to initialize LLM client")
 
+def _generation_options(packed: int = 0, structured: bool = False) -> Dict[str, Any]:
+    """
+    Parámetros de generación: presupuesto de tokens, stop y, si aplica, el esquema.
+    Con `packed` > 0 el presupuesto escala con el número de tickets del paquete.
+    """
+    if packed:
+        options: Dict[str, Any] = {"max_tokens": LLM_MAX_TOKENS * packed, "temperature": 0.2}
+        response_format = PACKED_RESPONSE_FORMAT
+    else:
+        options = {"max_tokens": LLM_MAX_TOKENS, "temperature": 0.2, "stop": STOP_SEQUENCES}
+        response_format = RESPONSE_FORMAT
+    if structured:
+        options["response_format"] = response_format
+    return options
+
+
+def _pack(items: Sequence[Tuple[int, str]]) -> List[List[Tuple[int, str]]]:
+    """
+    Agrupa (índice, descripción) en paquetes de hasta LLM_PACK_SIZE tickets
+    sin superar LLM_PACK_MAX_CHARS de descripción por paquete.
+    """
+    packs: List[List[Tuple[int, str]]] = []
+    current: List[Tuple[int, str]] = []
+    size = 0
+    for index, description in items:
+        if current and (len(current) >= LLM_PACK_SIZE or size + len(description) > LLM_PACK_MAX_CHARS):
+            packs.append(current)
+            current, size = [], 0
+        current.append((index, description))
+        size += len(description)
+    if current:
+        packs.append(current)
+    return packs
+
+
+def _rejects_response_format(error: Exception) -> bool:
+    """
+    Un 400/422 que menciona response_format o json_schema: el backend no
+    admite salida estructurada. Otros 400 (prompt demasiado largo, token
+    inválido) se tratan como errores normales.
+    """
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) not in (400, 422):
+        return False
     try:
-        completion = client.chat_completion(
-            messages=messages,
-            max_tokens=256,
-            temperature=0.2,
-        )
-        raw_text = completion.choices[0].message["content"].strip()
-        logger.info(f"Raw LLM output: {raw_text}")
-    except Exception as e:
-        logger.error(f"LLM request failed: {e}")
-        raise LLMAnalysisError(f"LLM service returned an error: {e}")
+        body = response.text
+    except Exception:
+        body = ""
+    detail = f"{error} {body}".lower()
+    return "response_format" in detail or "json_schema" in detail
+
+
+def _disable_structured_output(client: Any, error: Exception) -> None:
+    _plain_json_models.add(_client_key(client))
+    logger.warning(
+        f"LLM backend {_client_key(client)} rejected response_format ({error}); using prompt-only JSON"
+    )
 
+
+def _extract_json(raw_text: str) -> str:
+    """Normalizamos la salida del LLM para manejar casos con ```json``` o texto extra"""
+    cleaned_text = raw_text.strip()
+
+    # Quitar bloques de código tipo ```json ... ```
+    if cleaned_text.startswith("```"):
+        # Elimina la primera línea ```json o ```
+        cleaned_text = re.sub(r"^```[a-zA-Z]*\s*", "", cleaned_text)
+        # Corta en el siguiente ``` si existe
+        if "```" in cleaned_text:
+            cleaned_text = cleaned_text.split("```", 1)[0].strip()
+
+    # La secuencia de stop "}" puede quedar fuera del texto devuelto
+    if "{" in cleaned_text and "}" not in cleaned_text:
+        cleaned_text += "}"
+
+    # Si aún hay texto alrededor del JSON, extraer el primer bloque {...}
+    if not cleaned_text.startswith("{"):
+        start = cleaned_text.find("{")
+        end = cleaned_text.rfind("}")
+        if start != -1 and end != -1 and end > start:
+            cleaned_text = cleaned_text[start : end + 1]
+
+    return cleaned_text
+
+
+def _validate_analysis(data: Dict[str, Any]) -> TicketAnalysis:
+    """
+    Validación estricta de esquema de un objeto de análisis.
+
+    Raises:
+        ValueError, KeyError, TypeError: Si no cumple el esquema
+    """
+    if data.get("category") not in ["Técnico", "Facturación", "Comercial"]:
+        raise ValueError("Invalid category value")
+
+    if data.get("sentiment") not in ["Positivo", "Neutral", "Negativo"]:
+        raise ValueError("Invalid sentiment value")
+
+    confidence = float(data.get("confidence"))
+
+    if not (0.0 <= confidence <= 1.0):
+        raise ValueError("Confidence out of range")
+
+    return TicketAnalysis(
+        category=data["category"],
+        sentiment=data["sentiment"],
+        confidence=round(confidence, 2)
+    )
+
+
+def _parse_analysis(raw_text: str) -> TicketAnalysis:
+    """
+    Convierte la salida cruda del LLM en un TicketAnalysis validado.
+
+    Raises:
+        LLMAnalysisError: Si la salida no es JSON válido o no cumple el esquema
+    """
     try:
-        # Normalizamos la salida del LLM para manejar casos con ```json``` o texto extra
-        cleaned_text = raw_text.strip()
-
-        # Quitar bloques de código tipo ```json ... ```
-        if cleaned_text.startswith("```"):
-            # Elimina la primera línea ```json o ```
-            cleaned_text = re.sub(r"^```[a-zA-Z]*\s*", "", cleaned_text)
-            # Corta en el siguiente ``` si existe
-            if "```" in cleaned_text:
-                cleaned_text = cleaned_text.split("```", 1)[0].strip()
-
-        # Si aún hay texto alrededor del JSON, extraer el primer bloque {...}
-        if not cleaned_text.startswith("{"):
-            start = cleaned_text.find("{")
-            end = cleaned_text.rfind("}")
-            if start != -1 and end != -1 and end > start:
-                cleaned_text = cleaned_text[start : end + 1]
-
-        data = json.loads(cleaned_text)
-
-        # Validación estricta de esquema
-        if data.get("category") not in ["Técnico", "Facturación", "Comercial"]:
-            raise ValueError("Invalid category value")
-
-        if data.get("sentiment") not in ["Positivo", "Neutral", "Negativo"]:
-            raise ValueError("Invalid sentiment value")
-
-        confidence = float(data.get("confidence"))
-
-        if not (0.0 <= confidence <= 1.0):
-            raise ValueError("Confidence out of range")
-
-        result = TicketAnalysis(
-            category=data["category"],
-            sentiment=data["sentiment"],
-            confidence=round(confidence, 2)
-        )
+        result = _validate_analysis(json.loads(_extract_json(raw_text)))
 
         logger.info(
             f"Analysis complete: {result.category}, {result.sentiment}, confidence={result.confidence}"
         )
 
+        llm_requests_total.inc(outcome="ok")
         return result
 
-    except (json.JSONDecodeError, KeyError, ValueError) as e:
+    except (json.JSONDecodeError, AttributeError, KeyError, TypeError, ValueError) as e:
         logger.error(f"Invalid structured output from LLM. Raw: {raw_text}")
+        _record_llm_failure("invalid_output", "invalid_output")
         raise LLMAnalysisError("LLM returned invalid structured JSON")
+
+
+def _parse_packed_analyses(raw_text: str, count: int) -> Dict[int, TicketAnalysis]:
+    """
+    Resultados válidos de una respuesta empaquetada, por posición en el paquete.
+    Los elementos ausentes, repetidos o que no cumplen el esquema se omiten.
+    """
+    try:
+        items = json.loads(_extract_json(raw_text))["results"]
+    except (json.JSONDecodeError, KeyError, TypeError):
+        items = None
+
+    analyses: Dict[int, TicketAnalysis] = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            position = int(item["index"])
+            if 0 <= position < count and position not in analyses:
+                analyses[position] = _validate_analysis(item)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            continue
+
+    if len(analyses) == count:
+        llm_requests_total.inc(outcome="ok")
+    else:
+        logger.error(f"Packed LLM output valid for {len(analyses)}/{count} tickets. Raw: {raw_text}")
+        _record_llm_failure("invalid_output", "invalid_output")
+    return analyses
+
+
+def _record_llm_failure(outcome: str, error_type: str) -> None:
+    llm_requests_total.inc(outcome=outcome)
+    llm_errors_total.inc(type=error_type)
+
+
+# ============================
+# Cliente asíncrono compartido
+# ============================
+
+# Un único cliente por proceso: reutiliza la sesión HTTP (keep-alive) entre llamadas
+_async_client: Optional[AsyncInferenceClient] = None
+
+# Limita las llamadas simultáneas al modelo sin bloquear el event loop
+_llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+def get_async_client() -> AsyncInferenceClient:
+    """
+    Retorna el cliente asíncrono de Hugging Face, creándolo en el primer uso.
+
+    Raises:
+        LLMAnalysisError: Si falla la inicialización del cliente
+    """
+    global _async_client
+    if _async_client is None:
+        try:
+            _async_client = AsyncInferenceClient(
+                model=HF_MODEL_ID,
+                token=HF_API_TOKEN,
+                timeout=LLM_TIMEOUT_SECONDS
+            )
+            logger.info("Async Hugging Face client initialized")
+        except Exception as e:
+            logger.error(f"Failed to initialize async HF client: {e}")
+            raise LLMAnalysisError("Failed to initialize LLM client")
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Cierra el cliente asíncrono y libera sus conexiones"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+        logger.info("Async Hugging Face client closed")
+
+
+async def analyze_ticket_async(
+    description: str,
+    client: Optional[AsyncInferenceClient] = None,
+    semaphore: Optional[asyncio.Semaphore] = None,
+    latency: Optional[LatencyTracker] = None
+) -> TicketAnalysis:
+    """
+    Analiza un ticket con el LLM.
+
+    Usa el cliente compartido y espera un cupo del semáforo de concurrencia,
+    de modo que muchas peticiones pueden esperar al modelo a la vez sin
+    detener el resto de endpoints.
+
+    Con `client` (otro modelo, p. ej. el de hedge) no se usa la caché, que
+    pertenece al modelo principal; `semaphore` sustituye al cupo global.
+    `latency` recibe el tiempo de inferencia, medido desde que se obtiene
+    el cupo (una llamada cancelada cuenta como cota inferior).
+    """
+    cache = analysis_cache if client is None else None
+    if cache is not None:
+        cached = cache.get(description)
+        if cached is not None:
+            logger.info("Analysis served from cache")
+            return cached
+
+    logger.info(f"Analyzing ticket with LLM (async): {description[:50]}...")
+    client = client or get_async_client()
+    semaphore = semaphore or _llm_semaphore
+
+    # La espera por el semáforo se mide aparte del tiempo de inferencia
+    with span("llm_queue"):
+        await semaphore.acquire()
+    started = time.monotonic()
+    try:
+        raw_text = await _request_analysis_async(client, description)
+        try:
+            with span("llm_parse"):
+                result = _parse_analysis(raw_text)
+        except LLMAnalysisError:
+            if not LLM_REPAIR_INVALID_OUTPUT:
+                raise
+            # Un único reintento, en el mismo cupo del semáforo
+            logger.warning("Retrying LLM analysis with a repair prompt")
+            raw_text = await _request_analysis_async(client, description, raw_text, stage="llm_repair")
+            with span("llm_parse"):
+                result = _parse_analysis(raw_text)
+    finally:
+        semaphore.release()
+        if latency is not None:
+            latency.record(time.monotonic() - started)
+
+    if cache is not None:
+        cache.set(description, result)
+    return result
+
+
+async def _request_analysis_async(
+    client: AsyncInferenceClient,
+    description: str,
+    invalid_reply: Optional[str] = None,
+    stage: str = "llm_request"
+) -> str:
+    """
+    Una llamada al modelo; retorna el texto generado.
+    Si el backend no admite response_format se repite sin él.
+    """
+    return await _chat_async(
+        client,
+        lambda structured: (
+            _build_messages(description, invalid_reply, structured),
+            _generation_options(structured=structured)
+        ),
+        stage
+    )
+
+
+async def _chat_async(
+    client: AsyncInferenceClient,
+    build_request: Callable[[bool], Tuple[List[Dict[str, str]], Dict[str, Any]]],
+    stage: str
+) -> str:
+    """
+    Una llamada al modelo con los mensajes y opciones de `build_request`,
+    que recibe si se pide salida estructurada. Si el backend no admite
+    response_format se reconstruye la petición sin él.
+    """
+    while True:
+        structured = _uses_structured_output(client)
+        messages, options = build_request(structured)
+        try:
+            with span(stage):
+                completion = await client.chat_completion(messages=messages, **options)
+            raw_text = completion.choices[0].message["content"].strip()
+            logger.info(f"Raw LLM output: {raw_text}")
+            return raw_text
+        except Exception as e:
+            if structured and _rejects_response_format(e):
+                _disable_structured_output(client, e)
+                continue
+            logger.error(f"LLM request failed: {e}")
+            _record_llm_failure("error", type(e).__name__)
+            raise LLMAnalysisError(f"LLM service returned an error: {e}")
+
+
+# ============================
+# Análisis empaquetado
+# ============================
+
+async def analyze_tickets_async(
+    descriptions: Sequence[str],
+    max_concurrency: Optional[int] = None
+) -> List[Union[TicketAnalysis, Exception]]:
+    """
+    Analiza varios tickets empaquetando hasta LLM_PACK_SIZE descripciones por
+    llamada al modelo. Los tickets que faltan o no validan en la respuesta de
+    su paquete se vuelven a analizar por separado con analyze_ticket_async.
+    Si la llamada del paquete falla (red, 5xx) sus tickets reciben ese error
+    en lugar de multiplicar las llamadas contra un backend caído.
+
+    Args:
+        descriptions: Descripciones a analizar
+        max_concurrency: Llamadas simultáneas de este lote (None = solo el límite global)
+
+    Returns:
+        Por ticket y en el mismo orden, su análisis o la excepción del fallo
+    """
+    results: List[Union[TicketAnalysis, Exception, None]] = [None] * len(descriptions)
+    pending: List[Tuple[int, str]] = []
+    for index, description in enumerate(descriptions):
+        cached = analysis_cache.get(description) if analysis_cache is not None else None
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.append((index, description))
+
+    limit = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+    async def _bounded(coroutine):
+        if limit is None:
+            return await coroutine
+        async with limit:
+            return await coroutine
+
+    packs = [pack for pack in _pack(pending) if len(pack) > 1] if LLM_PACK_SIZE > 1 else []
+    if packs:
+        client = get_async_client()
+        outcomes = await asyncio.gather(
+            *(_bounded(_analyze_pack(client, pack)) for pack in packs),
+            return_exceptions=True
+        )
+        for pack, outcome in zip(packs, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Packed analysis of {len(pack)} tickets failed: {outcome}")
+                for index, _ in pack:
+                    results[index] = outcome
+                continue
+            for index, analysis in outcome.items():
+                results[index] = analysis
+                if analysis_cache is not None:
+                    analysis_cache.set(descriptions[index], analysis)
+
+    # Tickets sueltos y los que no validaron dentro de su paquete
+    remaining = [(index, description) for index, description in pending if results[index] is None]
+    if remaining and packs:
+        logger.info(f"Re-running {len(remaining)} tickets individually after packed analysis")
+    outcomes = await asyncio.gather(
+        *(_bounded(analyze_ticket_async(description)) for _, description in remaining),
+        return_exceptions=True
+    )
+    for (index, _), outcome in zip(remaining, outcomes):
+        results[index] = outcome
+
+    return results
+
+
+async def _analyze_pack(
+    client: AsyncInferenceClient,
+    pack: List[Tuple[int, str]]
+) -> Dict[int, TicketAnalysis]:
+    """Una llamada para todo el paquete; retorna los análisis válidos por índice original"""
+    descriptions = [description for _, description in pack]
+    logger.info(f"Analyzing {len(pack)} tickets with one LLM call")
+
+    with span("llm_queue"):
+        await _llm_semaphore.acquire()
+    try:
+        raw_text = await _chat_async(
+            client,
+            lambda structured: (
+                _build_packed_messages(descriptions),
+                _generation_options(packed=len(pack), structured=structured)
+            ),
+            "llm_packed_request"
+        )
+    finally:
+        _llm_semaphore.release()
+
+    with span("llm_parse"):
+        analyses = _parse_packed_analyses(raw_text, len(pack))
+    return {pack[position][0]: analysis for position, analysis in analyses.items()}
+
+
+# ============================
+# Backends de análisis
+# ============================
+
+class AnalyzerBackend(ABC):
+    """
+    Etapa de modelo de la cascada de clasificación.
+
+    Todas las implementaciones devuelven el mismo contrato (TicketAnalysis)
+    y lanzan LLMAnalysisError cuando no pueden analizar un ticket.
+    classify() añade la etapa que tomó la decisión.
+    """
+
+    name = "base"
+    stage = AnalysisStage.LLM
+    # Tiempo de inferencia por llamada (sin la espera por cupo), si el backend lo mide
+    latency: Optional[LatencyTracker] = None
+
+    async def start(self) -> None:
+        """Prepara el backend (cargar el modelo, abrir conexiones)"""
+
+    @abstractmethod
+    async def analyze(self, description: str) -> TicketAnalysis:
+        ...
+
+    async def analyze_many(
+        self,
+        descriptions: Sequence[str],
+        max_concurrency: Optional[int] = None
+    ) -> List[Union[TicketAnalysis, Exception]]:
+        """Por ticket y en el mismo orden, su análisis o la excepción del fallo"""
+        return await asyncio.gather(
+            *(self.analyze(description) for description in descriptions),
+            return_exceptions=True
+        )
+
+    async def classify(self, description: str) -> ClassificationResult:
+        return ClassificationResult(analysis=await self.analyze(description), stage=self.stage)
+
+    async def classify_many(
+        self,
+        descriptions: Sequence[str],
+        max_concurrency: Optional[int] = None
+    ) -> List[Union[ClassificationResult, Exception]]:
+        outcomes = await self.analyze_many(descriptions, max_concurrency)
+        return [
+            outcome if isinstance(outcome, Exception)
+            else ClassificationResult(analysis=outcome, stage=self.stage)
+            for outcome in outcomes
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"analyzer_backend": self.name}
+
+    async def close(self) -> None:
+        """Libera los recursos del backend"""
+
+
+class HuggingFaceAnalyzerBackend(AnalyzerBackend):
+    """
+    LLM de la API de inferencia de Hugging Face, con caché y empaquetado.
+    Con `model_id` distinto de HF_MODEL_ID usa su propio cliente y su propio
+    cupo de concurrencia (LLM_HEDGE_MAX_CONCURRENCY), y no usa la caché.
+    """
+
+    name = "huggingface"
+
+    def __init__(self, model_id: Optional[str] = None):
+        self.model_id = model_id or HF_MODEL_ID
+        self.latency = LatencyTracker()
+        self._client: Optional[AsyncInferenceClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = (
+            None if self.primary else asyncio.Semaphore(LLM_HEDGE_MAX_CONCURRENCY)
+        )
+
+    @property
+    def primary(self) -> bool:
+        return self.model_id == HF_MODEL_ID
+
+    async def analyze(self, description: str) -> TicketAnalysis:
+        if self.primary:
+            return await analyze_ticket_async(description, latency=self.latency)
+        if self._client is None:
+            self._client = AsyncInferenceClient(
+                model=self.model_id,
+                token=HF_API_TOKEN,
+                timeout=LLM_TIMEOUT_SECONDS
+            )
+        return await analyze_ticket_async(description, self._client, self._semaphore, self.latency)
+
+    async def analyze_many(
+        self,
+        descriptions: Sequence[str],
+        max_concurrency: Optional[int] = None
+    ) -> List[Union[TicketAnalysis, Exception]]:
+        if not self.primary:
+            return await super().analyze_many(descriptions, max_concurrency)
+        return await analyze_tickets_async(descriptions, max_concurrency)
+
+    async def close(self) -> None:
+        if self.primary:
+            await close_async_client()
+        elif self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+def _create_backend(kind: str, model_id: Optional[str] = None) -> AnalyzerBackend:
+    if kind == "local":
+        from local_analyzer import LocalAnalyzerBackend
+
+        return LocalAnalyzerBackend()
+    return HuggingFaceAnalyzerBackend(model_id)
+
+
+def create_analyzer_backend(keyword_fallback: Optional[AnalyzerBackend] = None) -> AnalyzerBackend:
+    """
+    Crea el backend de análisis configurado (ANALYZER_BACKEND) y, si la
+    resiliencia está activa, lo envuelve con circuit breaker, hedge y fallback.
+
+    Args:
+        keyword_fallback: Backend a usar con LLM_FALLBACK=keyword
+    """
+    primary = _create_backend(ANALYZER_BACKEND)
+    if not LLM_RESILIENCE_ENABLED:
+        return primary
+
+    from resilience import ResilientAnalyzerBackend
+
+    # Un único modelo local en memoria aunque haga de hedge y de fallback
+    # (validate_configuration rechaza usarlo para cubrir a un primario local)
+    local: Optional[AnalyzerBackend] = primary if ANALYZER_BACKEND == "local" else None
+
+    def local_backend() -> AnalyzerBackend:
+        nonlocal local
+        if local is None:
+            local = _create_backend("local")
+        return local
+
+    hedge = None
+    if LLM_HEDGE_BACKEND == "local":
+        hedge = local_backend()
+    elif LLM_HEDGE_BACKEND != "none":
+        hedge = _create_backend(LLM_HEDGE_BACKEND, LLM_HEDGE_MODEL_ID)
+
+    fallback = None
+    if LLM_FALLBACK == "keyword":
+        fallback = keyword_fallback
+    elif LLM_FALLBACK == "local":
+        fallback = local_backend()
+
+    return ResilientAnalyzerBackend(primary, hedge=hedge, fallback=fallback)
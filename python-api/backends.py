@@ -0,0 +1,37 @@
+"""Analyzer backend of the classification cascade and its lifecycle"""
+
+from typing import Optional
+
+from analyzer import AnalyzerBackend, create_analyzer_backend
+from preclassifier import KeywordAnalyzerBackend, preclassifier
+
+
+# Se crea en el primer uso (o en el arranque de la app), no al importar
+_analyzer_backend: Optional[AnalyzerBackend] = None
+
+
+def get_analyzer_backend() -> AnalyzerBackend:
+    """
+    Etapa de modelo de la cascada: LLM alojado o modelo local según
+    ANALYZER_BACKEND, con circuit breaker, hedge y fallback léxico si la
+    resiliencia está activa.
+    """
+    global _analyzer_backend
+    if _analyzer_backend is None:
+        _analyzer_backend = create_analyzer_backend(KeywordAnalyzerBackend(preclassifier))
+    return _analyzer_backend
+
+
+async def start_analyzer_backend() -> AnalyzerBackend:
+    """Crea el backend y lo prepara (cargar el modelo, abrir conexiones)"""
+    backend = get_analyzer_backend()
+    await backend.start()
+    return backend
+
+
+async def close_analyzer_backend() -> None:
+    """Libera los recursos del backend; el siguiente uso crea uno nuevo"""
+    global _analyzer_backend
+    if _analyzer_backend is not None:
+        await _analyzer_backend.close()
+        _analyzer_backend = None
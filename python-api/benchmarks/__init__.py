@@ -0,0 +1 @@
+"""Load benchmarks for the ticket API (see benchmarks/run.py)"""
@@ -0,0 +1,339 @@
+"""
+Load benchmark for the ticket API.
+
+Runs the FastAPI app from main.py in-process under uvicorn, pointed at
+local stand-ins (fake Supabase REST server and webhook sink in a child
+process, fake inference client in the app process), then drives each
+scenario at the requested concurrency levels and reports RPS and
+latency percentiles.
+
+Usage (from python-api/):
+    python -m benchmarks.run --concurrency 1,8,32 --requests 500 \\
+        --llm-latency-ms 200 --output benchmarks/results.json
+
+Any app setting can still be overridden through its environment variable
+(e.g. PRECLASSIFIER_ENABLED=false to force every ticket through the LLM).
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.stubs import FakeInferenceClient, serve_stubs
+
+
+SCENARIOS = ("create", "process", "list", "stats")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url: str, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Service at {url} did not start")
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Percentil por rango más cercano"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def configure_environment(args: argparse.Namespace, stubs_url: str, workdir: str) -> None:
+    """Variables de entorno de la app; se respetan las que ya estén definidas"""
+    defaults = {
+        "SUPABASE_URL": stubs_url,
+        # Clave con formato JWT: el cliente de Supabase valida su forma
+        "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.benchmark",
+        "HUGGINGFACE_API_TOKEN": "hf_benchmark",
+        "N8N_WEBHOOK_TEST": f"{stubs_url}/webhook/test",
+        "N8N_WEBHOOK_PROD": f"{stubs_url}/webhook/prod",
+        "WEBHOOK_OUTBOX_PATH": os.path.join(workdir, "webhook_outbox.db"),
+        "SQLITE_PATH": os.path.join(workdir, "tickets.db"),
+        "ANALYSIS_CACHE_ENABLED": "false",
+        "PRECLASSIFIER_TRAIN_ON_STARTUP": "false",
+        # Mide la capacidad sin recortes; con "true" se mide el load shedding (429)
+        "ADMISSION_CONTROL_ENABLED": "false",
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+class AppServer:
+    """uvicorn ejecutando main.app en un hilo propio"""
+
+    def __init__(self, app: Any, port: int):
+        import uvicorn
+
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"
+        ))
+        self.thread = threading.Thread(target=self.server.run, name="benchmark-app", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def run_load(
+    client: httpx.AsyncClient,
+    make_request: Callable[[int], Any],
+    total: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Lanza `total` peticiones con `concurrency` workers y mide cada una"""
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal errors
+        for index in counter:
+            started = time.perf_counter()
+            try:
+                response = await make_request(index)
+                code = str(response.status_code)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000.0)
+            status_codes[code] = status_codes.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "status_codes": status_codes,
+        "duration_s": round(duration, 4),
+        "rps": round(total / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "max": round(latencies[-1], 3) if latencies else 0.0,
+        }
+    }
+
+
+async def seed_tickets(client: httpx.AsyncClient, count: int, prefix: str) -> List[str]:
+    """Crea tickets sin medir (vía /tickets/bulk) para el escenario de procesamiento"""
+    ids: List[str] = []
+    for start in range(0, count, 500):
+        body = [
+            {"description": ticket_text(f"{prefix}-{index}")}
+            for index in range(start, min(count, start + 500))
+        ]
+        response = await client.post("/tickets/bulk", json=body)
+        response.raise_for_status()
+        ids.extend(item["ticket"]["id"] for item in response.json()["results"] if item["success"])
+    return ids
+
+
+def ticket_text(key: str) -> str:
+    # Descripciones únicas para no acertar siempre en cachés por contenido
+    samples = (
+        "No puedo iniciar sesión en la aplicación desde ayer",
+        "Me cobraron dos veces la mensualidad de este mes",
+        "Quisiera una cotización para 20 licencias del plan empresarial",
+        "La página de reportes tarda mucho en cargar",
+    )
+    return f"{samples[zlib.crc32(key.encode()) % len(samples)]} (ref {key})"
+
+
+async def run_benchmark(args: argparse.Namespace, base_url: str) -> List[Dict[str, Any]]:
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2, max_keepalive_connections=max(args.concurrency) * 2)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        # Calentamiento: conexiones y primeras filas para GET /tickets
+        await seed_tickets(client, 200, "warmup")
+
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                if scenario == "create":
+                    make = lambda i, s=f"create-{concurrency}": client.post(
+                        "/tickets", json={"description": ticket_text(f"{s}-{i}")}
+                    )
+                elif scenario == "process":
+                    ids = await seed_tickets(client, args.requests, f"process-{concurrency}")
+                    make = lambda i, ids=ids: client.post("/process-ticket", json={"ticket_id": ids[i % len(ids)]})
+                elif scenario == "list":
+                    make = lambda i: client.get("/tickets", params={"limit": args.list_limit})
+                else:
+                    make = lambda i: client.get("/stats")
+
+                result = await run_load(client, make, args.requests, concurrency)
+                result = {"scenario": scenario, "concurrency": concurrency, **result}
+                results.append(result)
+                print(
+                    f"{scenario:>8} c={concurrency:<4} rps={result['rps']:>9.2f} "
+                    f"p50={result['latency_ms']['p50']:>8.2f}ms p95={result['latency_ms']['p95']:>8.2f}ms "
+                    f"p99={result['latency_ms']['p99']:>8.2f}ms errors={result['errors']}",
+                    flush=True
+                )
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    """Imprime la variación de RPS y p95 frente a un archivo de resultados anterior"""
+    with open(baseline_path, encoding="utf-8") as handle:
+        baseline = {
+            (row["scenario"], row["concurrency"]): row for row in json.load(handle)["results"]
+        }
+    print(f"\nComparison against {baseline_path}:")
+    for row in results:
+        old = baseline.get((row["scenario"], row["concurrency"]))
+        if old is None:
+            continue
+        rps_change = (row["rps"] - old["rps"]) / old["rps"] * 100 if old["rps"] else 0.0
+        p95_change = (
+            (row["latency_ms"]["p95"] - old["latency_ms"]["p95"]) / old["latency_ms"]["p95"] * 100
+            if old["latency_ms"]["p95"] else 0.0
+        )
+        print(f"{row['scenario']:>8} c={row['concurrency']:<4} rps {rps_change:+7.1f}%  p95 {p95_change:+7.1f}%")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the ticket API against local stand-ins")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per scenario and level")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Added delay per fake Supabase request")
+    parser.add_argument("--list-limit", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-level", default="WARNING", help="App log level during the run")
+    parser.add_argument("--output", default="benchmarks/results.json")
+    parser.add_argument("--baseline", help="Previous results file to compare against")
+    args = parser.parse_args(argv)
+
+    args.concurrency = [int(value) for value in args.concurrency.split(",") if value]
+    args.scenarios = [value for value in args.scenarios.split(",") if value]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="ticket-bench-")
+
+    stubs_port = free_port()
+    stubs_url = f"http://127.0.0.1:{stubs_port}"
+    stubs = multiprocessing.get_context("spawn").Process(
+        target=serve_stubs, args=(stubs_port, args.db_latency_ms), daemon=True
+    )
+    stubs.start()
+    wait_until_up(f"{stubs_url}/_stubs/stats")
+
+    configure_environment(args, stubs_url, workdir)
+
+    # main.py lee la configuración al importarse
+    import logging
+    import analyzer
+    import main as app_module
+
+    logging.getLogger().setLevel(args.log_level.upper())
+    llm = FakeInferenceClient(args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate, args.seed)
+    analyzer._async_client = llm
+
+    app_port = free_port()
+    server = AppServer(app_module.app, app_port)
+    server.start()
+
+    try:
+        results = asyncio.run(run_benchmark(args, f"http://127.0.0.1:{app_port}"))
+        stubs_stats = httpx.get(f"{stubs_url}/_stubs/stats").json()
+    finally:
+        server.stop()
+        stubs.terminate()
+        stubs.join(timeout=5)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "storage_backend": os.environ.get("STORAGE_BACKEND", "supabase"),
+            "settings": {
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "llm_latency_ms": args.llm_latency_ms,
+                "llm_jitter_ms": args.llm_jitter_ms,
+                "llm_error_rate": args.llm_error_rate,
+                "db_latency_ms": args.db_latency_ms,
+                "list_limit": args.list_limit,
+                "seed": args.seed,
+            },
+            "llm_calls": llm.calls,
+            "llm_errors": llm.errors,
+            "stubs": stubs_stats,
+        },
+        "results": results
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2, ensure_ascii=False)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,370 @@
+"""
+Local stand-ins for the external services used by the API.
+
+- A fake Supabase REST server (the PostgREST subset the repository uses,
+  plus the RPCs from supabase/setup.sql), with in-memory tickets
+- A local webhook sink that counts n8n notifications
+- A fake AsyncInferenceClient with configurable latency and error rate
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Sin importar models/config: la app debe leer su configuración después
+# de que el benchmark haya fijado las variables de entorno
+CATEGORIES = ("Técnico", "Facturación", "Comercial")
+SENTIMENTS = ("Positivo", "Neutral", "Negativo")
+
+
+TICKET_DEFAULTS = {
+    "category": None,
+    "sentiment": None,
+    "confidence": None,
+    "processed": False,
+    "status": "new",
+    "priority": None,
+    "error_message": None,
+    "analysis_stage": None,
+    "claimed_at": None,
+    "processed_at": None,
+}
+
+# Parámetros de PostgREST que no son filtros
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+KEYSET_OR = re.compile(
+    r'^\(created_at\.lt\."(?P<ts>[^"]+)",and\(created_at\.eq\."(?P=ts)",id\.lt\.(?P<id>[^)]+)\)\)$'
+)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _as_text(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _comparable(column: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if column.endswith("_at"):
+        return datetime.fromisoformat(str(value))
+    if column == "confidence":
+        return float(value)
+    return str(value)
+
+
+def _matches(row: Dict[str, Any], column: str, expression: str) -> bool:
+    operator, _, operand = expression.partition(".")
+    value = row.get(column)
+    if operator == "eq":
+        return _as_text(value) == operand.strip('"')
+    if operator == "in":
+        return _as_text(value) in {item.strip('"') for item in operand.strip("()").split(",")}
+    if value is None:
+        return False
+    left, right = _comparable(column, value), _comparable(column, operand.strip('"'))
+    return {"gte": left >= right, "gt": left > right, "lte": left <= right, "lt": left < right}[operator]
+
+
+class FakeSupabase:
+    """Tabla de tickets en memoria con la semántica de setup.sql"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.tickets: Dict[str, Dict[str, Any]] = {}
+        self.webhooks: Dict[str, int] = {}
+        self.requests = 0
+
+    def select(self, params: List[tuple]) -> List[Dict[str, Any]]:
+        rows = list(self.tickets.values())
+        columns = "*"
+        order = ""
+        limit = None
+
+        for key, value in params:
+            if key == "select":
+                columns = value
+            elif key == "order":
+                order = value
+            elif key == "limit":
+                limit = int(value)
+            elif key == "or":
+                keyset = KEYSET_OR.match(value)
+                if keyset is None:
+                    raise ValueError(f"Unsupported or filter: {value}")
+                created_at = datetime.fromisoformat(keyset["ts"])
+                rows = [
+                    row for row in rows
+                    if datetime.fromisoformat(row["created_at"]) < created_at
+                    or (datetime.fromisoformat(row["created_at"]) == created_at and row["id"] < keyset["id"])
+                ]
+            elif key not in RESERVED_PARAMS:
+                rows = [row for row in rows if _matches(row, key, value)]
+
+        for term in reversed([term for term in order.split(",") if term]):
+            column, _, direction = term.partition(".")
+            rows.sort(
+                key=lambda row: (row.get(column) is None, _comparable(column, row.get(column)) or ""),
+                reverse=direction.startswith("desc")
+            )
+
+        if limit is not None:
+            rows = rows[:limit]
+        if columns != "*":
+            wanted = [column.strip() for column in columns.split(",")]
+            rows = [{column: row.get(column) for column in wanted} for row in rows]
+        return [dict(row) for row in rows]
+
+    def insert(self, body: Any, upsert: bool) -> List[Dict[str, Any]]:
+        created = []
+        for item in body if isinstance(body, list) else [body]:
+            existing = self.tickets.get(item.get("id")) if upsert else None
+            if existing is not None:
+                row = {**existing, **item}
+            else:
+                row = {**TICKET_DEFAULTS, "id": str(uuid.uuid4()), "created_at": _now(), **item}
+            self._stamp_processed(existing, row)
+            self.tickets[row["id"]] = row
+            created.append(dict(row))
+        return created
+
+    def update(self, params: List[tuple], body: Dict[str, Any]) -> List[Dict[str, Any]]:
+        updated = []
+        for row in self.select([(key, value) for key, value in params if key not in RESERVED_PARAMS]):
+            current = self.tickets[row["id"]]
+            new = {**current, **body}
+            self._stamp_processed(current, new)
+            self.tickets[row["id"]] = new
+            updated.append(dict(new))
+        return updated
+
+    def rpc(self, name: str, args: Dict[str, Any]) -> Any:
+        if name == "get_ticket_stats":
+            return [self._stats()]
+        if name == "claim_ticket":
+            return self._claim([args["p_ticket_id"]], args.get("p_stale_seconds", 600))
+        if name == "claim_tickets":
+            return self._claim(args["p_ticket_ids"], args.get("p_stale_seconds", 600))
+        if name == "complete_tickets":
+            return self._complete(args["p_results"])
+        if name == "get_ticket_timeseries":
+            # No se ejercita en el benchmark
+            return []
+        raise KeyError(name)
+
+    def _claim(self, ticket_ids: List[str], stale_seconds: int) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        result = []
+        for ticket_id in ticket_ids:
+            row = self.tickets.get(ticket_id)
+            if row is None:
+                continue
+            stale = row["claimed_at"] is None or (
+                datetime.fromisoformat(row["claimed_at"]) < now - timedelta(seconds=stale_seconds)
+            )
+            claimed = not row["processed"] and (row["status"] != "processing" or stale)
+            if claimed:
+                row["status"] = "processing"
+                row["claimed_at"] = now.isoformat()
+            result.append({**row, "claimed": claimed})
+        return result
+
+    def _complete(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        updated = []
+        for item in results:
+            current = self.tickets.get(item["id"])
+            if current is None or current["status"] != "processing" or current["claimed_at"] != item["claimed_at"]:
+                continue
+            new = {**current, **{key: value for key, value in item.items() if key != "claimed_at"}}
+            self._stamp_processed(current, new)
+            self.tickets[item["id"]] = new
+            updated.append(dict(new))
+        return updated
+
+    def _stats(self) -> Dict[str, int]:
+        rows = self.tickets.values()
+        count = lambda predicate: sum(1 for row in rows if predicate(row))
+        return {
+            "total_tickets": len(self.tickets),
+            "processed_tickets": count(lambda row: row["processed"]),
+            "unprocessed_tickets": count(lambda row: not row["processed"]),
+            "positive_sentiment": count(lambda row: row["sentiment"] == "Positivo"),
+            "neutral_sentiment": count(lambda row: row["sentiment"] == "Neutral"),
+            "negative_sentiment": count(lambda row: row["sentiment"] == "Negativo"),
+            "tecnico_category": count(lambda row: row["category"] == "Técnico"),
+            "facturacion_category": count(lambda row: row["category"] == "Facturación"),
+            "comercial_category": count(lambda row: row["category"] == "Comercial"),
+        }
+
+    @staticmethod
+    def _stamp_processed(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> None:
+        # Equivalente del trigger tickets_processed_at
+        if new.get("processed") and not (old or {}).get("processed"):
+            new["processed_at"] = _now()
+
+
+def create_stub_app(db_latency_ms: float = 0.0) -> FastAPI:
+    """App con la API REST falsa de Supabase y el receptor de webhooks"""
+    app = FastAPI()
+    store = FakeSupabase(db_latency_ms)
+    app.state.store = store
+
+    async def _delay() -> None:
+        store.requests += 1
+        if store.latency:
+            await asyncio.sleep(store.latency)
+
+    @app.get("/rest/v1/tickets")
+    async def select_tickets(request: Request):
+        await _delay()
+        return store.select(list(request.query_params.multi_items()))
+
+    @app.post("/rest/v1/tickets")
+    async def insert_tickets(request: Request):
+        await _delay()
+        upsert = "resolution=merge-duplicates" in request.headers.get("prefer", "")
+        return JSONResponse(store.insert(await request.json(), upsert), status_code=201)
+
+    @app.patch("/rest/v1/tickets")
+    async def update_tickets(request: Request):
+        await _delay()
+        return store.update(list(request.query_params.multi_items()), await request.json())
+
+    @app.post("/rest/v1/rpc/{name}")
+    async def call_rpc(name: str, request: Request):
+        await _delay()
+        body = await request.body()
+        try:
+            return store.rpc(name, json.loads(body) if body else {})
+        except KeyError:
+            return JSONResponse({"message": f"Unknown function {name}"}, status_code=404)
+
+    @app.post("/webhook/{name}")
+    async def receive_webhook(name: str):
+        store.webhooks[name] = store.webhooks.get(name, 0) + 1
+        return {"ok": True}
+
+    @app.get("/_stubs/stats")
+    async def stub_stats():
+        return {
+            "tickets": len(store.tickets),
+            "supabase_requests": store.requests,
+            "webhooks": dict(store.webhooks)
+        }
+
+    return app
+
+
+def serve_stubs(port: int, db_latency_ms: float) -> None:
+    """Punto de entrada del proceso de stubs"""
+    import uvicorn
+
+    uvicorn.run(create_stub_app(db_latency_ms), host="127.0.0.1", port=port, log_level="warning")
+
+
+class FakeInferenceClient:
+    """
+    Sustituto de AsyncInferenceClient: responde con un análisis JSON válido
+    tras `latency_ms` (± jitter) y falla con probabilidad `error_rate`.
+    """
+
+    def __init__(self, latency_ms: float = 200.0, jitter_ms: float = 50.0, error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+
+    async def chat_completion(self, messages: List[Dict[str, Any]], **kwargs: Any) -> SimpleNamespace:
+        self.calls += 1
+        delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(delay / 1000.0)
+
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError("Simulated inference error")
+
+        # Respuesta determinista según el texto del ticket
+        digest = hashlib.sha256(messages[-1]["content"].encode("utf-8")).digest()
+        content = json.dumps({
+            "category": CATEGORIES[digest[0] % len(CATEGORIES)],
+            "sentiment": SENTIMENTS[digest[1] % len(SENTIMENTS)],
+            "confidence": round(0.6 + (digest[2] % 40) / 100, 2)
+        }, ensure_ascii=False)
+        return SimpleNamespace(choices=[SimpleNamespace(message={"content": content})])
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeAnalyzerBackend:
+    """
+    Backend de análisis falso con la interfaz de analyzer.AnalyzerBackend,
+    para ejercitar el hedge, el circuit breaker y el fallback de
+    resilience.ResilientAnalyzerBackend sin red: `latency_ms` por llamada,
+    `slow_rate` de llamadas que tardan `slow_ms` y `error_rate` de fallos.
+    """
+
+    def __init__(
+        self,
+        name: str = "fake",
+        latency_ms: float = 50.0,
+        slow_ms: float = 2000.0,
+        slow_rate: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0
+    ):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.slow_ms = slow_ms
+        self.slow_rate = slow_rate
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def analyze(self, description: str) -> Any:
+        # Importación diferida: models carga la configuración
+        from exceptions import LLMAnalysisError
+        from models import TicketAnalysis
+
+        self.calls += 1
+        slow = self._random.random() < self.slow_rate
+        await asyncio.sleep((self.slow_ms if slow else self.latency_ms) / 1000.0)
+        if self._random.random() < self.error_rate:
+            raise LLMAnalysisError(f"Simulated {self.name} failure")
+
+        digest = hashlib.sha256(description.encode("utf-8")).digest()
+        return TicketAnalysis(
+            category=CATEGORIES[digest[0] % len(CATEGORIES)],
+            sentiment=SENTIMENTS[digest[1] % len(SENTIMENTS)],
+            confidence=0.9
+        )
+
+    async def analyze_many(self, descriptions: List[str], max_concurrency: Optional[int] = None) -> List[Any]:
+        return await asyncio.gather(
+            *(self.analyze(description) for description in descriptions),
+            return_exceptions=True
+        )
@@ -0,0 +1,254 @@
+"""In-memory and on-disk caches (LLM analysis results, HTTP validators)"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from models import TicketAnalysis
+from config import logger
+from metrics import analysis_cache_lookups_total
+
+
+class TTLCache:
+    """
+    Caché LRU acotada con expiración por entrada.
+
+    Las entradas más antiguas se descartan al superar max_entries y
+    las expiradas se eliminan al leerlas.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def compute_etag(payload: Any) -> str:
+    """ETag fuerte calculado sobre la representación JSON del contenido"""
+    raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return '"' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evalúa una cabecera If-None-Match (lista, comodín o ETags débiles)"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(
+        candidate.removeprefix("W/") == etag for candidate in candidates
+    )
+
+
+def last_modified(timestamps: Iterable[Optional[str]]) -> Optional[str]:
+    """Cabecera Last-Modified (fecha HTTP) a partir de la marca ISO 8601 más reciente"""
+    latest = None
+    for value in timestamps:
+        if not value:
+            continue
+        try:
+            moment = datetime.fromisoformat(str(value))
+        except ValueError:
+            continue
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        if latest is None or moment > latest:
+            latest = moment
+    return format_datetime(latest.astimezone(timezone.utc), usegmt=True) if latest else None
+
+
+def normalize_description(description: str) -> str:
+    """
+    Normaliza el texto de un ticket para que descripciones casi idénticas
+    compartan clave: sin tildes, en minúsculas y sin puntuación repetida.
+    """
+    text = unicodedata.normalize("NFKD", description)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.casefold()
+    text = re.sub(r"[^\w]+", " ", text)
+    return text.strip()
+
+
+class AnalysisCache:
+    """
+    Caché direccionada por contenido para resultados de análisis.
+
+    La clave es el hash de la descripción normalizada más un namespace
+    (modelo + versión del prompt), de modo que cambiar cualquiera de
+    los dos invalida las entradas existentes sin borrarlas a mano.
+    Tiene un nivel en memoria (LRU + TTL) y un nivel opcional en SQLite,
+    acotado al mismo número de entradas: cada escritura borra las filas
+    vencidas y cada `DISK_TRIM_EVERY` escrituras se recortan las más
+    antiguas por encima de `max_entries`.
+    """
+
+    DISK_TRIM_EVERY = 100
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int,
+        ttl_seconds: float,
+        disk_path: Optional[str] = None
+    ):
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._disk_writes = 0
+        self._memory = TTLCache(max_entries, ttl_seconds)
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        if disk_path:
+            try:
+                self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+                self._disk.execute(
+                    "CREATE TABLE IF NOT EXISTS analysis_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._disk.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires_at ON analysis_cache(expires_at)"
+                )
+                self._disk.commit()
+                self._disk_trim()
+                logger.info(f"Analysis cache disk tier enabled at {disk_path}")
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to open analysis cache at {disk_path}: {e}")
+                self._disk = None
+
+    def key_for(self, description: str) -> str:
+        raw = f"{self.namespace}\n{normalize_description(description)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, description: str) -> Optional[TicketAnalysis]:
+        key = self.key_for(description)
+
+        analysis = self._memory.get(key)
+        if analysis is not None:
+            self._counters["memory_hits"] += 1
+            analysis_cache_lookups_total.inc(result="memory_hit")
+            return analysis
+
+        analysis = self._disk_get(key)
+        if analysis is not None:
+            self._counters["disk_hits"] += 1
+            analysis_cache_lookups_total.inc(result="disk_hit")
+            self._memory.set(key, analysis)
+            return analysis
+
+        self._counters["misses"] += 1
+        analysis_cache_lookups_total.inc(result="miss")
+        return None
+
+    def set(self, description: str, analysis: TicketAnalysis) -> None:
+        key = self.key_for(description)
+        self._memory.set(key, analysis)
+        self._disk_set(key, analysis)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+        lookups = hits + self._counters["misses"]
+        return {
+            "namespace": self.namespace,
+            "hits": hits,
+            "memory_hits": self._counters["memory_hits"],
+            "disk_hits": self._counters["disk_hits"],
+            "misses": self._counters["misses"],
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "disk_enabled": self._disk is not None
+        }
+
+    def _disk_get(self, key: str) -> Optional[TicketAnalysis]:
+        if self._disk is None:
+            return None
+        try:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT value FROM analysis_cache WHERE key = ? AND expires_at > ?",
+                    (key, time.time())
+                ).fetchone()
+            if row is None:
+                return None
+            return TicketAnalysis(**json.loads(row[0]))
+        except Exception as e:
+            logger.warning(f"Analysis cache disk read failed: {e}")
+            return None
+
+    def _disk_set(self, key: str, analysis: TicketAnalysis) -> None:
+        if self._disk is None:
+            return
+        try:
+            now = time.time()
+            with self._disk_lock:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, analysis.model_dump_json(), now + self.ttl_seconds)
+                )
+                # Barato gracias al índice: normalmente no hay nada vencido
+                self._disk.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (now,))
+                self._disk.commit()
+                self._disk_writes += 1
+                trim = self._disk_writes % self.DISK_TRIM_EVERY == 0
+            if trim:
+                self._disk_trim()
+        except sqlite3.Error as e:
+            logger.warning(f"Analysis cache disk write failed: {e}")
+
+    def _disk_trim(self) -> None:
+        """Borra las vencidas y, si sobran, las que antes vencen hasta quedar en max_entries"""
+        try:
+            with self._disk_lock:
+                self._disk.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (time.time(),))
+                count = self._disk.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+                excess = count - self.max_entries
+                if excess > 0:
+                    self._disk.execute(
+                        "DELETE FROM analysis_cache WHERE key IN ("
+                        "SELECT key FROM analysis_cache ORDER BY expires_at LIMIT ?)",
+                        (excess,)
+                    )
+                self._disk.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Analysis cache disk trim failed: {e}")
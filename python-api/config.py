@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,6 +18,11 @@ SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 HUGGINGFACE_API_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN", "")
 
+# Storage Configuration
+# "supabase" (Postgres alojado) o "sqlite" (archivo local en modo WAL, un solo nodo)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "tickets.db")
+
 # Modelo por defecto para generación de texto / chat en Hugging Face
 HUGGINGFACE_MODEL = os.getenv("HUGGINGFACE_MODEL", "meta-llama/Llama-3.2-1B-Instruct")
 
@@ -24,9 +30,188 @@ HUGGINGFACE_MODEL = os.getenv("HUGGINGFACE_MODEL", "meta-llama/Llama-3.2-1B-Inst
 HF_API_TOKEN = HUGGINGFACE_API_TOKEN
 HF_MODEL_ID = HUGGINGFACE_MODEL
 
+# Analyzer Backend Configuration
+# "huggingface" (API de inferencia alojada) o "local" (modelo en CPU, requiere requirements-local.txt)
+ANALYZER_BACKEND = os.getenv("ANALYZER_BACKEND", "huggingface").lower()
+# Modelo NLI multilingüe para clasificación zero-shot en CPU
+LOCAL_MODEL_ID = os.getenv("LOCAL_MODEL_ID", "MoritzLaurer/mDeBERTa-v3-base-mnli-xnli")
+# Cuantización dinámica int8 de las capas lineales (menos memoria y más rápido en CPU)
+LOCAL_MODEL_QUANTIZE = os.getenv("LOCAL_MODEL_QUANTIZE", "true").lower() == "true"
+# Lotes dinámicos: tamaño máximo y espera máxima desde el primer ticket del lote
+LOCAL_BATCH_MAX_SIZE = int(os.getenv("LOCAL_BATCH_MAX_SIZE", "16"))
+LOCAL_BATCH_MAX_WAIT_MS = float(os.getenv("LOCAL_BATCH_MAX_WAIT_MS", "10"))
+# Hilos que ejecutan lotes en paralelo (cada uno usa además los hilos internos de torch)
+LOCAL_INFERENCE_THREADS = int(os.getenv("LOCAL_INFERENCE_THREADS", "1"))
+
+# Analyzer Resilience Configuration
+# Circuit breaker + hedging + fallback alrededor del backend de análisis
+LLM_RESILIENCE_ENABLED = os.getenv("LLM_RESILIENCE_ENABLED", "true").lower() == "true"
+# Fallos seguidos que abren el circuito y tiempo abierto antes de probar de nuevo
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+# Respuesta con el circuito abierto: "keyword" (pre-clasificador sin umbral), "local" o "none"
+LLM_FALLBACK = os.getenv("LLM_FALLBACK", "keyword").lower()
+# Petición de cobertura (hedge): "none", "huggingface" (otro modelo) o "local"
+LLM_HEDGE_BACKEND = os.getenv("LLM_HEDGE_BACKEND", "none").lower()
+LLM_HEDGE_MODEL_ID = os.getenv("LLM_HEDGE_MODEL_ID", "")
+# El hedge sale cuando la llamada principal supera este percentil de su latencia reciente
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "200"))
+# Muestras necesarias antes de estimar el percentil (sin ellas no hay hedge)
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Llamadas simultáneas al modelo de hedge (cupo propio, aparte de LLM_MAX_CONCURRENCY)
+LLM_HEDGE_MAX_CONCURRENCY = int(os.getenv("LLM_HEDGE_MAX_CONCURRENCY", "4"))
+
+# LLM Client Configuration
+# Número máximo de llamadas simultáneas al modelo por proceso
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# Pide la salida con response_format (esquema JSON) si el backend lo admite
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+# La respuesta es un objeto JSON de ~60 caracteres; un presupuesto ajustado evita texto de más
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "64"))
+# Un segundo intento pidiendo corregir la salida cuando no es JSON válido
+LLM_REPAIR_INVALID_OUTPUT = os.getenv("LLM_REPAIR_INVALID_OUTPUT", "true").lower() == "true"
+# Tickets por llamada al modelo en lotes y en la cola interna (1 = sin empaquetar)
+LLM_PACK_SIZE = int(os.getenv("LLM_PACK_SIZE", "8"))
+# Tope de caracteres de descripción por paquete (cada ticket admite hasta 2000)
+LLM_PACK_MAX_CHARS = int(os.getenv("LLM_PACK_MAX_CHARS", "6000"))
+
+# Statistics Configuration
+# Tiempo que se reutiliza la respuesta de /stats antes de volver a la BD
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "2"))
+# Máximo de buckets por consulta de /stats/timeseries (PostgREST limita las filas por respuesta)
+STATS_TIMESERIES_MAX_BUCKETS = int(os.getenv("STATS_TIMESERIES_MAX_BUCKETS", "1000"))
+
+# Metrics Configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Peticiones más lentas que esto (ms) se registran con su desglose por etapa; 0 = desactivado
+SLOW_REQUEST_LOG_MS = float(os.getenv("SLOW_REQUEST_LOG_MS", "0"))
+
+# Export Configuration
+# Filas leídas por consulta al exportar; la memoria usada no depende del total
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# Ticket Cache Configuration
+# Filas de tickets en memoria; el TTL acota lo que puede durar una fila
+# escrita por otro proceso antes de volver a leerse de la BD
+TICKET_CACHE_ENABLED = os.getenv("TICKET_CACHE_ENABLED", "true").lower() == "true"
+TICKET_CACHE_MAX_ENTRIES = int(os.getenv("TICKET_CACHE_MAX_ENTRIES", "10000"))
+TICKET_CACHE_TTL_SECONDS = float(os.getenv("TICKET_CACHE_TTL_SECONDS", "30"))
+
+# Analysis Cache Configuration
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "10000"))
+ANALYSIS_CACHE_TTL_SECONDS = float(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "86400"))
+# Ruta del fichero SQLite para el nivel persistente (vacío = solo memoria)
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "")
+
+# Pre-classifier Configuration
+PRECLASSIFIER_ENABLED = os.getenv("PRECLASSIFIER_ENABLED", "true").lower() == "true"
+# Confianza mínima para resolver un ticket sin llamar al LLM
+PRECLASSIFIER_THRESHOLD = float(os.getenv("PRECLASSIFIER_THRESHOLD", "0.85"))
+PRECLASSIFIER_TRAIN_ON_STARTUP = os.getenv("PRECLASSIFIER_TRAIN_ON_STARTUP", "true").lower() == "true"
+PRECLASSIFIER_TRAINING_ROWS = int(os.getenv("PRECLASSIFIER_TRAINING_ROWS", "2000"))
+PRECLASSIFIER_MIN_SUPPORT = int(os.getenv("PRECLASSIFIER_MIN_SUPPORT", "5"))
+
+# Batch Processing Configuration
+BATCH_MAX_TICKETS = int(os.getenv("BATCH_MAX_TICKETS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+# Bulk Ingestion Configuration
+BULK_MAX_TICKETS = int(os.getenv("BULK_MAX_TICKETS", "10000"))
+# Filas por INSERT multi-fila (y por notificación de webhook)
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "500"))
+
 # n8n Webhook Configuration
-N8N_WEBHOOK_TEST = "https://n8n.srv1241518.hstgr.cloud/webhook-test/a7978e25-8e19-483e-bf37-be6349ac8391"
-N8N_WEBHOOK_PROD = "https://n8n.srv1241518.hstgr.cloud/webhook/a7978e25-8e19-483e-bf37-be6349ac8391"
+N8N_WEBHOOK_TEST = os.getenv(
+    "N8N_WEBHOOK_TEST",
+    "https://n8n.srv1241518.hstgr.cloud/webhook-test/a7978e25-8e19-483e-bf37-be6349ac8391"
+)
+N8N_WEBHOOK_PROD = os.getenv(
+    "N8N_WEBHOOK_PROD",
+    "https://n8n.srv1241518.hstgr.cloud/webhook/a7978e25-8e19-483e-bf37-be6349ac8391"
+)
+WEBHOOK_TARGETS = [N8N_WEBHOOK_TEST, N8N_WEBHOOK_PROD]
+# Destino de las notificaciones agrupadas de la carga masiva
+# ({"event": "tickets_created", "count", "tickets"}). Sin él, cada ticket
+# creado en bloque se notifica a WEBHOOK_TARGETS con el payload de siempre.
+N8N_WEBHOOK_BATCH = os.getenv("N8N_WEBHOOK_BATCH", "")
+WEBHOOK_BATCH_TARGETS = [N8N_WEBHOOK_BATCH] if N8N_WEBHOOK_BATCH else []
+
+# Webhook Delivery Configuration
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+# Fichero SQLite donde se guardan las entregas fallidas pendientes de reintento
+WEBHOOK_OUTBOX_PATH = os.getenv("WEBHOOK_OUTBOX_PATH", "webhook_outbox.db")
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+WEBHOOK_RETRY_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_RETRY_INTERVAL_SECONDS", "5"))
+WEBHOOK_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_SECONDS", "5"))
+# Tiempo que se conservan las entregas descartadas (dead) antes de borrarlas; 0 = sin límite
+WEBHOOK_DEAD_RETENTION_SECONDS = float(os.getenv("WEBHOOK_DEAD_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# Processing Claim Configuration
+# Un claim en 'processing' más antiguo que esto se considera abandonado
+CLAIM_STALE_SECONDS = int(os.getenv("CLAIM_STALE_SECONDS", "600"))
+
+# Processing Queue Configuration
+# Si está activo, create_ticket encola el ticket para procesarlo en proceso
+TICKET_QUEUE_ENABLED = os.getenv("TICKET_QUEUE_ENABLED", "false").lower() == "true"
+TICKET_QUEUE_WORKERS = int(os.getenv("TICKET_QUEUE_WORKERS", "4"))
+TICKET_QUEUE_MAX_SIZE = int(os.getenv("TICKET_QUEUE_MAX_SIZE", "1000"))
+TICKET_QUEUE_MAX_RETRIES = int(os.getenv("TICKET_QUEUE_MAX_RETRIES", "3"))
+TICKET_QUEUE_BACKOFF_SECONDS = float(os.getenv("TICKET_QUEUE_BACKOFF_SECONDS", "2"))
+# Aging: cada nivel de prioridad equivale a esta espera; un ticket low que
+# lleva 2x este tiempo en cola pasa por delante de un high recién llegado
+TICKET_QUEUE_PRIORITY_AGING_SECONDS = float(os.getenv("TICKET_QUEUE_PRIORITY_AGING_SECONDS", "30"))
+
+# Single-flight Configuration
+# Llamadas concurrentes a /process-ticket (y la cola) para el mismo ticket
+# comparten un único análisis; el lock en disco lo extiende a los workers
+# de uvicorn del mismo host (vacío = solo dentro del proceso)
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+SINGLE_FLIGHT_LOCK_DIR = os.getenv(
+    "SINGLE_FLIGHT_LOCK_DIR",
+    os.path.join(tempfile.gettempdir(), "ticket-api-single-flight")
+)
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", "60"))
+
+# Ticket Stream (SSE) Configuration
+# Eventos recientes que se conservan para reanudar con Last-Event-ID
+TICKET_STREAM_BUFFER_SIZE = int(os.getenv("TICKET_STREAM_BUFFER_SIZE", "2000"))
+# Ventana en la que se agrupan los cambios antes de emitirlos
+TICKET_STREAM_COALESCE_MS = float(os.getenv("TICKET_STREAM_COALESCE_MS", "250"))
+TICKET_STREAM_HEARTBEAT_SECONDS = float(os.getenv("TICKET_STREAM_HEARTBEAT_SECONDS", "15"))
+# Espera de reconexión sugerida a EventSource
+TICKET_STREAM_RETRY_MS = int(os.getenv("TICKET_STREAM_RETRY_MS", "3000"))
+
+# Admission Control Configuration
+# Rechaza con 429 + Retry-After lo que exceda los límites, antes de llegar a la ruta
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "true").lower() == "true"
+# Retry-After para rechazos por concurrencia (los del token bucket se calculan)
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+# Por ruta: (peticiones simultáneas, peticiones/s sostenidas, ráfaga); 0 = sin ese límite
+ADMISSION_LIMITS = {
+    "POST /tickets": (
+        int(os.getenv("ADMISSION_TICKETS_MAX_CONCURRENCY", "64")),
+        float(os.getenv("ADMISSION_TICKETS_RATE", "50")),
+        int(os.getenv("ADMISSION_TICKETS_BURST", "100")),
+    ),
+    "POST /tickets/bulk": (
+        int(os.getenv("ADMISSION_BULK_MAX_CONCURRENCY", "2")),
+        float(os.getenv("ADMISSION_BULK_RATE", "1")),
+        int(os.getenv("ADMISSION_BULK_BURST", "2")),
+    ),
+    "POST /process-ticket": (
+        int(os.getenv("ADMISSION_PROCESS_MAX_CONCURRENCY", "16")),
+        float(os.getenv("ADMISSION_PROCESS_RATE", "20")),
+        int(os.getenv("ADMISSION_PROCESS_BURST", "40")),
+    ),
+    "POST /process-tickets": (
+        int(os.getenv("ADMISSION_BATCH_MAX_CONCURRENCY", "2")),
+        float(os.getenv("ADMISSION_BATCH_RATE", "1")),
+        int(os.getenv("ADMISSION_BATCH_BURST", "4")),
+    ),
+}
 
 # CORS Origins
 CORS_ORIGINS = [
@@ -45,11 +230,42 @@ class ConfigurationError(Exception):
 
 def validate_configuration() -> None:
     """Validates that all required environment variables are set"""
-    required_vars = {
-        "SUPABASE_URL": SUPABASE_URL,
-        "SUPABASE_KEY": SUPABASE_KEY,
-        "HUGGINGFACE_API_TOKEN": HUGGINGFACE_API_TOKEN
-    }
+    if STORAGE_BACKEND not in ("supabase", "sqlite"):
+        error_msg = f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND} (expected supabase or sqlite)"
+        logger.error(error_msg)
+        raise ConfigurationError(error_msg)
+
+    if ANALYZER_BACKEND not in ("huggingface", "local"):
+        error_msg = f"Unknown ANALYZER_BACKEND: {ANALYZER_BACKEND} (expected huggingface or local)"
+        logger.error(error_msg)
+        raise ConfigurationError(error_msg)
+
+    if LLM_FALLBACK not in ("keyword", "local", "none"):
+        error_msg = f"Unknown LLM_FALLBACK: {LLM_FALLBACK} (expected keyword, local or none)"
+        logger.error(error_msg)
+        raise ConfigurationError(error_msg)
+
+    if LLM_HEDGE_BACKEND not in ("none", "huggingface", "local"):
+        error_msg = f"Unknown LLM_HEDGE_BACKEND: {LLM_HEDGE_BACKEND} (expected none, huggingface or local)"
+        logger.error(error_msg)
+        raise ConfigurationError(error_msg)
+
+    # Un backend local no puede cubrir a otro local: falla y tarda con él
+    if LLM_RESILIENCE_ENABLED and ANALYZER_BACKEND == "local":
+        for name, value in (("LLM_FALLBACK", LLM_FALLBACK), ("LLM_HEDGE_BACKEND", LLM_HEDGE_BACKEND)):
+            if value == "local":
+                error_msg = f"{name}=local has no effect with ANALYZER_BACKEND=local (use keyword, huggingface or none)"
+                logger.error(error_msg)
+                raise ConfigurationError(error_msg)
+
+    required_vars = {}
+    if ANALYZER_BACKEND == "huggingface" or LLM_HEDGE_BACKEND == "huggingface":
+        required_vars["HUGGINGFACE_API_TOKEN"] = HUGGINGFACE_API_TOKEN
+    if LLM_HEDGE_BACKEND == "huggingface":
+        required_vars["LLM_HEDGE_MODEL_ID"] = LLM_HEDGE_MODEL_ID
+    if STORAGE_BACKEND == "supabase":
+        required_vars["SUPABASE_URL"] = SUPABASE_URL
+        required_vars["SUPABASE_KEY"] = SUPABASE_KEY
     
     missing_vars = [var for var, value in required_vars.items() if not value]
     
@@ -1,7 +1,15 @@
-"""Supabase database client initialization"""
+"""Database client and ticket repository initialization"""
 
 from supabase import create_client, Client
-from config import SUPABASE_URL, SUPABASE_KEY, logger, ConfigurationError
+from config import (
+    SUPABASE_URL,
+    SUPABASE_KEY,
+    STORAGE_BACKEND,
+    SQLITE_PATH,
+    logger,
+    ConfigurationError
+)
+from repository import TicketRepository, SupabaseTicketRepository, create_ticket_cache
 
 
 def get_supabase_client() -> Client:
@@ -21,3 +29,24 @@ def get_supabase_client() -> Client:
     except Exception as e:
         logger.error(f"Failed to initialize Supabase client: {e}")
         raise ConfigurationError(f"Supabase initialization failed: {e}")
+
+
+def create_repository() -> TicketRepository:
+    """
+    Crea el repositorio de tickets del backend configurado (STORAGE_BACKEND).
+
+    Raises:
+        ConfigurationError: Si falla la inicialización del backend
+    """
+    cache = create_ticket_cache()
+
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_repository import SQLiteTicketRepository
+
+        try:
+            return SQLiteTicketRepository(SQLITE_PATH, cache=cache)
+        except Exception as e:
+            logger.error(f"Failed to initialize SQLite storage: {e}")
+            raise ConfigurationError(f"SQLite initialization failed: {e}")
+
+    return SupabaseTicketRepository(get_supabase_client(), cache=cache)
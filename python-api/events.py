@@ -0,0 +1,212 @@
+"""In-process broker for ticket change events served over SSE"""
+
+import asyncio
+import json
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    TICKET_STREAM_BUFFER_SIZE,
+    TICKET_STREAM_COALESCE_MS,
+    TICKET_STREAM_HEARTBEAT_SECONDS,
+    TICKET_STREAM_RETRY_MS
+)
+
+
+# Columnas que viajan en cada delta (el cliente ya tiene el resto)
+CREATED_FIELDS = ("id", "created_at", "description", "status", "priority", "processed")
+UPDATED_FIELDS = (
+    "id", "category", "sentiment", "confidence", "analysis_stage",
+    "status", "processed", "processed_at",
+)
+
+
+class TicketEventBroker:
+    """
+    Publica deltas de tickets (created / updated) a los suscriptores SSE.
+
+    - Coalescencia: los cambios se acumulan por ticket durante
+      `coalesce_ms` y se emiten juntos; varias actualizaciones del mismo
+      ticket en ese intervalo producen un solo evento.
+    - Reanudación: los últimos `buffer_size` eventos quedan en un buffer
+      circular; un cliente que vuelve con Last-Event-ID recibe lo que se
+      perdió, o un evento `reset` si ya no está en el buffer o el ID es de
+      otro arranque del proceso.
+    - Suscriptores baratos: no hay cola ni timer por cliente; todos esperan
+      el mismo asyncio.Event, que se reemplaza en cada emisión (y en cada
+      heartbeat compartido), y leen del buffer a partir de su último ID.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = TICKET_STREAM_BUFFER_SIZE,
+        coalesce_ms: float = TICKET_STREAM_COALESCE_MS,
+        heartbeat_seconds: float = TICKET_STREAM_HEARTBEAT_SECONDS,
+        retry_ms: int = TICKET_STREAM_RETRY_MS
+    ):
+        self.coalesce_seconds = coalesce_ms / 1000
+        self.heartbeat_seconds = heartbeat_seconds
+        self.retry_ms = retry_ms
+        # Prefijo de los IDs: distingue arranques del proceso
+        self.epoch = uuid.uuid4().hex[:8]
+
+        self._buffer: Deque[Tuple[int, str, Dict[str, Any]]] = deque(maxlen=buffer_size)
+        self._sequence = 0
+        # ticket_id -> (tipo, delta) pendiente de emitir
+        self._pending: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._heartbeat_handle: Optional[asyncio.TimerHandle] = None
+        self._wakeup = asyncio.Event()
+        self._subscribers = 0
+        self._counters = {"published": 0, "coalesced": 0, "emitted": 0, "resets": 0}
+
+    # ============================
+    # Publicación
+    # ============================
+
+    def ticket_created(self, ticket_data: Dict[str, Any]) -> None:
+        self._publish("created", _pick(ticket_data, CREATED_FIELDS))
+
+    def tickets_created(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for ticket_data in rows:
+            self.ticket_created(ticket_data)
+
+    def ticket_updated(self, ticket_data: Dict[str, Any]) -> None:
+        self._publish("updated", _pick(ticket_data, UPDATED_FIELDS))
+
+    def tickets_failed(self, ticket_ids: Iterable[str]) -> None:
+        for ticket_id in ticket_ids:
+            self._publish("updated", {"id": ticket_id, "status": "error"})
+
+    def _publish(self, kind: str, delta: Dict[str, Any]) -> None:
+        ticket_id = str(delta.get("id", ""))
+        if not ticket_id:
+            return
+        self._counters["published"] += 1
+
+        previous = self._pending.get(ticket_id)
+        if previous is not None:
+            # Un created seguido de updated se emite como created con los campos nuevos
+            self._counters["coalesced"] += 1
+            kind = previous[0] if previous[0] == "created" else kind
+            delta = {**previous[1], **delta}
+        self._pending[ticket_id] = (kind, delta)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Fuera del event loop (scripts): no hay suscriptores que avisar
+            self._pending.clear()
+            return
+        if self._loop is not loop:
+            self._loop, self._flush_handle, self._heartbeat_handle = loop, None, None
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.coalesce_seconds, self._flush)
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for kind, delta in pending.values():
+            self._sequence += 1
+            self._buffer.append((self._sequence, kind, delta))
+        self._counters["emitted"] += len(pending)
+        self._wake()
+
+    def _heartbeat(self) -> None:
+        """Un solo timer para todos: despierta a los suscriptores para el keep-alive"""
+        self._heartbeat_handle = None
+        if self._subscribers:
+            self._wake()
+            self._heartbeat_handle = self._loop.call_later(self.heartbeat_seconds, self._heartbeat)
+
+    def _wake(self) -> None:
+        # Despierta a todos los suscriptores y prepara el evento de la próxima emisión
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+
+    # ============================
+    # Suscripción
+    # ============================
+
+    async def subscribe(self, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Genera el flujo SSE ya formateado, desde `last_event_id` si se indica"""
+        self._subscribers += 1
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._flush_handle, self._heartbeat_handle = loop, None, None
+        if self._heartbeat_handle is None:
+            self._heartbeat_handle = loop.call_later(self.heartbeat_seconds, self._heartbeat)
+        try:
+            yield f"retry: {self.retry_ms}\n\n"
+
+            cursor, lost = self._resume_position(last_event_id)
+            if lost:
+                self._counters["resets"] += 1
+                yield self._format("reset", self._sequence, {"reason": "history_unavailable"})
+
+            while True:
+                if self._buffer and self._buffer[0][0] > cursor + 1:
+                    # Cliente lento: el buffer ya descartó eventos que no recibió
+                    self._counters["resets"] += 1
+                    cursor = self._sequence
+                    yield self._format("reset", cursor, {"reason": "history_unavailable"})
+                    continue
+                events = self._events_after(cursor)
+                if events:
+                    cursor = events[-1][0]
+                    yield "".join(self._format(kind, sequence, delta) for sequence, kind, delta in events)
+                    continue
+
+                await self._wakeup.wait()
+                if not self._events_after(cursor):
+                    # Heartbeat: comentario SSE para que proxies y clientes no cierren la conexión
+                    yield ": keep-alive\n\n"
+        finally:
+            self._subscribers -= 1
+
+    def _resume_position(self, last_event_id: Optional[str]) -> Tuple[int, bool]:
+        """(último ID ya entregado, si se perdieron eventos)"""
+        if not last_event_id:
+            return self._sequence, False
+        epoch, _, raw_sequence = last_event_id.partition("-")
+        try:
+            sequence = int(raw_sequence)
+        except ValueError:
+            return self._sequence, True
+        if epoch != self.epoch or sequence > self._sequence:
+            return self._sequence, True
+        oldest = self._buffer[0][0] if self._buffer else self._sequence + 1
+        if sequence + 1 < oldest:
+            return self._sequence, True
+        return sequence, False
+
+    def _events_after(self, cursor: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        if not self._buffer or self._buffer[-1][0] <= cursor:
+            return []
+        # Los IDs del buffer son consecutivos: índice directo al primero pendiente
+        start = max(0, len(self._buffer) - (self._buffer[-1][0] - cursor))
+        return [self._buffer[index] for index in range(start, len(self._buffer))]
+
+    def _format(self, kind: str, sequence: int, data: Dict[str, Any]) -> str:
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+        return f"id: {self.epoch}-{sequence}\nevent: {kind}\ndata: {payload}\n\n"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": self._subscribers,
+            "last_event_id": f"{self.epoch}-{self._sequence}",
+            "buffered": len(self._buffer),
+            "buffer_size": self._buffer.maxlen,
+            "pending": len(self._pending),
+            "coalesce_ms": self.coalesce_seconds * 1000,
+            **self._counters
+        }
+
+
+def _pick(row: Dict[str, Any], fields: Tuple[str, ...]) -> Dict[str, Any]:
+    return {field: row[field] for field in fields if field in row}
+
+
+ticket_events = TicketEventBroker()
@@ -14,3 +14,18 @@ class LLMAnalysisError(TicketProcessingError):
 class DatabaseError(TicketProcessingError):
     """Raised when database operations fail"""
     pass
+
+
+class TicketNotFoundError(TicketProcessingError):
+    """Raised when the requested ticket does not exist"""
+    pass
+
+
+class InvalidTicketError(TicketProcessingError):
+    """Raised when a ticket cannot be processed (e.g. empty description)"""
+    pass
+
+
+class TicketInProgressError(TicketProcessingError):
+    """Raised when another caller is already processing the ticket"""
+    pass
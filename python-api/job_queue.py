@@ -0,0 +1,321 @@
+"""In-process async job queue and worker pool for ticket processing"""
+
+import asyncio
+import itertools
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from exceptions import (
+    LLMAnalysisError,
+    TicketNotFoundError,
+    InvalidTicketError,
+    TicketInProgressError
+)
+from processing import process_ticket_by_id, process_tickets_by_id
+from repository import TicketRepository
+from priority import PRIORITY_RANK, priority_rank
+from models import TicketPriority
+from metrics import LatencyTracker, queue_wait_seconds
+from config import (
+    logger,
+    TICKET_QUEUE_ENABLED,
+    TICKET_QUEUE_WORKERS,
+    TICKET_QUEUE_MAX_SIZE,
+    TICKET_QUEUE_MAX_RETRIES,
+    TICKET_QUEUE_BACKOFF_SECONDS,
+    TICKET_QUEUE_PRIORITY_AGING_SECONDS,
+    CLAIM_STALE_SECONDS,
+    LLM_PACK_SIZE
+)
+
+
+class TicketJobQueue:
+    """
+    Cola acotada de tickets pendientes atendida por un pool de workers.
+
+    Los fallos de LLM se reintentan con backoff exponencial; el resto de
+    errores se registran y el ticket queda en estado 'error'.
+
+    Con `pack_size` > 1 cada worker toma, además del primero, los tickets
+    que ya esperan en la cola (hasta pack_size) y los procesa como un lote,
+    de modo que comparten claim, llamadas al LLM y escritura.
+
+    El orden es por prioridad con aging: la clave de cada ticket es su
+    instante de encolado más `rango * aging_seconds` (high=0, medium=1,
+    low=2), así que un ticket low nunca espera más de 2 * aging_seconds
+    por detrás de tickets high que lleguen después que él.
+    """
+
+    def __init__(
+        self,
+        repository: TicketRepository,
+        workers: int = TICKET_QUEUE_WORKERS,
+        max_size: int = TICKET_QUEUE_MAX_SIZE,
+        max_retries: int = TICKET_QUEUE_MAX_RETRIES,
+        backoff_seconds: float = TICKET_QUEUE_BACKOFF_SECONDS,
+        pack_size: int = LLM_PACK_SIZE,
+        aging_seconds: float = TICKET_QUEUE_PRIORITY_AGING_SECONDS
+    ):
+        self.repository = repository
+        self.workers = workers
+        self.max_size = max_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.pack_size = max(1, pack_size)
+        self.aging_seconds = aging_seconds
+
+        # (clave, secuencia, ticket_id, intento, prioridad, encolado en)
+        self._queue: "asyncio.PriorityQueue[tuple]" = asyncio.PriorityQueue(maxsize=max_size)
+        self._sequence = itertools.count()
+        self._depth = {priority: 0 for priority in PRIORITY_RANK}
+        self._waits = {priority: LatencyTracker() for priority in PRIORITY_RANK}
+        self._tasks: List[asyncio.Task] = []
+        self._retry_tasks: Set[asyncio.Task] = set()
+        # IDs encolados o en proceso, para no encolar dos veces el mismo ticket
+        self._pending: Set[str] = set()
+        self._busy = 0
+        self._counters = {
+            "enqueued": 0,
+            "rejected": 0,
+            "processed": 0,
+            "failed": 0,
+            "retried": 0,
+            "recovered": 0
+        }
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Arranca los workers"""
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(index), name=f"ticket-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"Ticket queue started with {self.workers} workers")
+
+    async def stop(self) -> None:
+        """Detiene los workers y descarta los reintentos programados"""
+        for task in [*self._tasks, *self._retry_tasks]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retry_tasks, return_exceptions=True)
+        self._tasks = []
+        self._retry_tasks.clear()
+        logger.info("Ticket queue stopped")
+
+    def enqueue(self, ticket_id: str, priority: Optional[str] = None, attempt: int = 0) -> bool:
+        """
+        Encola un ticket sin bloquear. Sin prioridad conocida cuenta como medium.
+
+        Returns:
+            False si la cola está llena (backpressure); True si quedó encolado
+            o ya estaba pendiente
+        """
+        if attempt == 0 and ticket_id in self._pending:
+            return True
+        if priority not in PRIORITY_RANK:
+            priority = TicketPriority.MEDIUM.value
+        enqueued_at = time.monotonic()
+        key = enqueued_at + priority_rank(priority) * self.aging_seconds
+        try:
+            self._queue.put_nowait((key, next(self._sequence), ticket_id, attempt, priority, enqueued_at))
+        except asyncio.QueueFull:
+            self._counters["rejected"] += 1
+            logger.warning(f"Ticket queue full, could not enqueue {ticket_id}")
+            return False
+        self._pending.add(ticket_id)
+        self._depth[priority] += 1
+        self._counters["enqueued"] += 1
+        return True
+
+    async def recover(self) -> int:
+        """
+        Reencola los tickets que quedaron sin procesar (p. ej. tras un reinicio
+        con tickets en 'new', 'pending' o 'processing').
+
+        Los que siguen en 'processing' conservan el claim del arranque
+        anterior (o de otro proceso vivo): el claim los rechazaría hasta que
+        venza, así que se encolan cuando pasa CLAIM_STALE_SECONDS desde
+        claimed_at en lugar de descartarse como "procesados en otro lado".
+
+        Returns:
+            Número de tickets reencolados (incluidos los diferidos)
+        """
+        try:
+            tickets = await asyncio.to_thread(self.repository.recoverable_tickets, self.max_size)
+        except Exception as e:
+            logger.error(f"Failed to recover pending tickets: {e}")
+            return 0
+
+        recovered = 0
+        deferred = 0
+        for ticket in tickets:
+            if ticket.get("status") == "processing":
+                delay = self._claim_remaining_seconds(ticket.get("claimed_at"))
+                if delay > 0:
+                    self._enqueue_later(ticket["id"], ticket.get("priority"), 0, delay)
+                    deferred += 1
+                    recovered += 1
+                    continue
+            if not self.enqueue(ticket["id"], ticket.get("priority")):
+                break
+            recovered += 1
+
+        self._counters["recovered"] += recovered
+        logger.info(
+            f"Recovered {recovered} unprocessed tickets into the queue "
+            f"({deferred} deferred until their processing claim goes stale)"
+        )
+        return recovered
+
+    @staticmethod
+    def _claim_remaining_seconds(claimed_at: Optional[str]) -> float:
+        """Segundos hasta que el claim se pueda retomar (+1 s de margen); 0 si ya venció"""
+        if not claimed_at:
+            return 0.0
+        try:
+            moment = datetime.fromisoformat(str(claimed_at))
+        except ValueError:
+            return float(CLAIM_STALE_SECONDS)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        age = (datetime.now(timezone.utc) - moment).total_seconds()
+        return max(0.0, CLAIM_STALE_SECONDS - age + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "depth": self._queue.qsize(),
+            "max_size": self.max_size,
+            "workers": self.workers,
+            "pack_size": self.pack_size,
+            "busy_workers": self._busy,
+            "utilization": round(self._busy / self.workers, 4) if self.workers else 0.0,
+            "scheduled_retries": len(self._retry_tasks),
+            "priority_aging_seconds": self.aging_seconds,
+            "by_priority": {
+                priority: {
+                    "depth": self._depth[priority],
+                    "waited": len(self._waits[priority]),
+                    "wait_p50_ms": self._wait_ms(priority, 0.5),
+                    "wait_p95_ms": self._wait_ms(priority, 0.95)
+                }
+                for priority in PRIORITY_RANK
+            },
+            **self._counters
+        }
+
+    def _wait_ms(self, priority: str, quantile: float) -> Optional[float]:
+        seconds = self._waits[priority].percentile(quantile)
+        return round(seconds * 1000, 1) if seconds is not None else None
+
+    def _take(self, item: tuple) -> tuple:
+        """Registra la espera en cola del ticket y devuelve (ticket_id, intento, prioridad)"""
+        _, _, ticket_id, attempt, priority, enqueued_at = item
+        waited = time.monotonic() - enqueued_at
+        self._depth[priority] -= 1
+        self._waits[priority].record(waited)
+        queue_wait_seconds.observe(waited, priority=priority)
+        return ticket_id, attempt, priority
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            jobs = [self._take(await self._queue.get())]
+            # Sin esperar: solo se agrupa lo que ya está en la cola, en orden de prioridad
+            while len(jobs) < self.pack_size and not self._queue.empty():
+                jobs.append(self._take(self._queue.get_nowait()))
+            self._busy += 1
+            try:
+                if len(jobs) == 1:
+                    await self._run(*jobs[0])
+                else:
+                    await self._run_many(jobs)
+            finally:
+                self._busy -= 1
+                for _ in jobs:
+                    self._queue.task_done()
+
+    async def _run(self, ticket_id: str, attempt: int, priority: str) -> None:
+        retry_scheduled = False
+        try:
+            await process_ticket_by_id(self.repository, ticket_id)
+            self._counters["processed"] += 1
+        except LLMAnalysisError as e:
+            if attempt < self.max_retries:
+                self._schedule_retry(ticket_id, priority, attempt + 1)
+                retry_scheduled = True
+                logger.warning(f"Ticket {ticket_id} analysis failed (attempt {attempt + 1}), retrying: {e}")
+            else:
+                self._counters["failed"] += 1
+                logger.error(f"Ticket {ticket_id} failed after {attempt + 1} attempts: {e}")
+        except TicketInProgressError:
+            logger.info(f"Ticket {ticket_id} is being processed elsewhere, skipping")
+        except (TicketNotFoundError, InvalidTicketError) as e:
+            self._counters["failed"] += 1
+            logger.warning(f"Skipping ticket {ticket_id}: {e}")
+        except Exception as e:
+            self._counters["failed"] += 1
+            logger.error(f"Unexpected error processing ticket {ticket_id}: {e}")
+        finally:
+            if not retry_scheduled:
+                self._pending.discard(ticket_id)
+
+    async def _run_many(self, jobs: List[tuple]) -> None:
+        attempts = {ticket_id: (attempt, priority) for ticket_id, attempt, priority in jobs}
+        try:
+            results = await process_tickets_by_id(self.repository, list(attempts))
+        except Exception as e:
+            self._counters["failed"] += len(attempts)
+            logger.error(f"Unexpected error processing batch of {len(attempts)} tickets: {e}")
+            self._pending.difference_update(attempts)
+            return
+
+        for result in results:
+            ticket_id = result.ticket_id
+            attempt, priority = attempts[ticket_id]
+            retry_scheduled = False
+            if result.success:
+                self._counters["processed"] += 1
+            elif result.status_code == 503:
+                # Mismo trato que LLMAnalysisError en _run
+                if attempt < self.max_retries:
+                    self._schedule_retry(ticket_id, priority, attempt + 1)
+                    retry_scheduled = True
+                    logger.warning(
+                        f"Ticket {ticket_id} analysis failed (attempt {attempt + 1}), retrying: {result.error}"
+                    )
+                else:
+                    self._counters["failed"] += 1
+                    logger.error(f"Ticket {ticket_id} failed after {attempt + 1} attempts: {result.error}")
+            elif result.status_code == 409:
+                logger.info(f"Ticket {ticket_id} is being processed elsewhere, skipping")
+            else:
+                self._counters["failed"] += 1
+                logger.warning(f"Skipping ticket {ticket_id}: {result.error}")
+            if not retry_scheduled:
+                self._pending.discard(ticket_id)
+
+    def _schedule_retry(self, ticket_id: str, priority: str, attempt: int) -> None:
+        self._enqueue_later(ticket_id, priority, attempt, self.backoff_seconds * (2 ** (attempt - 1)))
+        self._counters["retried"] += 1
+
+    def _enqueue_later(self, ticket_id: str, priority: Optional[str], attempt: int, delay: float) -> None:
+        async def _later() -> None:
+            await asyncio.sleep(delay)
+            if not self.enqueue(ticket_id, priority, attempt):
+                self._pending.discard(ticket_id)
+
+        task = asyncio.create_task(_later())
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+
+def create_job_queue(repository: TicketRepository) -> Optional[TicketJobQueue]:
+    """Crea la cola de procesamiento si está habilitada en la configuración"""
+    if not TICKET_QUEUE_ENABLED:
+        return None
+    return TicketJobQueue(repository)
@@ -0,0 +1,209 @@
+"""Local CPU analyzer backend: zero-shot classification with dynamic batching"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Set, Tuple
+
+from models import TicketAnalysis
+from analyzer import AnalyzerBackend
+from exceptions import LLMAnalysisError
+from metrics import span
+from config import (
+    logger,
+    ConfigurationError,
+    LOCAL_MODEL_ID,
+    LOCAL_MODEL_QUANTIZE,
+    LOCAL_BATCH_MAX_SIZE,
+    LOCAL_BATCH_MAX_WAIT_MS,
+    LOCAL_INFERENCE_THREADS
+)
+
+
+# Hipótesis en español para el modelo NLI, por valor del contrato
+CATEGORY_HYPOTHESES = {
+    "Técnico": "un problema técnico, un error o una falla del sistema",
+    "Facturación": "pagos, cobros, facturas o reembolsos",
+    "Comercial": "información de productos, ventas, planes o cotizaciones",
+}
+CATEGORY_TEMPLATE = "Este ticket trata sobre {}."
+
+SENTIMENT_HYPOTHESES = {
+    "Positivo": "positivo o agradecido",
+    "Neutral": "neutral o informativo",
+    "Negativo": "negativo, molesto o frustrado",
+}
+SENTIMENT_TEMPLATE = "El tono de este mensaje es {}."
+
+
+class LocalAnalyzerBackend(AnalyzerBackend):
+    """
+    Clasifica en CPU con un modelo NLI de transformers (zero-shot), sin
+    depender de la latencia ni de los límites de la API alojada.
+
+    Las peticiones se encolan y un bucle las agrupa en lotes dinámicos: toma
+    lo que haya esperando, hasta batch_size o hasta max_wait_ms desde el
+    primer ticket. Cada lote se ejecuta en un pool de hilos para no bloquear
+    el event loop; mientras los hilos están ocupados la cola sigue creciendo
+    y el siguiente lote sale más grande.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        model_id: str = LOCAL_MODEL_ID,
+        quantize: bool = LOCAL_MODEL_QUANTIZE,
+        batch_size: int = LOCAL_BATCH_MAX_SIZE,
+        max_wait_ms: float = LOCAL_BATCH_MAX_WAIT_MS,
+        threads: int = LOCAL_INFERENCE_THREADS
+    ):
+        self.model_id = model_id
+        self.quantize = quantize
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.threads = max(1, threads)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="local-analyzer")
+        self._pipeline: Any = None
+        self._queue: "Optional[asyncio.Queue[Tuple[str, asyncio.Future]]]" = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._batcher: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+        self._start_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Carga el modelo (en el pool de hilos) y arranca el bucle de lotes"""
+        async with self._start_lock:
+            if self._pipeline is None:
+                loop = asyncio.get_running_loop()
+                self._pipeline = await loop.run_in_executor(self._executor, self._load)
+            if self._batcher is None:
+                self._queue = asyncio.Queue()
+                self._slots = asyncio.Semaphore(self.threads)
+                self._batcher = asyncio.create_task(self._batch_loop(), name="local-analyzer-batcher")
+
+    async def analyze(self, description: str) -> TicketAnalysis:
+        if self._batcher is None:
+            await self.start()
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        with span("local_inference"):
+            await self._queue.put((description, future))
+            return await future
+
+    async def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, *self._batches, return_exceptions=True)
+            self._batcher = None
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(LLMAnalysisError("Local analyzer is shutting down"))
+        self._executor.shutdown(wait=False)
+        logger.info("Local analyzer stopped")
+
+    # ============================
+    # Lotes dinámicos
+    # ============================
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            # Un lote por hilo libre; mientras tanto los tickets se acumulan en la cola
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # Quien esperaba puede haberse ido (cliente desconectado)
+        batch = [(description, future) for description, future in batch if not future.done()]
+        try:
+            if not batch:
+                return
+            loop = asyncio.get_running_loop()
+            analyses = await loop.run_in_executor(
+                self._executor, self._predict, [description for description, _ in batch]
+            )
+        except Exception as e:
+            logger.error(f"Local analyzer batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(LLMAnalysisError(f"Local model failed: {e}"))
+        else:
+            for (_, future), analysis in zip(batch, analyses):
+                if not future.done():
+                    future.set_result(analysis)
+        finally:
+            self._slots.release()
+
+    # ============================
+    # Modelo (se ejecuta en el pool de hilos)
+    # ============================
+
+    def _load(self) -> Any:
+        """
+        Raises:
+            ConfigurationError: Si faltan las dependencias o el modelo no carga
+        """
+        try:
+            import torch
+            from transformers import pipeline
+        except ImportError as e:
+            raise ConfigurationError(
+                f"ANALYZER_BACKEND=local requires transformers and torch "
+                f"(pip install -r requirements-local.txt): {e}"
+            )
+
+        try:
+            classifier = pipeline("zero-shot-classification", model=self.model_id, device=-1)
+            if self.quantize:
+                classifier.model = torch.quantization.quantize_dynamic(
+                    classifier.model, {torch.nn.Linear}, dtype=torch.qint8
+                )
+        except Exception as e:
+            raise ConfigurationError(f"Failed to load local model {self.model_id}: {e}")
+
+        logger.info(f"Local analyzer model loaded: {self.model_id} (quantized={self.quantize})")
+        return classifier
+
+    def _predict(self, descriptions: List[str]) -> List[TicketAnalysis]:
+        categories = self._classify(descriptions, CATEGORY_HYPOTHESES, CATEGORY_TEMPLATE)
+        sentiments = self._classify(descriptions, SENTIMENT_HYPOTHESES, SENTIMENT_TEMPLATE)
+        return [
+            TicketAnalysis(
+                category=category,
+                sentiment=sentiment,
+                # La decisión es tan fiable como la menos segura de las dos
+                confidence=round(min(category_score, sentiment_score), 2)
+            )
+            for (category, category_score), (sentiment, sentiment_score) in zip(categories, sentiments)
+        ]
+
+    def _classify(self, descriptions: List[str], hypotheses: dict, template: str) -> List[Tuple[str, float]]:
+        """Mejor valor y su probabilidad por descripción"""
+        labels = {hypothesis: value for value, hypothesis in hypotheses.items()}
+        outputs = self._pipeline(
+            descriptions,
+            candidate_labels=list(labels),
+            hypothesis_template=template,
+            batch_size=len(descriptions)
+        )
+        if isinstance(outputs, dict):
+            outputs = [outputs]
+        return [(labels[output["labels"][0]], float(output["scores"][0])) for output in outputs]
@@ -3,25 +3,65 @@ Ticket Processing API - Main Application
 FastAPI application for AI-powered ticket categorization and sentiment analysis
 """
 
-from fastapi import FastAPI, status
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from config import validate_configuration, CORS_ORIGINS, logger
-from database import get_supabase_client
+from config import (
+    validate_configuration,
+    CORS_ORIGINS,
+    PRECLASSIFIER_ENABLED,
+    PRECLASSIFIER_TRAIN_ON_STARTUP,
+    PRECLASSIFIER_TRAINING_ROWS,
+    SLOW_REQUEST_LOG_MS,
+    logger
+)
+from database import create_repository
+from preclassifier import preclassifier
+from backends import start_analyzer_backend, close_analyzer_backend
+from job_queue import create_job_queue
+from webhooks import webhook_dispatcher
 from exceptions import TicketProcessingError, LLMAnalysisError, DatabaseError
-from routes import health, tickets, stats
+from metrics import http_request_seconds, start_trace
+from admission import AdmissionMiddleware, admission_controller
+from routes import health, tickets, stats, metrics
 
 # Validate configuration on startup
 validate_configuration()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup / shutdown hooks for shared resources"""
+    if PRECLASSIFIER_ENABLED and PRECLASSIFIER_TRAIN_ON_STARTUP:
+        train_preclassifier()
+    await start_analyzer_backend()
+    await webhook_dispatcher.start()
+    if job_queue is not None:
+        await job_queue.start()
+        await job_queue.recover()
+    yield
+    if job_queue is not None:
+        await job_queue.stop()
+    await webhook_dispatcher.stop()
+    await close_analyzer_backend()
+    repository.close()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Ticket Processing API",
     description="AI-powered ticket categorization and sentiment analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Admission control (dentro de CORS para que los 429 lleven sus cabeceras)
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,8 +71,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Supabase client
-supabase = get_supabase_client()
+# Initialize ticket storage (Supabase o SQLite según STORAGE_BACKEND)
+repository = create_repository()
+
+# Cola de procesamiento interna (opcional)
+job_queue = create_job_queue(repository)
+
+
+def train_preclassifier() -> None:
+    """Entrena el pre-clasificador con tickets ya clasificados por el LLM"""
+    try:
+        rows = repository.training_rows(PRECLASSIFIER_TRAINING_ROWS, min_confidence=0.8)
+        # No aprender de decisiones del propio pre-clasificador ni del fallback
+        rows = [row for row in rows if row.get("analysis_stage") not in ("preclassifier", "fallback")]
+        preclassifier.fit(rows)
+    except Exception as e:
+        logger.warning(f"Pre-classifier training skipped: {e}")
+
+
+@app.middleware("http")
+async def record_request_timing(request: Request, call_next):
+    """Latencia por ruta y desglose por etapas de las peticiones lentas"""
+    trace = start_trace()
+    started = time.perf_counter()
+    status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        # Plantilla de la ruta (/tickets/{ticket_id}) para no crear una serie por ID
+        route = getattr(request.scope.get("route"), "path", "<unmatched>")
+        http_request_seconds.observe(
+            elapsed, method=request.method, route=route, status=str(status_code)
+        )
+        if SLOW_REQUEST_LOG_MS and elapsed * 1000 >= SLOW_REQUEST_LOG_MS:
+            logger.warning(
+                f"Slow request {request.method} {route} -> {status_code} "
+                f"in {elapsed * 1000:.1f}ms [{trace.breakdown() or 'no spans'}]"
+            )
+
 
 # Custom exception handler
 @app.exception_handler(TicketProcessingError)
@@ -58,8 +137,9 @@ async def ticket_processing_error_handler(request, exc: TicketProcessingError):
 
 # Register routes
 app.include_router(health.router)
-app.include_router(tickets.setup_routes(supabase))
-app.include_router(stats.setup_routes(supabase))
+app.include_router(metrics.router)
+app.include_router(tickets.setup_routes(repository, job_queue))
+app.include_router(stats.setup_routes(repository, job_queue))
 
 logger.info("Application initialized successfully")
 
@@ -0,0 +1,262 @@
+"""Request-scoped timing spans and Prometheus-format metrics"""
+
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import METRICS_ENABLED
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+INF_BUCKET = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Contador monótono con etiquetas"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram:
+    """Histograma de duraciones (segundos) con buckets acumulados"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> (conteos por bucket, suma, total)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(series[0]), series[1], series[2])) for key, series in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_BUCKET)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {repr(float(total))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class LatencyTracker:
+    """Ventana de las últimas latencias (segundos) para estimar percentiles"""
+
+    def __init__(self, window: int = 500):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(quantile * len(ordered)) - 1)]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Exposición en formato de texto de Prometheus (0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_seconds = registry.register(Histogram(
+    "ticket_api_http_request_seconds",
+    "HTTP request latency by route",
+    ("method", "route", "status")
+))
+stage_seconds = registry.register(Histogram(
+    "ticket_api_stage_seconds",
+    "Time spent in each processing stage",
+    ("stage",)
+))
+llm_requests_total = registry.register(Counter(
+    "ticket_api_llm_requests_total",
+    "LLM calls by outcome (ok, error, invalid_output)",
+    ("outcome",)
+))
+llm_errors_total = registry.register(Counter(
+    "ticket_api_llm_errors_total",
+    "LLM failures by error type",
+    ("type",)
+))
+analysis_cache_lookups_total = registry.register(Counter(
+    "ticket_api_analysis_cache_lookups_total",
+    "Analysis cache lookups by result (memory_hit, disk_hit, miss)",
+    ("result",)
+))
+ticket_cache_lookups_total = registry.register(Counter(
+    "ticket_api_ticket_cache_lookups_total",
+    "Ticket row cache lookups by result (hit, miss)",
+    ("result",)
+))
+classifications_total = registry.register(Counter(
+    "ticket_api_classifications_total",
+    "Tickets classified by cascade stage",
+    ("stage",)
+))
+webhook_deliveries_total = registry.register(Counter(
+    "ticket_api_webhook_deliveries_total",
+    "Webhook delivery attempts by outcome (delivered, failed)",
+    ("outcome",)
+))
+
+llm_hedges_total = registry.register(Counter(
+    "ticket_api_llm_hedges_total",
+    "Hedged analyzer calls by winner (primary, hedge, none)",
+    ("winner",)
+))
+analyzer_fallbacks_total = registry.register(Counter(
+    "ticket_api_analyzer_fallbacks_total",
+    "Analyses served by the fallback backend while the circuit is open",
+    ("backend",)
+))
+circuit_transitions_total = registry.register(Counter(
+    "ticket_api_circuit_transitions_total",
+    "Analyzer circuit breaker transitions by new state",
+    ("state",)
+))
+
+admission_rejections_total = registry.register(Counter(
+    "ticket_api_admission_rejections_total",
+    "Requests rejected with 429 by route and reason (concurrency, rate)",
+    ("route", "reason")
+))
+
+single_flight_total = registry.register(Counter(
+    "ticket_api_single_flight_total",
+    "Ticket processing calls by single-flight role (leader, coalesced, waited_for_peer)",
+    ("role",)
+))
+
+queue_wait_seconds = registry.register(Histogram(
+    "ticket_api_queue_wait_seconds",
+    "Time tickets wait in the processing queue before a worker takes them",
+    ("priority",)
+))
+
+
+# ============================
+# Spans por petición
+# ============================
+
+class RequestTrace:
+    """Duraciones de las etapas ejecutadas durante una petición"""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+
+    def breakdown(self) -> str:
+        return ", ".join(f"{stage}={duration * 1000:.1f}ms" for stage, duration in self.spans)
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+
+def start_trace() -> RequestTrace:
+    trace = RequestTrace()
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Mide una etapa: alimenta el histograma ticket_api_stage_seconds y,
+    si hay una petición en curso, su desglose de tiempos.
+    Sirve igual en código síncrono que alrededor de un await.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - started
+        stage_seconds.observe(duration, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, duration))
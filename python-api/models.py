@@ -2,6 +2,8 @@ from pydantic import BaseModel, Field, field_validator, ConfigDict
 from typing import Optional, Dict, Any, List
 from enum import Enum
 
+from config import BATCH_MAX_TICKETS
+
 
 # Enums for Type Safety
 class TicketCategory(str, Enum):
@@ -16,6 +18,29 @@ class TicketSentiment(str, Enum):
     NEGATIVO = "Negativo"
 
 
+class TicketStatus(str, Enum):
+    NEW = "new"
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    ERROR = "error"
+
+
+# Orden de procesamiento en la cola interna
+class TicketPriority(str, Enum):
+    HIGH = "high"
+    MEDIUM = "medium"
+    LOW = "low"
+
+
+# Etapa de la cascada que tomó la decisión de clasificación
+class AnalysisStage(str, Enum):
+    PRECLASSIFIER = "preclassifier"
+    LLM = "llm"
+    # Respuesta degradada mientras el circuito del modelo está abierto
+    FALLBACK = "fallback"
+
+
 # Resultado estructurado del análisis LLM
 class TicketAnalysis(BaseModel):
     model_config = ConfigDict(use_enum_values=True)
@@ -33,6 +58,14 @@ class TicketAnalysis(BaseModel):
     )
 
 
+# Análisis junto con la etapa que lo produjo
+class ClassificationResult(BaseModel):
+    model_config = ConfigDict(use_enum_values=True)
+
+    analysis: TicketAnalysis
+    stage: AnalysisStage
+
+
 # Modelo de entrada para crear tickets
 class CreateTicketRequest(BaseModel):
     description: str = Field(
@@ -59,6 +92,16 @@ class ProcessTicketRequest(BaseModel):
     )
 
 
+# Modelo de entrada para procesar tickets en lote
+class ProcessTicketsRequest(BaseModel):
+    ticket_ids: List[str] = Field(
+        ...,
+        min_length=1,
+        max_length=BATCH_MAX_TICKETS,
+        description="IDs of the existing tickets to process"
+    )
+
+
 # Modelo de respuesta para tickets procesados
 class TicketResponse(BaseModel):
     id: str
@@ -66,10 +109,44 @@ class TicketResponse(BaseModel):
     category: Optional[str] = None
     sentiment: Optional[str] = None
     confidence: Optional[float] = None
+    analysis_stage: Optional[str] = None
+    priority: Optional[str] = None
     processed: bool
     message: str
 
 
+# Resultado individual dentro de un procesamiento en lote
+class ProcessTicketResult(BaseModel):
+    ticket_id: str
+    success: bool
+    status_code: int
+    ticket: Optional[TicketResponse] = None
+    error: Optional[str] = None
+
+
+# Modelo de respuesta para procesamiento en lote
+class ProcessTicketsResponse(BaseModel):
+    results: List[ProcessTicketResult]
+    processed: int
+    failed: int
+
+
+# Resultado individual dentro de una carga masiva (index = posición en la entrada)
+class CreateTicketResult(BaseModel):
+    index: int
+    success: bool
+    status_code: int
+    ticket: Optional[TicketResponse] = None
+    error: Optional[str] = None
+
+
+# Modelo de respuesta para carga masiva
+class CreateTicketsResponse(BaseModel):
+    results: List[CreateTicketResult]
+    created: int
+    failed: int
+
+
 # Modelo de respuesta de errores
 class ErrorResponse(BaseModel):
     error: str
@@ -77,8 +154,29 @@ class ErrorResponse(BaseModel):
     error_type: str
 
 
+# Filtros comunes para listar tickets
+class TicketFilters(BaseModel):
+    model_config = ConfigDict(use_enum_values=True)
+
+    processed: Optional[bool] = None
+    status: Optional[TicketStatus] = None
+    category: Optional[TicketCategory] = None
+    sentiment: Optional[TicketSentiment] = None
+
+
 # Modelo de respuesta para lista de tickets
 class TicketListResponse(BaseModel):
     tickets: List[Dict[str, Any]]
     count: int
     limit: int
+    next_cursor: Optional[str] = None
+
+
+# Modelo de respuesta para búsqueda de texto completo
+class TicketSearchResponse(BaseModel):
+    query: str
+    sort: str
+    results: List[Dict[str, Any]]
+    count: int
+    limit: int
+    next_cursor: Optional[str] = None
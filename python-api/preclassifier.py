@@ -0,0 +1,304 @@
+"""Local keyword pre-classifier that resolves clear tickets before the LLM"""
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from models import TicketAnalysis, AnalysisStage, ClassificationResult
+from cache import normalize_description
+from analyzer import AnalyzerBackend
+from config import (
+    logger,
+    PRECLASSIFIER_ENABLED,
+    PRECLASSIFIER_THRESHOLD,
+    PRECLASSIFIER_MIN_SUPPORT
+)
+from metrics import classifications_total, span
+
+
+# Términos ya normalizados (sin tildes, minúsculas) con su peso
+CATEGORY_LEXICON: Dict[str, Dict[str, float]] = {
+    "Técnico": {
+        "error": 3, "falla": 2, "fallo": 2, "bug": 3, "no funciona": 3,
+        "no carga": 3, "se cae": 3, "caido": 2, "crash": 3, "lento": 2,
+        "lentitud": 2, "conexion": 2, "no puedo iniciar sesion": 3,
+        "iniciar sesion": 2, "contrasena": 2, "password": 2, "login": 2,
+        "acceso": 1.5, "aplicacion": 1, "app": 1, "pantalla": 1,
+        "servidor": 2, "timeout": 3, "500": 2, "404": 2, "no me deja": 2,
+        "bloqueado": 1.5, "se congela": 3, "no abre": 2,
+    },
+    "Facturación": {
+        "factura": 3, "facturas": 3, "facturacion": 3, "cobro": 3,
+        "cobros": 3, "cobraron": 3, "cobrado": 3, "cargo": 2, "cargos": 2,
+        "pago": 2, "pagos": 2, "pague": 2, "reembolso": 3, "devolucion": 2,
+        "tarjeta": 2, "suscripcion": 2, "mensualidad": 2, "recibo": 2,
+        "dos veces": 2, "doble cobro": 3, "iva": 2, "saldo": 2, "debito": 2,
+    },
+    "Comercial": {
+        "cotizacion": 3, "presupuesto": 2.5, "demo": 3, "demostracion": 3,
+        "plan": 1.5, "planes": 2, "informacion": 1.5, "ventas": 2,
+        "comprar": 2, "adquirir": 2, "contratar": 2, "licencias": 2,
+        "precios": 1.5, "descuento": 1.5, "promocion": 2, "catalogo": 2,
+        "distribuidor": 2, "me interesa": 2.5, "interesado": 2,
+        "interesados": 2,
+    },
+}
+
+SENTIMENT_LEXICON: Dict[str, Dict[str, float]] = {
+    "Negativo": {
+        "molesto": 3, "molesta": 2, "frustrado": 3, "frustrante": 3,
+        "pesimo": 3, "terrible": 3, "horrible": 3, "inaceptable": 3,
+        "urgente": 2, "indignado": 3, "harto": 3, "queja": 2, "reclamo": 2,
+        "nadie responde": 2, "otra vez": 1.5, "cancelar": 1.5, "peor": 2,
+        "decepcionado": 3, "enojado": 3, "furioso": 3,
+    },
+    "Positivo": {
+        "gracias": 2.5, "excelente": 3, "genial": 3, "perfecto": 2.5,
+        "feliz": 3, "contento": 3, "encantado": 3, "satisfecho": 3,
+        "increible": 2.5, "felicitaciones": 3, "agradezco": 3, "muy bien": 2,
+    },
+    "Neutral": {
+        "quisiera": 1.5, "me gustaria": 1.5, "consulta": 1.5, "saber": 1,
+        "informacion": 1,
+    },
+}
+
+# Puntuación base de Neutral cuando no hay ninguna señal positiva ni negativa
+NEUTRAL_PRIOR = 3.0
+
+# Suavizado del cociente de confianza: evita 1.0 con una única señal débil
+CONFIDENCE_SMOOTHING = 0.5
+
+# Tope de confianza de las respuestas de fallback (por debajo del mínimo para entrenar)
+FALLBACK_CONFIDENCE = 0.5
+
+MAX_NGRAM = 4
+
+STOPWORDS = {
+    "de", "la", "que", "el", "en", "los", "del", "se", "las", "por", "un",
+    "para", "con", "una", "su", "al", "lo", "como", "mas", "pero", "sus",
+    "le", "ya", "o", "me", "mi", "es", "y", "a", "no", "si", "hay", "este",
+    "esta", "muy", "hola", "buenas", "buenos", "dias", "tardes",
+}
+
+
+def _ngrams(text: str) -> List[str]:
+    """Genera los n-gramas (1..MAX_NGRAM) del texto normalizado"""
+    tokens = text.split()
+    grams = []
+    for n in range(1, MAX_NGRAM + 1):
+        for i in range(len(tokens) - n + 1):
+            grams.append(" ".join(tokens[i : i + n]))
+    return grams
+
+
+def _score(grams: List[str], lexicon: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    scores: Dict[str, float] = defaultdict(float)
+    for gram in grams:
+        for label, terms in lexicon.items():
+            weight = terms.get(gram)
+            if weight:
+                scores[label] += weight
+    return scores
+
+
+def _decide(scores: Dict[str, float]) -> Tuple[Optional[str], float]:
+    """Retorna la etiqueta ganadora y su confianza frente a la segunda"""
+    if not scores:
+        return None, 0.0
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    top_label, top_score = ranked[0]
+    second_score = ranked[1][1] if len(ranked) > 1 else 0.0
+    if top_score <= 0:
+        return None, 0.0
+    return top_label, top_score / (top_score + second_score + CONFIDENCE_SMOOTHING)
+
+
+class PreClassifier:
+    """
+    Clasificador léxico en proceso.
+
+    Parte de un léxico semilla y puede ampliarlo con términos aprendidos
+    de tickets ya procesados por el LLM (ver fit). Solo decide cuando la
+    confianza combinada supera el umbral configurado.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.category_lexicon = {label: dict(terms) for label, terms in CATEGORY_LEXICON.items()}
+        self.sentiment_lexicon = {label: dict(terms) for label, terms in SENTIMENT_LEXICON.items()}
+        self.learned_terms = 0
+        self._counters = {"preclassifier": 0, "llm": 0, "fallback": 0}
+
+    def predict(self, description: str) -> Optional[TicketAnalysis]:
+        """Clasifica el ticket; None si la predicción no es suficientemente segura"""
+        analysis = self.guess(description)
+        if analysis is None or analysis.confidence < self.threshold:
+            return None
+        return analysis
+
+    def guess(self, description: str) -> Optional[TicketAnalysis]:
+        """Mejor predicción léxica sin aplicar el umbral; None si no hay señales"""
+        grams = _ngrams(normalize_description(description))
+
+        category, category_confidence = _decide(_score(grams, self.category_lexicon))
+
+        sentiment_scores = _score(grams, self.sentiment_lexicon)
+        if not sentiment_scores.get("Positivo") and not sentiment_scores.get("Negativo"):
+            sentiment_scores["Neutral"] += NEUTRAL_PRIOR
+        sentiment, sentiment_confidence = _decide(sentiment_scores)
+
+        if category is None or sentiment is None:
+            return None
+
+        confidence = round(min(category_confidence, sentiment_confidence), 2)
+        return TicketAnalysis(category=category, sentiment=sentiment, confidence=confidence)
+
+    def fit(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Aprende términos discriminativos de tickets ya clasificados.
+
+        Un n-grama se añade al léxico cuando aparece en al menos
+        PRECLASSIFIER_MIN_SUPPORT tickets y el 90% de ellos comparten
+        etiqueta. Los términos semilla nunca se sobrescriben.
+
+        Returns:
+            Número de términos aprendidos
+        """
+        category_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        sentiment_counts: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+        for row in rows:
+            description = row.get("description")
+            if not description or not row.get("category") or not row.get("sentiment"):
+                continue
+            grams = {
+                gram for gram in _ngrams(normalize_description(description))
+                if gram.split()[0] not in STOPWORDS and gram.split()[-1] not in STOPWORDS
+                and len(gram) > 2
+            }
+            for gram in grams:
+                category_counts[gram][row["category"]] += 1
+                sentiment_counts[gram][row["sentiment"]] += 1
+
+        learned = self._merge(category_counts, self.category_lexicon)
+        learned += self._merge(sentiment_counts, self.sentiment_lexicon)
+        self.learned_terms += learned
+        logger.info(f"Pre-classifier learned {learned} terms from processed tickets")
+        return learned
+
+    def _merge(
+        self,
+        counts: Dict[str, Dict[str, int]],
+        lexicon: Dict[str, Dict[str, float]]
+    ) -> int:
+        known = {term for terms in lexicon.values() for term in terms}
+        learned = 0
+        for gram, by_label in counts.items():
+            if gram in known:
+                continue
+            support = sum(by_label.values())
+            label, hits = max(by_label.items(), key=lambda item: item[1])
+            if support >= PRECLASSIFIER_MIN_SUPPORT and hits / support >= 0.9 and label in lexicon:
+                lexicon[label][gram] = 1.5
+                learned += 1
+        return learned
+
+    def record(self, stage: AnalysisStage) -> None:
+        self._counters[stage.value] = self._counters.get(stage.value, 0) + 1
+        classifications_total.inc(stage=stage.value)
+
+    def stats(self) -> Dict[str, Any]:
+        decided = sum(self._counters.values())
+        return {
+            "threshold": self.threshold,
+            "learned_terms": self.learned_terms,
+            "decisions": dict(self._counters),
+            "preclassifier_rate": (
+                round(self._counters["preclassifier"] / decided, 4) if decided else 0.0
+            )
+        }
+
+
+class KeywordAnalyzerBackend(AnalyzerBackend):
+    """
+    Fallback barato con el circuito del modelo abierto: la mejor predicción
+    léxica aunque no alcance el umbral. Sin señales, consulta general neutral
+    con confianza baja.
+    """
+
+    name = "keyword"
+
+    def __init__(self, classifier: PreClassifier):
+        self.classifier = classifier
+
+    async def analyze(self, description: str) -> TicketAnalysis:
+        analysis = self.classifier.guess(description)
+        if analysis is None:
+            return TicketAnalysis(category="Comercial", sentiment="Neutral", confidence=FALLBACK_CONFIDENCE)
+        return TicketAnalysis(
+            category=analysis.category,
+            sentiment=analysis.sentiment,
+            confidence=min(analysis.confidence, FALLBACK_CONFIDENCE)
+        )
+
+
+preclassifier = PreClassifier(threshold=PRECLASSIFIER_THRESHOLD)
+
+
+def _preclassify(description: str) -> Optional[ClassificationResult]:
+    """Decisión del pre-clasificador local, o None si el ticket es ambiguo"""
+    if not PRECLASSIFIER_ENABLED:
+        return None
+    with span("preclassifier"):
+        analysis = preclassifier.predict(description)
+    if analysis is None:
+        return None
+    logger.info(
+        f"Pre-classifier decision: {analysis.category}, {analysis.sentiment}, "
+        f"confidence={analysis.confidence}"
+    )
+    preclassifier.record(AnalysisStage.PRECLASSIFIER)
+    return ClassificationResult(analysis=analysis, stage=AnalysisStage.PRECLASSIFIER)
+
+
+async def classify_ticket_async(description: str, backend: AnalyzerBackend) -> ClassificationResult:
+    """
+    Cascada de clasificación: primero el pre-clasificador local y, solo
+    si el ticket es ambiguo, el análisis con el backend de modelo.
+    """
+    result = _preclassify(description)
+    if result is not None:
+        return result
+
+    result = await backend.classify(description)
+    preclassifier.record(AnalysisStage(result.stage))
+    return result
+
+
+async def classify_tickets_async(
+    descriptions: Sequence[str],
+    backend: AnalyzerBackend,
+    max_concurrency: Optional[int] = None
+) -> List[Union[ClassificationResult, Exception]]:
+    """
+    Cascada para varios tickets: el pre-clasificador decide uno a uno y los
+    ambiguos van juntos al backend de modelo (el LLM los empaqueta, ver
+    analyze_tickets_async; el modelo local los agrupa en lotes).
+
+    Returns:
+        Por ticket y en el mismo orden, su clasificación o la excepción del fallo
+    """
+    results: List[Union[ClassificationResult, Exception, None]] = [
+        _preclassify(description) for description in descriptions
+    ]
+    ambiguous = [index for index, result in enumerate(results) if result is None]
+
+    outcomes = await backend.classify_many(
+        [descriptions[index] for index in ambiguous], max_concurrency
+    )
+    for index, outcome in zip(ambiguous, outcomes):
+        if not isinstance(outcome, Exception):
+            preclassifier.record(AnalysisStage(outcome.stage))
+        results[index] = outcome
+
+    return results
@@ -0,0 +1,82 @@
+"""Initial ticket priority from a cheap urgency heuristic on the description"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from models import TicketPriority
+from cache import normalize_description
+
+
+# Términos ya normalizados (sin tildes, minúsculas) con su peso de urgencia
+URGENCY_LEXICON: Dict[str, float] = {
+    "urgente": 3, "urgencia": 3, "inmediato": 2, "inmediatamente": 2,
+    "lo antes posible": 2, "asap": 2, "critico": 3, "grave": 2,
+    "caido": 3, "se cae": 3, "no funciona": 2, "no puedo": 1.5,
+    "no carga": 2, "produccion": 2, "todos los usuarios": 2,
+    "bloqueado": 2, "perdida de datos": 3, "perdi": 1.5,
+    "doble cobro": 3, "dos veces": 2, "cobraron": 1.5, "fraude": 3,
+    "no autorizado": 3, "hackeo": 3, "seguridad": 2,
+}
+
+# Señales de que el ticket puede esperar; un término de urgencia dentro de
+# una de ellas ("no es urgente") no suma
+CALM_LEXICON: Dict[str, float] = {
+    "consulta": 1.5, "pregunta": 1, "informacion": 1, "sugerencia": 2,
+    "cuando puedan": 2, "sin prisa": 3, "no es urgente": 4, "duda": 1,
+    "cotizacion": 1.5, "demo": 1, "gracias": 0.5, "felicitaciones": 2,
+}
+
+HIGH_PRIORITY_SCORE = 3.0
+LOW_PRIORITY_SCORE = -1.5
+
+# Orden de atención: menor = antes
+PRIORITY_RANK: Dict[str, int] = {
+    TicketPriority.HIGH.value: 0,
+    TicketPriority.MEDIUM.value: 1,
+    TicketPriority.LOW.value: 2,
+}
+
+
+def _spans(text: str, term: str) -> List[Tuple[int, int]]:
+    """Posiciones de `term` como palabras completas en el texto normalizado"""
+    return [match.span() for match in re.finditer(rf"(?<!\S){re.escape(term)}(?!\S)", text)]
+
+
+def _score(text: str, lexicon: Dict[str, float], masked: Sequence[Tuple[int, int]] = ()) -> float:
+    """Suma el peso de cada término que aparece fuera de los tramos `masked`"""
+    def unmasked(span: Tuple[int, int]) -> bool:
+        return not any(start <= span[0] and span[1] <= end for start, end in masked)
+
+    return sum(
+        weight for term, weight in lexicon.items()
+        if any(unmasked(span) for span in _spans(text, term))
+    )
+
+
+def estimate_priority(description: str) -> str:
+    """
+    Prioridad inicial (high, medium, low) según términos de urgencia.
+
+    Es una heurística barata que se ejecuta al crear el ticket, antes de
+    cualquier análisis; solo decide el orden de procesamiento.
+    """
+    text = normalize_description(description)
+    calm_spans = [span for term in CALM_LEXICON for span in _spans(text, term)]
+    score = _score(text, URGENCY_LEXICON, calm_spans) - _score(text, CALM_LEXICON)
+    # Signos de exclamación repetidos o texto en mayúsculas suman urgencia
+    if re.search(r"!{2,}", description):
+        score += 1
+    letters = [ch for ch in description if ch.isalpha()]
+    if len(letters) >= 12 and sum(ch.isupper() for ch in letters) / len(letters) > 0.7:
+        score += 1
+
+    if score >= HIGH_PRIORITY_SCORE:
+        return TicketPriority.HIGH.value
+    if score <= LOW_PRIORITY_SCORE:
+        return TicketPriority.LOW.value
+    return TicketPriority.MEDIUM.value
+
+
+def priority_rank(priority: Optional[str]) -> int:
+    """Rango de atención; sin prioridad se trata como medium"""
+    return PRIORITY_RANK.get(priority or "", PRIORITY_RANK[TicketPriority.MEDIUM.value])
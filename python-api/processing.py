@@ -0,0 +1,328 @@
+"""Core ticket processing shared by the HTTP routes and the job queue"""
+
+import asyncio
+from typing import Dict, List
+
+from fastapi import status
+
+from models import ClassificationResult, ProcessTicketResult, TicketResponse
+from exceptions import (
+    DatabaseError,
+    LLMAnalysisError,
+    TicketNotFoundError,
+    InvalidTicketError,
+    TicketInProgressError
+)
+from preclassifier import classify_ticket_async, classify_tickets_async
+from backends import get_analyzer_backend
+from repository import TicketRepository
+from config import logger, BATCH_MAX_CONCURRENCY
+from metrics import span
+from single_flight import ticket_single_flight
+from events import ticket_events
+
+
+PROCESSED_MESSAGE = "Ticket processed and updated successfully"
+
+
+async def process_ticket_by_id(repository: TicketRepository, ticket_id: str) -> TicketResponse:
+    """
+    Analiza un ticket existente y guarda el resultado.
+
+    Las llamadas concurrentes para el mismo ticket (p. ej. los flujos de
+    prueba y producción de n8n) se coalescen: comparten un único análisis
+    y reciben la misma respuesta, también entre workers del mismo host.
+
+    Usa dos llamadas a BD: un claim atómico que lee el ticket y lo pasa a
+    'processing', y una única escritura con el resultado. Es idempotente:
+    si el ticket ya fue procesado retorna el resultado guardado.
+
+    Raises:
+        TicketNotFoundError: Si el ticket no existe
+        InvalidTicketError: Si el ticket no tiene descripción
+        TicketInProgressError: Si otro llamador ya lo está procesando
+        LLMAnalysisError: Si falla el análisis
+        DatabaseError: Si falla la lectura o la escritura en BD
+    """
+    return await ticket_single_flight.run(
+        ticket_id, lambda after_peer: _process_ticket(repository, ticket_id, after_peer)
+    )
+
+
+async def _process_ticket(repository: TicketRepository, ticket_id: str, after_peer: bool = False) -> TicketResponse:
+    """
+    after_peer: otro worker tenía el ticket y acaba de terminar; si lo dejó
+    procesado se responde con su resultado igual que él, no como repetición.
+    """
+    logger.info(f"Processing existing ticket {ticket_id}...")
+
+    # Un ticket procesado no vuelve a cambiar: si está en caché no hace falta el claim
+    ticket_data = repository.cached(ticket_id)
+    if ticket_data is not None and ticket_data.get("processed", False):
+        return _processed_result(ticket_data, after_peer)
+
+    # Claim ticket: lectura + paso a 'processing' en una sola sentencia
+    try:
+        with span("db_claim"):
+            ticket_data = await asyncio.to_thread(repository.claim, ticket_id)
+    except Exception as e:
+        logger.error(f"Error claiming ticket: {e}")
+        raise DatabaseError(f"Failed to fetch ticket: {str(e)}")
+
+    if ticket_data is None:
+        raise TicketNotFoundError(f"Ticket with ID {ticket_id} not found")
+
+    description = ticket_data.get("description", "")
+
+    # Check if ticket is already processed (idempotency)
+    if ticket_data.get("processed", False):
+        return _processed_result(ticket_data, after_peer)
+
+    if not ticket_data.get("claimed", False):
+        raise TicketInProgressError(f"Ticket {ticket_id} is already being processed")
+
+    if not description or not description.strip():
+        await _mark_error(repository, ticket_id)
+        raise InvalidTicketError("Ticket has no description to process")
+
+    logger.info(f"Ticket {ticket_id} claimed for processing")
+    ticket_events.ticket_updated(ticket_data)
+
+    # Analyze with AI
+    try:
+        with span("classify"):
+            classification = await classify_ticket_async(description, get_analyzer_backend())
+    except Exception as e:
+        # Mark as error if analysis fails
+        await _mark_error(repository, ticket_id)
+        raise LLMAnalysisError(f"Analysis failed: {str(e)}")
+
+    # Update existing ticket in database (una sola escritura, condicionada al claim)
+    try:
+        with span("db_complete"):
+            completed = await asyncio.to_thread(
+                repository.complete, ticket_id, classification, ticket_data.get("claimed_at")
+            )
+    except Exception as e:
+        # Mark as error if update fails
+        await _mark_error(repository, ticket_id)
+        logger.error(f"Database error: {e}")
+        raise DatabaseError(f"Failed to update ticket: {str(e)}")
+
+    if completed is None:
+        # Otro llamador lo volvió a tomar tras vencer el claim: su resultado prevalece
+        logger.warning(f"Claim on ticket {ticket_id} was lost, discarding this result")
+        raise TicketInProgressError(f"Ticket {ticket_id} was re-claimed before the result was saved")
+
+    ticket_data = completed
+    logger.info(f"Ticket updated successfully: {ticket_data['id']}")
+    ticket_events.ticket_updated(ticket_data)
+
+    return _ticket_response(ticket_data, PROCESSED_MESSAGE)
+
+
+async def process_tickets_by_id(repository: TicketRepository, ticket_ids: List[str]) -> List[ProcessTicketResult]:
+    """
+    Procesa varios tickets en lote: un único claim atómico para leerlos,
+    análisis de los ambiguos empaquetados en pocas llamadas al LLM y
+    escrituras agrupadas. Mantiene las reglas de idempotencia de
+    process_ticket_by_id por ticket, pero no pasa por el single-flight:
+    un ticket que otro llamador está procesando se reporta como 409.
+
+    Returns:
+        Un resultado por ID (sin duplicados, en el orden recibido) con el
+        código HTTP que tendría ese ticket en /process-ticket
+
+    Raises:
+        DatabaseError: Si falla el claim del lote
+    """
+    # Eliminar duplicados conservando el orden recibido
+    ticket_ids = list(dict.fromkeys(ticket_ids))
+    logger.info(f"Processing batch of {len(ticket_ids)} tickets...")
+
+    try:
+        with span("db_claim"):
+            rows = {row["id"]: row for row in await asyncio.to_thread(repository.claim_many, ticket_ids)}
+    except Exception as e:
+        logger.error(f"Error fetching ticket batch: {e}")
+        raise DatabaseError(f"Failed to fetch tickets: {str(e)}")
+
+    results: Dict[str, ProcessTicketResult] = {}
+    pending: Dict[str, str] = {}
+    invalid_ids: List[str] = []
+
+    for ticket_id in ticket_ids:
+        ticket_data = rows.get(ticket_id)
+
+        if ticket_data is None:
+            results[ticket_id] = ProcessTicketResult(
+                ticket_id=ticket_id,
+                success=False,
+                status_code=status.HTTP_404_NOT_FOUND,
+                error=f"Ticket with ID {ticket_id} not found"
+            )
+            continue
+
+        description = ticket_data.get("description", "")
+
+        # Idempotencia: los tickets ya procesados devuelven su resultado guardado
+        if ticket_data.get("processed", False):
+            results[ticket_id] = ProcessTicketResult(
+                ticket_id=ticket_id,
+                success=True,
+                status_code=status.HTTP_200_OK,
+                ticket=TicketResponse(
+                    id=ticket_id,
+                    description=description,
+                    category=ticket_data.get("category"),
+                    sentiment=ticket_data.get("sentiment"),
+                    confidence=ticket_data.get("confidence"),
+                    analysis_stage=ticket_data.get("analysis_stage"),
+                    priority=ticket_data.get("priority"),
+                    processed=True,
+                    message="Ticket already processed (idempotent response)"
+                )
+            )
+            continue
+
+        if not ticket_data.get("claimed", False):
+            results[ticket_id] = ProcessTicketResult(
+                ticket_id=ticket_id,
+                success=False,
+                status_code=status.HTTP_409_CONFLICT,
+                error=f"Ticket {ticket_id} is already being processed"
+            )
+            continue
+
+        if not description or not description.strip():
+            invalid_ids.append(ticket_id)
+            results[ticket_id] = ProcessTicketResult(
+                ticket_id=ticket_id,
+                success=False,
+                status_code=status.HTTP_400_BAD_REQUEST,
+                error="Ticket has no description to process"
+            )
+            continue
+
+        pending[ticket_id] = description
+        ticket_events.ticket_updated(ticket_data)
+
+    failed_ids: List[str] = invalid_ids
+
+    if pending:
+        # Analyze with AI: los ambiguos van empaquetados al LLM, con paralelismo acotado por lote
+        with span("classify"):
+            outcomes = await classify_tickets_async(
+                list(pending.values()), get_analyzer_backend(), BATCH_MAX_CONCURRENCY
+            )
+
+        analyses: Dict[str, ClassificationResult] = {}
+
+        for ticket_id, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                failed_ids.append(ticket_id)
+                results[ticket_id] = ProcessTicketResult(
+                    ticket_id=ticket_id,
+                    success=False,
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    error=f"Analysis failed: {str(outcome)}"
+                )
+            else:
+                analyses[ticket_id] = outcome
+
+        # Update analyzed tickets in database (una escritura condicionada al claim de cada ticket)
+        if analyses:
+            claims = {ticket_id: rows[ticket_id].get("claimed_at") for ticket_id in analyses}
+            write_failed = False
+            try:
+                with span("db_complete"):
+                    completed = await asyncio.to_thread(repository.complete_many, analyses, claims)
+                updated = {row["id"]: row for row in completed}
+            except Exception as e:
+                logger.error(f"Database error on batch update: {e}")
+                write_failed = True
+                updated = {}
+
+            for ticket_id in analyses:
+                ticket_data = updated.get(ticket_id)
+                if ticket_data is None and not write_failed:
+                    # Borrado o reclamado por otro: su resultado prevalece, no se marca error
+                    logger.warning(f"Claim on ticket {ticket_id} was lost; discarding this result")
+                    results[ticket_id] = ProcessTicketResult(
+                        ticket_id=ticket_id,
+                        success=False,
+                        status_code=status.HTTP_409_CONFLICT,
+                        error=f"Ticket {ticket_id} was re-claimed before the result was saved"
+                    )
+                    continue
+                if ticket_data is None:
+                    failed_ids.append(ticket_id)
+                    results[ticket_id] = ProcessTicketResult(
+                        ticket_id=ticket_id,
+                        success=False,
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        error="Failed to update ticket"
+                    )
+                    continue
+
+                ticket_events.ticket_updated(ticket_data)
+                results[ticket_id] = ProcessTicketResult(
+                    ticket_id=ticket_id,
+                    success=True,
+                    status_code=status.HTTP_200_OK,
+                    ticket=TicketResponse(
+                        id=ticket_data["id"],
+                        description=ticket_data["description"],
+                        category=ticket_data["category"],
+                        sentiment=ticket_data["sentiment"],
+                        confidence=ticket_data.get("confidence"),
+                        analysis_stage=ticket_data.get("analysis_stage"),
+                        priority=ticket_data.get("priority"),
+                        processed=ticket_data["processed"],
+                        message=PROCESSED_MESSAGE
+                    )
+                )
+
+    # Mark as error (una sola actualización para los fallidos)
+    if failed_ids:
+        try:
+            await asyncio.to_thread(repository.mark_error, failed_ids)
+            ticket_events.tickets_failed(failed_ids)
+        except Exception:
+            pass
+
+    ordered = [results[ticket_id] for ticket_id in ticket_ids]
+    succeeded = sum(1 for result in ordered if result.success)
+    logger.info(f"Batch processed: {succeeded} succeeded, {len(ordered) - succeeded} failed")
+    return ordered
+
+
+def _processed_result(ticket_data: dict, after_peer: bool) -> TicketResponse:
+    """Respuesta para un ticket ya procesado: idempotente, o la del worker que acaba de procesarlo"""
+    if after_peer:
+        logger.info(f"Ticket {ticket_data['id']} was processed by another worker, sharing its result")
+        return _ticket_response(ticket_data, PROCESSED_MESSAGE)
+    logger.info(f"Ticket {ticket_data['id']} already processed, returning cached result")
+    return _ticket_response(ticket_data, "Ticket already processed (idempotent response)")
+
+
+def _ticket_response(ticket_data: dict, message: str) -> TicketResponse:
+    return TicketResponse(
+        id=ticket_data["id"],
+        description=ticket_data.get("description", ""),
+        category=ticket_data.get("category"),
+        sentiment=ticket_data.get("sentiment"),
+        confidence=ticket_data.get("confidence"),
+        analysis_stage=ticket_data.get("analysis_stage"),
+        priority=ticket_data.get("priority"),
+        processed=True,
+        message=message
+    )
+
+
+async def _mark_error(repository: TicketRepository, ticket_id: str) -> None:
+    try:
+        await asyncio.to_thread(repository.mark_error, [ticket_id])
+        ticket_events.tickets_failed([ticket_id])
+    except Exception:
+        pass
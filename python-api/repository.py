@@ -0,0 +1,502 @@
+"""Data access for the tickets table"""
+
+import base64
+import json
+import math
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from supabase import Client
+
+from models import ClassificationResult, TicketFilters
+from cache import TTLCache
+from metrics import ticket_cache_lookups_total
+from config import (
+    CLAIM_STALE_SECONDS,
+    TICKET_CACHE_ENABLED,
+    TICKET_CACHE_MAX_ENTRIES,
+    TICKET_CACHE_TTL_SECONDS
+)
+
+
+# Columnas que los clientes pueden pedir con `fields=`
+TICKET_COLUMNS = (
+    "id",
+    "created_at",
+    "description",
+    "category",
+    "sentiment",
+    "confidence",
+    "analysis_stage",
+    "processed",
+    "status",
+    "priority",
+    "error_message",
+    "claimed_at",
+    "processed_at",
+)
+
+# Columnas siempre incluidas porque forman la clave de paginación
+KEYSET_COLUMNS = ("id", "created_at")
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Cursor opaco con la posición (created_at, id) de la última fila"""
+    raw = json.dumps([row["created_at"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, ticket_id = json.loads(base64.urlsafe_b64decode(padded))
+        return _checked_position(created_at, ticket_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def encode_search_cursor(row: Dict[str, Any]) -> str:
+    """Cursor de búsqueda con la posición (rank, created_at, id) de la última fila"""
+    raw = json.dumps([row["rank"], row["created_at"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, str, str]:
+    """
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, created_at, ticket_id = json.loads(base64.urlsafe_b64decode(padded))
+        rank = float(rank)
+        if not math.isfinite(rank):
+            raise ValueError("Invalid rank")
+        return (rank, *_checked_position(created_at, ticket_id))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _checked_position(created_at: Any, ticket_id: Any) -> Tuple[str, str]:
+    """
+    Valida (created_at, id) del cursor: terminan dentro del filtro or_ de
+    PostgREST, así que solo se aceptan un timestamp ISO y un UUID.
+    """
+    if not isinstance(created_at, str) or not isinstance(ticket_id, str):
+        raise ValueError("Invalid cursor position")
+    datetime.fromisoformat(created_at)
+    return created_at, str(uuid.UUID(ticket_id))
+
+
+def select_columns(fields: Optional[Sequence[str]]) -> str:
+    """Lista de columnas para el select, con la clave de paginación incluida"""
+    if not fields:
+        return "*"
+    columns = [column for column in KEYSET_COLUMNS if column not in fields] + list(fields)
+    return ", ".join(columns)
+
+
+class TicketRepository(ABC):
+    """
+    Interfaz de acceso a tickets que usan las rutas, la cola y el procesamiento.
+
+    Los métodos devuelven filas como diccionarios y dejan propagar las
+    excepciones del backend; cada llamador decide cómo reportarlas.
+
+    Con `cache`, get() lee a través de una LRU de filas; toda escritura
+    hecha por el repositorio actualiza o invalida la entrada afectada.
+    """
+
+    def __init__(self, cache: Optional[TTLCache] = None):
+        self.cache = cache
+
+    # ============================
+    # Lecturas
+    # ============================
+
+    @abstractmethod
+    def get(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_tickets(
+        self,
+        limit: int,
+        filters: Optional[TicketFilters] = None,
+        fields: Optional[Sequence[str]] = None,
+        after: Optional[Tuple[str, str]] = None,
+        since: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Lista tickets del más reciente al más antiguo con paginación keyset.
+
+        Args:
+            limit: Máximo de filas a retornar
+            filters: Filtros de igualdad opcionales
+            fields: Columnas a retornar (None = todas)
+            after: Posición (created_at, id) de la última fila de la página anterior
+            since: Solo tickets creados en o después de este instante (ISO 8601)
+        """
+
+    @abstractmethod
+    def stats(self) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def timeseries(self, start: str, end: str, granularity: str) -> List[Dict[str, Any]]:
+        """Un elemento por hora o día en [start, end) con totales, latencia y desgloses"""
+
+    @abstractmethod
+    def search(
+        self,
+        query: str,
+        limit: int,
+        category: Optional[str] = None,
+        sentiment: Optional[str] = None,
+        sort: str = "relevance",
+        after: Optional[Tuple[float, str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Búsqueda de texto completo sobre la descripción, con índice.
+
+        Args:
+            query: Términos o frases entre comillas ("factura duplicada")
+            limit: Máximo de filas a retornar
+            category: Filtro opcional por categoría
+            sentiment: Filtro opcional por sentimiento
+            sort: "relevance" (mayor rank primero, solo entre las 1000
+                coincidencias más recientes) o "recent"
+            after: Posición (rank, created_at, id) de la última fila de la página anterior
+
+        Returns:
+            Filas con las columnas extra `rank` (mayor = más relevante) y
+            `headline` (fragmento con las coincidencias entre <b></b>)
+        """
+
+    @abstractmethod
+    def recoverable_tickets(self, limit: int) -> List[Dict[str, Any]]:
+        """
+        id, priority, status y claimed_at de tickets sin procesar que
+        quedaron en new, pending o processing
+        """
+
+    @abstractmethod
+    def training_rows(self, limit: int, min_confidence: float) -> List[Dict[str, Any]]:
+        """Tickets ya clasificados con confianza suficiente para entrenar"""
+
+    # ============================
+    # Escrituras
+    # ============================
+
+    @abstractmethod
+    def create(self, description: str, priority: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def create_many(
+        self,
+        descriptions: Sequence[str],
+        priorities: Optional[Sequence[Optional[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Inserta varios tickets con un único INSERT multi-fila, en el mismo orden.
+        `priorities`, si se pasa, va alineado con `descriptions`.
+        """
+
+    @abstractmethod
+    def claim(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Pasa el ticket a 'processing' de forma atómica.
+
+        Returns:
+            La fila con la columna extra `claimed` (True solo para quien ganó
+            el claim), o None si el ticket no existe
+        """
+
+    @abstractmethod
+    def claim_many(self, ticket_ids: List[str]) -> List[Dict[str, Any]]:
+        """Versión en lote de claim: una sola llamada para todos los IDs"""
+
+    @abstractmethod
+    def complete(
+        self,
+        ticket_id: str,
+        classification: ClassificationResult,
+        claimed_at: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Guarda el resultado del análisis y marca el ticket como terminado,
+        solo si sigue en 'processing' con el `claimed_at` que devolvió el
+        claim. Un reclamo posterior (claim vencido tras CLAIM_STALE_SECONDS)
+        gana: este resultado se descarta.
+
+        Returns:
+            La fila actualizada, o None si el claim se perdió o el ticket no existe
+        """
+
+    @abstractmethod
+    def complete_many(
+        self,
+        results: Dict[str, ClassificationResult],
+        claims: Dict[str, Optional[str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Guarda varios resultados con una única escritura, con la misma
+        condición que complete(): `claims` da el claimed_at de cada ticket.
+        Los tickets borrados o reclamados por otro no aparecen en el resultado.
+        """
+
+    @abstractmethod
+    def mark_error(self, ticket_ids: List[str]) -> None:
+        ...
+
+    def close(self) -> None:
+        """Libera los recursos del backend"""
+
+    # ============================
+    # Caché de filas
+    # ============================
+
+    def cached(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        """Fila en caché, sin consultar la BD"""
+        if self.cache is None:
+            return None
+        row = self.cache.get(ticket_id)
+        ticket_cache_lookups_total.inc(result="hit" if row is not None else "miss")
+        return row
+
+    def _remember(self, row: Optional[Dict[str, Any]]) -> None:
+        if self.cache is not None and row and "id" in row:
+            self.cache.set(str(row["id"]), row)
+
+    def _forget(self, ticket_ids: Sequence[str]) -> None:
+        if self.cache is not None:
+            for ticket_id in ticket_ids:
+                self.cache.delete(str(ticket_id))
+
+    @staticmethod
+    def _result_fields(classification: ClassificationResult) -> Dict[str, Any]:
+        return {
+            "category": classification.analysis.category,
+            "sentiment": classification.analysis.sentiment,
+            "confidence": classification.analysis.confidence,
+            "analysis_stage": classification.stage,
+            "processed": True,
+            "status": "done"
+        }
+
+
+class SupabaseTicketRepository(TicketRepository):
+    """Tickets sobre Supabase (PostgREST); estadísticas y claims vía RPC"""
+
+    def __init__(self, client: Client, cache: Optional[TTLCache] = None):
+        super().__init__(cache)
+        self.client = client
+
+    # ============================
+    # Lecturas
+    # ============================
+
+    def get(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        row = self.cached(ticket_id)
+        if row is not None:
+            return row
+        response = self.client.table("tickets").select("*").eq("id", ticket_id).execute()
+        row = response.data[0] if response.data else None
+        self._remember(row)
+        return row
+
+    def list_tickets(
+        self,
+        limit: int,
+        filters: Optional[TicketFilters] = None,
+        fields: Optional[Sequence[str]] = None,
+        after: Optional[Tuple[str, str]] = None,
+        since: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        query = (
+            self.client.table("tickets")
+            .select(select_columns(fields))
+            .order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit)
+        )
+
+        if filters is not None:
+            for column, value in filters.model_dump(exclude_none=True).items():
+                query = query.eq(column, value)
+
+        if since is not None:
+            query = query.gte("created_at", since)
+
+        if after is not None:
+            created_at, ticket_id = after
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{ticket_id})'
+            )
+
+        return query.execute().data or []
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        response = self.client.rpc("get_ticket_stats").execute()
+        return response.data[0] if response.data else None
+
+    def timeseries(self, start: str, end: str, granularity: str) -> List[Dict[str, Any]]:
+        response = self.client.rpc(
+            "get_ticket_timeseries",
+            {"p_from": start, "p_to": end, "p_granularity": granularity}
+        ).execute()
+        return response.data or []
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        category: Optional[str] = None,
+        sentiment: Optional[str] = None,
+        sort: str = "relevance",
+        after: Optional[Tuple[float, str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Búsqueda vía RPC search_tickets (índice GIN con configuración spanish)"""
+        rank, created_at, ticket_id = after if after is not None else (None, None, None)
+        response = self.client.rpc("search_tickets", {
+            "p_query": query,
+            "p_category": category,
+            "p_sentiment": sentiment,
+            "p_sort": sort,
+            "p_limit": limit,
+            "p_after_rank": rank,
+            "p_after_created_at": created_at,
+            "p_after_id": ticket_id
+        }).execute()
+        return response.data or []
+
+    def recoverable_tickets(self, limit: int) -> List[Dict[str, Any]]:
+        response = (
+            self.client.table("tickets")
+            .select("id, priority, status, claimed_at")
+            .eq("processed", False)
+            .in_("status", ["new", "pending", "processing"])
+            .order("created_at")
+            .limit(limit)
+            .execute()
+        )
+        return response.data or []
+
+    def training_rows(self, limit: int, min_confidence: float) -> List[Dict[str, Any]]:
+        response = (
+            self.client.table("tickets")
+            .select("description, category, sentiment, analysis_stage")
+            .eq("processed", True)
+            .gte("confidence", min_confidence)
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        return response.data or []
+
+    # ============================
+    # Escrituras
+    # ============================
+
+    def create(self, description: str, priority: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        response = self.client.table("tickets").insert({
+            "description": description,
+            "processed": False,
+            "status": "pending",
+            "priority": priority
+        }).execute()
+        row = response.data[0] if response.data else None
+        self._remember(row)
+        return row
+
+    def create_many(
+        self,
+        descriptions: Sequence[str],
+        priorities: Optional[Sequence[Optional[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        priorities = priorities or [None] * len(descriptions)
+        response = self.client.table("tickets").insert([
+            {"description": description, "processed": False, "status": "pending", "priority": priority}
+            for description, priority in zip(descriptions, priorities)
+        ]).execute()
+        for row in response.data or []:
+            self._remember(row)
+        return response.data or []
+
+    def claim(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        """Claim atómico vía RPC claim_ticket"""
+        self._forget([ticket_id])
+        response = self.client.rpc(
+            "claim_ticket",
+            {"p_ticket_id": ticket_id, "p_stale_seconds": CLAIM_STALE_SECONDS}
+        ).execute()
+        return response.data[0] if response.data else None
+
+    def claim_many(self, ticket_ids: List[str]) -> List[Dict[str, Any]]:
+        self._forget(ticket_ids)
+        response = self.client.rpc(
+            "claim_tickets",
+            {"p_ticket_ids": ticket_ids, "p_stale_seconds": CLAIM_STALE_SECONDS}
+        ).execute()
+        return response.data or []
+
+    def complete(
+        self,
+        ticket_id: str,
+        classification: ClassificationResult,
+        claimed_at: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        if claimed_at is None:
+            self._forget([ticket_id])
+            return None
+        response = (
+            self.client.table("tickets")
+            .update(self._result_fields(classification))
+            .eq("id", ticket_id)
+            .eq("status", "processing")
+            .eq("claimed_at", claimed_at)
+            .execute()
+        )
+        row = response.data[0] if response.data else None
+        if row is None:
+            self._forget([ticket_id])
+        self._remember(row)
+        return row
+
+    def complete_many(
+        self,
+        results: Dict[str, ClassificationResult],
+        claims: Dict[str, Optional[str]]
+    ) -> List[Dict[str, Any]]:
+        """Guarda varios resultados con una única llamada a la RPC complete_tickets"""
+        self._forget(list(results))
+        rows = [
+            {"id": ticket_id, "claimed_at": claims.get(ticket_id), **self._result_fields(classification)}
+            for ticket_id, classification in results.items()
+            if claims.get(ticket_id) is not None
+        ]
+        if not rows:
+            return []
+        response = self.client.rpc("complete_tickets", {"p_results": rows}).execute()
+        for row in response.data or []:
+            self._remember(row)
+        return response.data or []
+
+    def mark_error(self, ticket_ids: List[str]) -> None:
+        self._forget(ticket_ids)
+        self.client.table("tickets").update({"status": "error"}).in_("id", ticket_ids).execute()
+
+
+def create_ticket_cache() -> Optional[TTLCache]:
+    """Crea la caché de filas de tickets si está habilitada en la configuración"""
+    if not TICKET_CACHE_ENABLED:
+        return None
+    return TTLCache(TICKET_CACHE_MAX_ENTRIES, TICKET_CACHE_TTL_SECONDS)
@@ -0,0 +1,269 @@
+"""Circuit breaker, hedged requests and fallback around the analyzer backend"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from models import AnalysisStage, ClassificationResult, TicketAnalysis
+from analyzer import AnalyzerBackend
+from exceptions import LLMAnalysisError
+from metrics import (
+    LatencyTracker,
+    analyzer_fallbacks_total,
+    circuit_transitions_total,
+    llm_hedges_total
+)
+from config import (
+    logger,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_RESET_SECONDS,
+    LLM_HEDGE_QUANTILE,
+    LLM_HEDGE_MIN_DELAY_MS,
+    LLM_HEDGE_MIN_SAMPLES
+)
+
+
+class CircuitBreaker:
+    """
+    closed -> open tras `failure_threshold` fallos seguidos; open -> half_open
+    pasados `reset_seconds`, dejando pasar una única llamada de prueba que
+    cierra el circuito si sale bien o lo vuelve a abrir si falla.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = LLM_CIRCUIT_RESET_SECONDS
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._counters = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        """True si la llamada puede ir al backend principal"""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._transition("half_open")
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        self._counters["rejected"] += 1
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probing = False
+        if self.state != "closed":
+            self._transition("closed")
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self._counters["opened"] += 1
+            self._transition("open")
+
+    def end_probe(self) -> None:
+        """Fin de la llamada de prueba; si se canceló sin resultado, la siguiente vuelve a probar"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_seconds,
+            **self._counters
+        }
+
+    def _transition(self, state: str) -> None:
+        logger.warning(f"Analyzer circuit {self.state} -> {state}")
+        self.state = state
+        circuit_transitions_total.inc(state=state)
+
+
+class ResilientAnalyzerBackend(AnalyzerBackend):
+    """
+    Envuelve el backend principal:
+
+    - Hedge: si la llamada principal supera el percentil LLM_HEDGE_QUANTILE
+      de sus latencias recientes, lanza la misma petición al backend de hedge
+      y se queda con la primera respuesta válida.
+    - Circuit breaker: los fallos seguidos (cualquier excepción) abren el circuito.
+    - Fallback: con el circuito abierto responde el backend de fallback
+      (etapa 'fallback') en lugar de fallar; sin fallback se lanza el error.
+    """
+
+    def __init__(
+        self,
+        primary: AnalyzerBackend,
+        hedge: Optional[AnalyzerBackend] = None,
+        fallback: Optional[AnalyzerBackend] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_quantile: float = LLM_HEDGE_QUANTILE,
+        hedge_min_delay_ms: float = LLM_HEDGE_MIN_DELAY_MS,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES
+    ):
+        self.primary = primary
+        self.hedge = hedge
+        self.fallback = fallback
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay_ms / 1000.0
+        self.hedge_min_samples = hedge_min_samples
+        # Tiempo de inferencia medido por el propio backend (sin la espera por cupo);
+        # si no lo mide, la duración total de cada llamada
+        self._measured_by_primary = primary.latency is not None
+        self.latency = primary.latency if self._measured_by_primary else LatencyTracker()
+        self.name = primary.name
+        self._counters = {"hedged": 0, "hedge_wins": 0, "fallbacks": 0}
+
+    async def start(self) -> None:
+        for backend in self._backends():
+            await backend.start()
+
+    async def close(self) -> None:
+        for backend in self._backends():
+            await backend.close()
+
+    async def analyze(self, description: str) -> TicketAnalysis:
+        return (await self.classify(description)).analysis
+
+    async def classify(self, description: str) -> ClassificationResult:
+        if not self.breaker.allow():
+            return await self._degrade(description)
+        probe = self.breaker.state == "half_open"
+
+        try:
+            analysis = await self._hedged(description)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            if probe:
+                self.breaker.end_probe()
+        return ClassificationResult(analysis=analysis, stage=AnalysisStage.LLM)
+
+    async def classify_many(
+        self,
+        descriptions: Sequence[str],
+        max_concurrency: Optional[int] = None
+    ) -> List[Union[ClassificationResult, Exception]]:
+        """Lotes sin hedge (modo de throughput); los fallos cuentan para el circuito"""
+        if not self.breaker.allow():
+            return await asyncio.gather(
+                *(self._degrade(description) for description in descriptions),
+                return_exceptions=True
+            )
+        probe = self.breaker.state == "half_open"
+
+        try:
+            outcomes = await self.primary.analyze_many(descriptions, max_concurrency)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        else:
+            failures = sum(1 for outcome in outcomes if isinstance(outcome, Exception))
+            if descriptions and failures == len(descriptions):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        finally:
+            if probe:
+                self.breaker.end_probe()
+
+        return [
+            outcome if isinstance(outcome, Exception)
+            else ClassificationResult(analysis=outcome, stage=AnalysisStage.LLM)
+            for outcome in outcomes
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        delay = self._hedge_delay()
+        return {
+            "analyzer_backend": self.name,
+            "resilience": {
+                "circuit": self.breaker.stats(),
+                "hedge_backend": self.hedge.name if self.hedge else None,
+                "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+                "fallback_backend": self.fallback.name if self.fallback else None,
+                **self._counters
+            }
+        }
+
+    # ============================
+    # Internos
+    # ============================
+
+    def _backends(self) -> List[AnalyzerBackend]:
+        """Backends distintos (el modelo local puede ser hedge y fallback a la vez)"""
+        backends: List[AnalyzerBackend] = []
+        for backend in (self.primary, self.hedge, self.fallback):
+            if backend is not None and all(backend is not seen for seen in backends):
+                backends.append(backend)
+        return backends
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Espera antes del hedge; None mientras no haya muestras suficientes"""
+        if self.hedge is None or len(self.latency) < self.hedge_min_samples:
+            return None
+        return max(self.latency.percentile(self.hedge_quantile), self.hedge_min_delay)
+
+    async def _hedged(self, description: str) -> TicketAnalysis:
+        primary = asyncio.create_task(self.primary.analyze(description))
+        if not self._measured_by_primary:
+            # Latencia de la principal aunque pierda (cancelada cuenta como cota inferior)
+            started = time.monotonic()
+            primary.add_done_callback(lambda _: self.latency.record(time.monotonic() - started))
+
+        delay = self._hedge_delay()
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            return primary.result()
+
+        self._counters["hedged"] += 1
+        logger.info(f"Primary analyzer slower than {delay * 1000:.0f}ms, sending hedge request")
+        hedge = asyncio.create_task(self.hedge.analyze(description))
+        return await self._first_success(primary, hedge)
+
+    async def _first_success(self, primary: asyncio.Task, hedge: asyncio.Task) -> TicketAnalysis:
+        """Primera respuesta válida de las dos; si ambas fallan, el error de la principal"""
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = "primary" if task is primary else "hedge"
+                        if winner == "hedge":
+                            self._counters["hedge_wins"] += 1
+                        llm_hedges_total.inc(winner=winner)
+                        return task.result()
+            llm_hedges_total.inc(winner="none")
+            raise primary.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _degrade(self, description: str) -> ClassificationResult:
+        if self.fallback is None:
+            raise LLMAnalysisError("Analyzer circuit is open and no fallback is configured")
+        analysis = await self.fallback.analyze(description)
+        self._counters["fallbacks"] += 1
+        analyzer_fallbacks_total.inc(backend=self.fallback.name)
+        return ClassificationResult(analysis=analysis, stage=AnalysisStage.FALLBACK)
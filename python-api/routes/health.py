@@ -15,9 +15,16 @@ def read_root() -> Dict[str, Any]:
         "version": "1.0.0",
         "endpoints": {
             "POST /tickets": "Create new ticket and notify n8n",
+            "POST /tickets/bulk": "Create many tickets from a JSON array or NDJSON",
             "POST /process-ticket": "Process ticket with AI analysis",
+            "POST /process-tickets": "Process a batch of tickets with AI analysis",
             "GET /tickets": "List all tickets with filters",
+            "GET /tickets/export": "Stream all tickets as NDJSON or CSV",
+            "GET /tickets/search": "Full-text search over ticket descriptions",
+            "GET /tickets/stream": "Server-Sent Events with ticket changes",
             "GET /tickets/{ticket_id}": "Get ticket by ID",
-            "GET /stats": "Get ticket statistics"
+            "GET /stats": "Get ticket statistics",
+            "GET /stats/timeseries": "Get ticket counts and latency per hour or day",
+            "GET /metrics": "Prometheus metrics (latency per route and stage)"
         }
     }
@@ -1,33 +1,75 @@
 """Statistics endpoint"""
 
-from fastapi import APIRouter, HTTPException, status
-from typing import Dict, Any
-from supabase import Client
+import asyncio
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from typing import Dict, Any, Optional
 
-from config import logger
+from config import logger, STATS_CACHE_TTL_SECONDS, STATS_TIMESERIES_MAX_BUCKETS
+from cache import TTLCache, compute_etag, etag_matches
+from analyzer import analysis_cache
+from preclassifier import preclassifier
+from backends import get_analyzer_backend
+from job_queue import TicketJobQueue
+from repository import TicketRepository
+from webhooks import webhook_dispatcher
+from admission import admission_controller
+from single_flight import ticket_single_flight
+from events import ticket_events
+from metrics import span
 
 router = APIRouter(tags=["Statistics"])
 
+GRANULARITY_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
 
-def setup_routes(supabase: Client) -> APIRouter:
-    """Configure statistics routes with database client"""
+
+def as_utc(value: datetime) -> datetime:
+    """Interpreta fechas sin zona horaria como UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def setup_routes(repository: TicketRepository, job_queue: Optional[TicketJobQueue] = None) -> APIRouter:
+    """Configure statistics routes with ticket repository and optional processing queue"""
+
+    # Respuesta de /stats reutilizada durante unos segundos (el dashboard la sondea)
+    stats_cache = TTLCache(max_entries=1, ttl_seconds=STATS_CACHE_TTL_SECONDS)
     
     @router.get("/stats")
-    async def get_statistics() -> Dict[str, Any]:
-        """Obtiene estadísticas de tickets"""
+    async def get_statistics(request: Request, response: Response) -> Any:
+        """
+        Obtiene estadísticas de tickets.
+        Los contadores se mantienen por triggers en la BD; la respuesta se
+        cachea brevemente y admite peticiones condicionales con ETag.
+        """
         try:
-            logger.info("Fetching ticket statistics")
-            
-            response = supabase.rpc("get_ticket_stats").execute()
-            
-            if response.data and len(response.data) > 0:
-                return response.data[0]
-            
-            logger.warning("No statistics data available")
-            return {
-                "message": "No statistics available",
-                "total_tickets": 0
+            cached = stats_cache.get("stats")
+            if cached is None:
+                logger.info("Fetching ticket statistics")
+                
+                with span("db_stats"):
+                    ticket_stats = await asyncio.to_thread(repository.stats)
+                
+                if not ticket_stats:
+                    logger.warning("No statistics data available")
+                    ticket_stats = {
+                        "message": "No statistics available",
+                        "total_tickets": 0
+                    }
+
+                cached = (ticket_stats, compute_etag(ticket_stats))
+                stats_cache.set("stats", cached)
+
+            ticket_stats, etag = cached
+            headers = {
+                "ETag": etag,
+                "Cache-Control": f"private, max-age={int(STATS_CACHE_TTL_SECONDS)}"
             }
+
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+            response.headers.update(headers)
+            return ticket_stats
             
         except Exception as e:
             logger.error(f"Error fetching statistics: {e}")
@@ -36,4 +78,92 @@ def setup_routes(supabase: Client) -> APIRouter:
                 detail=f"Failed to fetch statistics: {str(e)}"
             )
     
+    @router.get("/stats/timeseries")
+    async def get_statistics_timeseries(
+        start: Optional[datetime] = Query(
+            default=None, alias="from", description="Inicio del rango (ISO 8601); por defecto 7 días atrás"
+        ),
+        end: Optional[datetime] = Query(
+            default=None, alias="to", description="Fin del rango, exclusivo (ISO 8601); por defecto ahora"
+        ),
+        granularity: str = Query(default="hour", pattern="^(hour|day)$")
+    ) -> Dict[str, Any]:
+        """
+        Obtiene tickets por hora o por día, desglosados por categoría,
+        sentimiento y estado, con la latencia media de procesamiento.
+        Se calcula sobre rollups horarios mantenidos por triggers.
+        """
+        end = as_utc(end) if end else datetime.now(timezone.utc)
+        start = as_utc(start) if start else end - timedelta(days=7)
+
+        if start >= end:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="'from' must be earlier than 'to'"
+            )
+
+        if (end - start) / GRANULARITY_STEPS[granularity] > STATS_TIMESERIES_MAX_BUCKETS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Range too large: at most {STATS_TIMESERIES_MAX_BUCKETS} {granularity} buckets"
+            )
+
+        try:
+            with span("db_timeseries"):
+                buckets = await asyncio.to_thread(
+                    repository.timeseries, start.isoformat(), end.isoformat(), granularity
+                )
+        except Exception as e:
+            logger.error(f"Error fetching statistics timeseries: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to fetch statistics timeseries: {str(e)}"
+            )
+
+        return {
+            "from": start.isoformat(),
+            "to": end.isoformat(),
+            "granularity": granularity,
+            "buckets": buckets
+        }
+
+    @router.get("/stats/cache")
+    async def get_cache_statistics() -> Dict[str, Any]:
+        """Obtiene contadores de aciertos y fallos de la caché de análisis"""
+        if analysis_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **analysis_cache.stats()}
+
+    @router.get("/stats/classifier")
+    async def get_classifier_statistics() -> Dict[str, Any]:
+        """Obtiene cuántas decisiones tomó cada etapa de la cascada"""
+        return {**get_analyzer_backend().stats(), **preclassifier.stats()}
+
+    @router.get("/stats/queue")
+    async def get_queue_statistics() -> Dict[str, Any]:
+        """Obtiene profundidad de la cola y uso de los workers de procesamiento"""
+        if job_queue is None:
+            return {"enabled": False}
+        return {"enabled": True, **job_queue.stats()}
+
+    @router.get("/stats/webhooks")
+    async def get_webhook_statistics() -> Dict[str, Any]:
+        """Obtiene contadores de entrega y tamaño del outbox de webhooks"""
+        return webhook_dispatcher.stats()
+
+    @router.get("/stats/admission")
+    async def get_admission_statistics() -> Dict[str, Any]:
+        """Obtiene peticiones en curso, admitidas y rechazadas (429) por ruta"""
+        return admission_controller.stats()
+
+    @router.get("/stats/single-flight")
+    async def get_single_flight_statistics() -> Dict[str, Any]:
+        """Obtiene cuántas llamadas de procesamiento se coalescieron por ticket"""
+        return ticket_single_flight.stats()
+
+    @router.get("/stats/stream")
+    async def get_stream_statistics() -> Dict[str, Any]:
+        """Obtiene suscriptores SSE conectados y eventos emitidos o agrupados"""
+        return ticket_events.stats()
+
     return router
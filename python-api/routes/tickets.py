@@ -1,25 +1,182 @@
 """Ticket management endpoints"""
 
-from fastapi import APIRouter, HTTPException, status, Query
-from typing import Optional, Dict, Any
-from supabase import Client
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from fastapi import APIRouter, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, Dict, Any, List, AsyncIterator, Sequence
+
+from pydantic import ValidationError
 
 from models import (
     CreateTicketRequest,
+    CreateTicketResult,
+    CreateTicketsResponse,
     ProcessTicketRequest,
+    ProcessTicketsRequest,
+    ProcessTicketsResponse,
     TicketResponse,
-    TicketListResponse
+    TicketListResponse,
+    TicketSearchResponse,
+    TicketFilters,
+    TicketStatus,
+    TicketCategory,
+    TicketSentiment
+)
+from exceptions import (
+    DatabaseError,
+    LLMAnalysisError,
+    TicketNotFoundError,
+    InvalidTicketError,
+    TicketInProgressError
+)
+from processing import process_ticket_by_id, process_tickets_by_id
+from job_queue import TicketJobQueue
+from repository import (
+    TicketRepository,
+    TICKET_COLUMNS,
+    encode_cursor,
+    decode_cursor,
+    encode_search_cursor,
+    decode_search_cursor
+)
+from cache import compute_etag, etag_matches, last_modified
+from webhooks import notify_n8n_webhooks, notify_n8n_webhooks_batch
+from metrics import span
+from priority import estimate_priority
+from events import ticket_events
+from config import (
+    logger,
+    EXPORT_PAGE_SIZE,
+    BULK_MAX_TICKETS,
+    BULK_CHUNK_SIZE
 )
-from exceptions import DatabaseError, LLMAnalysisError
-from analyzer import analyze_ticket
-from webhooks import notify_n8n_webhooks
-from config import logger
 
 router = APIRouter(tags=["Tickets"])
 
 
-def setup_routes(supabase: Client) -> APIRouter:
-    """Configure ticket routes with database client"""
+def webhook_payload(ticket_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Datos de un ticket creado que se envían a n8n"""
+    return {
+        "ticket_id": ticket_data["id"],
+        "description": ticket_data["description"],
+        "created_at": ticket_data["created_at"],
+        "status": ticket_data["status"],
+        "priority": ticket_data.get("priority")
+    }
+
+
+def parse_bulk_body(body: bytes, content_type: str) -> List[Any]:
+    """
+    Decodifica el cuerpo de /tickets/bulk: un array JSON o NDJSON
+    (un objeto por línea). Las líneas NDJSON inválidas se devuelven
+    como excepciones para reportarlas por ítem.
+
+    Raises:
+        HTTPException: 400 si el cuerpo no se puede interpretar, 413 si
+            supera BULK_MAX_TICKETS
+    """
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items: List[Any] = []
+        for line in body.decode("utf-8", errors="replace").splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(e)
+    else:
+        try:
+            items = json.loads(body)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid JSON body: {str(e)}"
+            )
+        if not isinstance(items, list):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Body must be a JSON array of tickets or NDJSON"
+            )
+
+    if not items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No tickets provided"
+        )
+    if len(items) > BULK_MAX_TICKETS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_MAX_TICKETS} tickets per request"
+        )
+    return items
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Valida el parámetro `fields=` contra las columnas conocidas.
+
+    Raises:
+        HTTPException: 400 si se pide una columna desconocida
+    """
+    if not fields:
+        return None
+    columns = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [column for column in columns if column not in TICKET_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return columns or None
+
+
+async def iter_ticket_pages(
+    repository: TicketRepository,
+    filters: TicketFilters,
+    fields: Optional[Sequence[str]],
+    since: Optional[str]
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Recorre la tabla por páginas keyset sin bloquear el event loop"""
+    after = None
+    while True:
+        page = await asyncio.to_thread(
+            repository.list_tickets, EXPORT_PAGE_SIZE, filters, fields, after, since
+        )
+        if not page:
+            return
+        yield page
+        if len(page) < EXPORT_PAGE_SIZE:
+            return
+        after = (page[-1]["created_at"], page[-1]["id"])
+
+
+async def stream_ndjson(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[str]:
+    async for page in pages:
+        yield "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in page)
+
+
+async def stream_csv(
+    pages: AsyncIterator[List[Dict[str, Any]]],
+    columns: Sequence[str]
+) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(columns), extrasaction="ignore")
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    async for page in pages:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(page)
+        yield buffer.getvalue()
+
+
+def setup_routes(repository: TicketRepository, job_queue: Optional[TicketJobQueue] = None) -> APIRouter:
+    """Configure ticket routes with ticket repository and optional processing queue"""
     
     @router.post(
         "/tickets",
@@ -29,42 +186,46 @@ def setup_routes(supabase: Client) -> APIRouter:
     async def create_ticket(ticket: CreateTicketRequest) -> TicketResponse:
         """
         Crea un nuevo ticket en estado pendiente y envía notificaciones a n8n.
-        n8n luego llamará a /process-ticket para procesar el ticket con IA.
+        Si la cola interna está activa el ticket se encola para procesarse
+        en proceso; si no, n8n llamará a /process-ticket.
         """
         try:
             logger.info(f"Creating new ticket: {ticket.description[:50]}...")
             
-            # Insertar ticket en Supabase sin procesar
+            # Insertar ticket en Supabase sin procesar, con su prioridad inicial
             try:
-                response = supabase.table("tickets").insert({
-                    "description": ticket.description,
-                    "processed": False,
-                    "status": "pending"
-                }).execute()
+                with span("db_insert"):
+                    ticket_data = await asyncio.to_thread(
+                        repository.create,
+                        ticket.description,
+                        estimate_priority(ticket.description)
+                    )
                 
-                if not response.data:
+                if ticket_data is None:
                     raise DatabaseError("Database insert returned no data")
                 
-                ticket_data = response.data[0]
                 logger.info(f"Ticket created successfully: {ticket_data['id']}")
                 
             except Exception as e:
                 logger.error(f"Database error: {e}")
                 raise DatabaseError(f"Failed to create ticket: {str(e)}")
             
-            # Enviar notificaciones a webhooks de n8n
-            notify_n8n_webhooks({
-                "ticket_id": ticket_data["id"],
-                "description": ticket_data["description"],
-                "created_at": ticket_data["created_at"],
-                "status": ticket_data["status"]
-            })
+            # Encolar para procesamiento interno (si la cola está llena queda
+            # pendiente y se recupera en el siguiente arranque o vía n8n)
+            if job_queue is not None:
+                job_queue.enqueue(ticket_data["id"], ticket_data.get("priority"))
+
+            ticket_events.ticket_created(ticket_data)
+
+            # Enviar notificaciones a webhooks de n8n (en segundo plano)
+            notify_n8n_webhooks(webhook_payload(ticket_data))
             
             return TicketResponse(
                 id=ticket_data["id"],
                 description=ticket_data["description"],
                 category=ticket_data.get("category", ""),
                 sentiment=ticket_data.get("sentiment", ""),
+                priority=ticket_data.get("priority"),
                 processed=ticket_data["processed"],
                 message="Ticket created successfully and n8n notified"
             )
@@ -78,6 +239,108 @@ def setup_routes(supabase: Client) -> APIRouter:
                 detail=f"Unexpected error: {str(e)}"
             )
 
+    @router.post(
+        "/tickets/bulk",
+        response_model=CreateTicketsResponse,
+        status_code=status.HTTP_200_OK,
+        openapi_extra={
+            "requestBody": {
+                "required": True,
+                "content": {
+                    "application/json": {
+                        "schema": {"type": "array", "items": CreateTicketRequest.model_json_schema()}
+                    },
+                    "application/x-ndjson": {"schema": {"type": "string"}}
+                }
+            }
+        }
+    )
+    async def create_tickets_bulk(request: Request) -> CreateTicketsResponse:
+        """
+        Crea muchos tickets de una vez (array JSON o NDJSON).
+        Valida cada ítem, inserta por bloques con un INSERT multi-fila y
+        notifica a n8n cada bloque en segundo plano. El resultado se
+        reporta por ítem, en el orden recibido.
+        """
+        items = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+        logger.info(f"Bulk ingestion of {len(items)} tickets...")
+
+        results: List[Optional[CreateTicketResult]] = [None] * len(items)
+        valid: List[tuple] = []
+
+        for index, item in enumerate(items):
+            if isinstance(item, Exception):
+                results[index] = CreateTicketResult(
+                    index=index,
+                    success=False,
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    error=f"Invalid JSON: {str(item)}"
+                )
+                continue
+            try:
+                valid.append((index, CreateTicketRequest.model_validate(item).description))
+            except ValidationError as e:
+                results[index] = CreateTicketResult(
+                    index=index,
+                    success=False,
+                    # Literal: el nombre de la constante 422 cambió entre versiones de Starlette
+                    status_code=422,
+                    error="; ".join(error["msg"] for error in e.errors())
+                )
+
+        for start in range(0, len(valid), BULK_CHUNK_SIZE):
+            chunk = valid[start:start + BULK_CHUNK_SIZE]
+
+            try:
+                with span("db_insert"):
+                    rows = await asyncio.to_thread(
+                        repository.create_many,
+                        [description for _, description in chunk],
+                        [estimate_priority(description) for _, description in chunk]
+                    )
+                if len(rows) != len(chunk):
+                    raise DatabaseError(f"Insert returned {len(rows)} rows for {len(chunk)} tickets")
+            except Exception as e:
+                logger.error(f"Database error on bulk insert: {e}")
+                for index, _ in chunk:
+                    results[index] = CreateTicketResult(
+                        index=index,
+                        success=False,
+                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        error=f"Failed to create ticket: {str(e)}"
+                    )
+                continue
+
+            for (index, _), ticket_data in zip(chunk, rows):
+                if job_queue is not None:
+                    job_queue.enqueue(ticket_data["id"], ticket_data.get("priority"))
+                results[index] = CreateTicketResult(
+                    index=index,
+                    success=True,
+                    status_code=status.HTTP_201_CREATED,
+                    ticket=TicketResponse(
+                        id=ticket_data["id"],
+                        description=ticket_data["description"],
+                        priority=ticket_data.get("priority"),
+                        processed=ticket_data["processed"],
+                        message="Ticket created successfully"
+                    )
+                )
+
+            ticket_events.tickets_created(rows)
+
+            # Notificación del bloque en segundo plano (ver notify_n8n_webhooks_batch)
+            notify_n8n_webhooks_batch([webhook_payload(ticket_data) for ticket_data in rows])
+
+        created = sum(1 for result in results if result.success)
+        logger.info(f"Bulk ingestion finished: {created} created, {len(results) - created} failed")
+
+        return CreateTicketsResponse(
+            results=results,
+            created=created,
+            failed=len(results) - created
+        )
+
     @router.post(
         "/process-ticket",
         response_model=TicketResponse,
@@ -86,107 +349,27 @@ def setup_routes(supabase: Client) -> APIRouter:
     async def process_ticket(ticket: ProcessTicketRequest) -> TicketResponse:
         """Procesa ticket con IA - analiza categoría y sentimiento, actualiza BD"""
         try:
-            logger.info(f"Processing existing ticket {ticket.ticket_id}...")
-            
-            # Fetch ticket from database to get description
-            try:
-                ticket_query = supabase.table("tickets").select("*").eq("id", ticket.ticket_id).execute()
-                
-                if not ticket_query.data:
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail=f"Ticket with ID {ticket.ticket_id} not found"
-                    )
-                
-                ticket_data = ticket_query.data[0]
-                description = ticket_data.get("description", "")
-                
-                if not description or not description.strip():
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail="Ticket has no description to process"
-                    )
-                    
-            except HTTPException:
-                raise
-            except Exception as e:
-                logger.error(f"Error fetching ticket: {e}")
-                raise DatabaseError(f"Failed to fetch ticket: {str(e)}")
-            
-            # Check if ticket is already processed (idempotency)
-            if ticket_data.get("processed", False):
-                logger.info(f"Ticket {ticket.ticket_id} already processed, returning cached result")
-                return TicketResponse(
-                    id=ticket.ticket_id,
-                    description=description,
-                    category=ticket_data.get("category"),
-                    sentiment=ticket_data.get("sentiment"),
-                    confidence=ticket_data.get("confidence"),
-                    processed=True,
-                    message="Ticket already processed (idempotent response)"
-                )
-            
-            # Mark as processing
-            try:
-                supabase.table("tickets").update({"status": "processing"}).eq("id", ticket.ticket_id).execute()
-                logger.info(f"Ticket {ticket.ticket_id} marked as processing")
-            except Exception as e:
-                logger.warning(f"Failed to mark ticket as processing: {e}")
-            
-            # Analyze with AI
-            try:
-                analysis = analyze_ticket(description)
-            except Exception as e:
-                # Mark as error if analysis fails
-                try:
-                    supabase.table("tickets").update({"status": "error"}).eq("id", ticket.ticket_id).execute()
-                except Exception:
-                    pass
-                raise LLMAnalysisError(f"Analysis failed: {str(e)}")
-            
-            # Update existing ticket in database
-            try:
-                update_data = {
-                    "category": analysis.category,
-                    "sentiment": analysis.sentiment,
-                    "confidence": analysis.confidence,
-                    "processed": True,
-                    "status": "done"
-                }
-                
-                response = supabase.table("tickets").update(update_data).eq("id", ticket.ticket_id).execute()
-                
-                if not response.data:
-                    raise DatabaseError(f"Ticket with ID {ticket.ticket_id} not found or update failed")
-                
-                ticket_data = response.data[0]
-                logger.info(f"Ticket updated successfully: {ticket_data['id']}")
-                
-            except Exception as e:
-                # Mark as error if update fails
-                try:
-                    supabase.table("tickets").update({"status": "error"}).eq("id", ticket.ticket_id).execute()
-                except Exception:
-                    pass
-                logger.error(f"Database error: {e}")
-                raise DatabaseError(f"Failed to update ticket: {str(e)}")
-            
-            return TicketResponse(
-                id=ticket_data["id"],
-                description=ticket_data["description"],
-                category=ticket_data["category"],
-                sentiment=ticket_data["sentiment"],
-                confidence=ticket_data.get("confidence"),
-                processed=ticket_data["processed"],
-                message="Ticket processed and updated successfully"
+            return await process_ticket_by_id(repository, ticket.ticket_id)
+
+        except TicketNotFoundError as e:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=str(e)
+            )
+        except InvalidTicketError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        except TicketInProgressError as e:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=str(e)
             )
-            
         except LLMAnalysisError:
             raise
         except DatabaseError:
             raise
-        except HTTPException:
-            raise
         except Exception as e:
             logger.error(f"Unexpected error in process_ticket: {e}")
             raise HTTPException(
@@ -194,26 +377,79 @@ def setup_routes(supabase: Client) -> APIRouter:
                 detail=f"Unexpected error: {str(e)}"
             )
 
+    @router.post(
+        "/process-tickets",
+        response_model=ProcessTicketsResponse,
+        status_code=status.HTTP_200_OK
+    )
+    async def process_tickets(batch: ProcessTicketsRequest) -> ProcessTicketsResponse:
+        """
+        Procesa varios tickets en lote: un único claim atómico para leerlos,
+        análisis empaquetados (varios tickets por llamada al LLM) y
+        escrituras agrupadas. Mantiene las reglas de idempotencia de /process-ticket por ticket.
+        """
+        ordered = await process_tickets_by_id(repository, batch.ticket_ids)
+        succeeded = sum(1 for result in ordered if result.success)
+
+        return ProcessTicketsResponse(
+            results=ordered,
+            processed=succeeded,
+            failed=len(ordered) - succeeded
+        )
+
     @router.get("/tickets", response_model=TicketListResponse)
     async def get_tickets(
         limit: int = Query(default=100, ge=1, le=1000),
-        processed: Optional[bool] = None
+        processed: Optional[bool] = None,
+        status_filter: Optional[TicketStatus] = Query(default=None, alias="status"),
+        category: Optional[TicketCategory] = None,
+        sentiment: Optional[TicketSentiment] = None,
+        fields: Optional[str] = Query(
+            default=None,
+            description="Comma-separated columns to return, e.g. id,category,sentiment"
+        ),
+        cursor: Optional[str] = Query(
+            default=None,
+            description="Opaque cursor from the previous page's next_cursor"
+        )
     ) -> TicketListResponse:
-        """Obtiene lista de tickets con filtros opcionales"""
+        """
+        Obtiene lista de tickets con filtros opcionales.
+        Paginación por cursor sobre (created_at, id): pasar next_cursor
+        para obtener la página siguiente.
+        """
+        filters = TicketFilters(
+            processed=processed,
+            status=status_filter,
+            category=category,
+            sentiment=sentiment
+        )
+        columns = parse_fields(fields)
+
         try:
-            logger.info(f"Fetching tickets: limit={limit}, processed={processed}")
-            
-            query = supabase.table("tickets").select("*").order("created_at", desc=True).limit(limit)
-            
-            if processed is not None:
-                query = query.eq("processed", processed)
+            after = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+        try:
+            logger.info(f"Fetching tickets: limit={limit}, filters={filters.model_dump(exclude_none=True)}")
             
-            response = query.execute()
+            # Se pide una fila extra para saber si hay página siguiente
+            with span("db_list"):
+                tickets = await asyncio.to_thread(repository.list_tickets, limit + 1, filters, columns, after)
+            next_cursor = None
+            if len(tickets) > limit:
+                tickets = tickets[:limit]
+                next_cursor = encode_cursor(tickets[-1])
             
             return TicketListResponse(
-                tickets=response.data,
-                count=len(response.data),
-                limit=limit
+                tickets=tickets,
+                count=len(tickets),
+                limit=limit,
+                next_cursor=next_cursor
             )
             
         except Exception as e:
@@ -223,22 +459,161 @@ def setup_routes(supabase: Client) -> APIRouter:
                 detail=f"Failed to fetch tickets: {str(e)}"
             )
 
+    @router.get("/tickets/export")
+    async def export_tickets(
+        export_format: str = Query(default="ndjson", alias="format", pattern="^(ndjson|csv)$"),
+        processed: Optional[bool] = None,
+        status_filter: Optional[TicketStatus] = Query(default=None, alias="status"),
+        category: Optional[TicketCategory] = None,
+        sentiment: Optional[TicketSentiment] = None,
+        fields: Optional[str] = None,
+        since: Optional[datetime] = Query(
+            default=None,
+            description="Only tickets created at or after this timestamp (incremental export)"
+        )
+    ) -> StreamingResponse:
+        """
+        Exporta todos los tickets que cumplen los filtros como NDJSON o CSV.
+        La respuesta se envía por chunks página a página, con memoria constante.
+        """
+        filters = TicketFilters(
+            processed=processed,
+            status=status_filter,
+            category=category,
+            sentiment=sentiment
+        )
+        columns = parse_fields(fields)
+        since_value = since.isoformat() if since else None
+        logger.info(f"Exporting tickets as {export_format}: filters={filters.model_dump(exclude_none=True)}, since={since_value}")
+
+        pages = iter_ticket_pages(repository, filters, columns, since_value)
+
+        if export_format == "csv":
+            return StreamingResponse(
+                stream_csv(pages, columns or TICKET_COLUMNS),
+                media_type="text/csv",
+                headers={"Content-Disposition": 'attachment; filename="tickets.csv"'}
+            )
+
+        return StreamingResponse(
+            stream_ndjson(pages),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": 'attachment; filename="tickets.ndjson"'}
+        )
+
+    @router.get("/tickets/search", response_model=TicketSearchResponse)
+    async def search_tickets(
+        q: str = Query(
+            min_length=1,
+            max_length=200,
+            description='Terms or quoted phrases, e.g. "factura duplicada" or error 500'
+        ),
+        category: Optional[TicketCategory] = None,
+        sentiment: Optional[TicketSentiment] = None,
+        sort: str = Query(default="relevance", pattern="^(relevance|recent)$"),
+        limit: int = Query(default=20, ge=1, le=100),
+        cursor: Optional[str] = Query(
+            default=None,
+            description="Opaque cursor from the previous page's next_cursor"
+        )
+    ) -> TicketSearchResponse:
+        """
+        Busca tickets por texto en la descripción usando el índice de texto
+        completo. Ordena por relevancia (o por fecha con sort=recent) y
+        pagina por cursor sobre (rank, created_at, id).
+        """
+        try:
+            after = decode_search_cursor(cursor) if cursor else None
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+        category_value = category.value if category else None
+        sentiment_value = sentiment.value if sentiment else None
+
+        try:
+            logger.info(f"Searching tickets: q={q!r}, sort={sort}, category={category_value}, sentiment={sentiment_value}")
+
+            # Se pide una fila extra para saber si hay página siguiente
+            with span("db_search"):
+                results = await asyncio.to_thread(
+                    repository.search, q, limit + 1, category_value, sentiment_value, sort, after
+                )
+            next_cursor = None
+            if len(results) > limit:
+                results = results[:limit]
+                next_cursor = encode_search_cursor(results[-1])
+
+            return TicketSearchResponse(
+                query=q,
+                sort=sort,
+                results=results,
+                count=len(results),
+                limit=limit,
+                next_cursor=next_cursor
+            )
+
+        except Exception as e:
+            logger.error(f"Error searching tickets: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to search tickets: {str(e)}"
+            )
+
+    @router.get("/tickets/stream")
+    async def stream_tickets(
+        request: Request,
+        last_event_id: Optional[str] = Query(
+            default=None,
+            description="Resume after this event ID (alternative to the Last-Event-ID header)"
+        )
+    ) -> StreamingResponse:
+        """
+        Server-Sent Events con los cambios de tickets: `created` y `updated`
+        con solo los campos que cambian, agrupados en ráfagas. Al reconectar,
+        EventSource envía Last-Event-ID y se reenvía lo perdido; si ya no
+        está disponible llega un evento `reset` y el cliente debe recargar.
+        """
+        resume_from = request.headers.get("last-event-id") or last_event_id
+        return StreamingResponse(
+            ticket_events.subscribe(resume_from),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
     @router.get("/tickets/{ticket_id}")
-    async def get_ticket(ticket_id: str) -> Dict[str, Any]:
-        """Obtiene un ticket específico por ID"""
+    async def get_ticket(ticket_id: str, request: Request, response: Response) -> Any:
+        """
+        Obtiene un ticket específico por ID.
+        Responde 304 sin cuerpo si If-None-Match coincide con el ETag actual.
+        """
         try:
             logger.info(f"Fetching ticket: {ticket_id}")
             
-            response = supabase.table("tickets").select("*").eq("id", ticket_id).execute()
+            with span("db_get"):
+                ticket_data = await asyncio.to_thread(repository.get, ticket_id)
             
-            if not response.data:
+            if ticket_data is None:
                 logger.warning(f"Ticket not found: {ticket_id}")
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Ticket with ID {ticket_id} not found"
                 )
-            
-            return response.data[0]
+
+            headers = {"ETag": compute_etag(ticket_data), "Cache-Control": "private, no-cache"}
+            modified = last_modified(
+                ticket_data.get(column) for column in ("created_at", "claimed_at", "processed_at")
+            )
+            if modified:
+                headers["Last-Modified"] = modified
+
+            if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+            response.headers.update(headers)
+            return ticket_data
             
         except HTTPException:
             raise
@@ -0,0 +1,171 @@
+"""Single-flight coalescing of concurrent work on the same ticket"""
+
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo coalescencia dentro del proceso
+    fcntl = None
+
+from metrics import single_flight_total
+from config import (
+    logger,
+    SINGLE_FLIGHT_ENABLED,
+    SINGLE_FLIGHT_LOCK_DIR,
+    SINGLE_FLIGHT_WAIT_SECONDS
+)
+
+
+LOCK_POLL_SECONDS = 0.05
+
+
+class SingleFlight:
+    """
+    Ejecuta una sola vez el trabajo de una clave mientras esté en curso.
+
+    Dentro del proceso, los llamadores concurrentes esperan la misma tarea
+    y reciben el mismo resultado (o la misma excepción). Entre procesos del
+    mismo host (varios workers de uvicorn) la tarea líder toma además un
+    flock sobre un fichero por clave: un proceso que lo encuentra tomado
+    espera a que se libere y solo entonces ejecuta su trabajo. El trabajo
+    recibe `after_peer=True` en ese caso, para que pueda devolver lo que
+    dejó el otro proceso como si lo hubiera hecho él.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = SINGLE_FLIGHT_ENABLED,
+        lock_dir: Optional[str] = SINGLE_FLIGHT_LOCK_DIR,
+        wait_seconds: float = SINGLE_FLIGHT_WAIT_SECONDS
+    ):
+        self.enabled = enabled
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.wait_seconds = wait_seconds
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self._counters = {"leaders": 0, "coalesced": 0, "waited_for_peer": 0, "wait_timeouts": 0}
+
+        if self.enabled and self.lock_dir:
+            try:
+                os.makedirs(self.lock_dir, exist_ok=True)
+            except OSError as e:
+                logger.warning(f"Single-flight lock dir unavailable ({e}), coalescing only in-process")
+                self.lock_dir = None
+
+    async def run(self, key: str, work: Callable[[bool], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta work(after_peer) o se une a la ejecución en curso de `key`.
+        after_peer indica si antes hubo que esperar a otro proceso con la misma clave.
+        """
+        if not self.enabled:
+            return await work(False)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lead(key, work))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self._counters["leaders"] += 1
+            single_flight_total.inc(role="leader")
+        else:
+            self._counters["coalesced"] += 1
+            single_flight_total.inc(role="coalesced")
+
+        # shield: si un llamador se desconecta, los demás siguen esperando el resultado
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "cross_process": bool(self.enabled and self.lock_dir),
+            "in_flight": len(self._inflight),
+            **self._counters
+        }
+
+    def _finish(self, key: str, task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marca la excepción como recuperada aunque todos los llamadores se hayan ido
+        if not task.cancelled():
+            task.exception()
+
+    async def _lead(self, key: str, work: Callable[[bool], Awaitable[Any]]) -> Any:
+        fd, after_peer = await self._acquire(key) if self.lock_dir else (None, False)
+        try:
+            return await work(after_peer)
+        finally:
+            if fd is not None:
+                self._release(key, fd)
+
+    # ============================
+    # Lock entre procesos
+    # ============================
+
+    def _lock_path(self, key: str) -> str:
+        return os.path.join(self.lock_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock")
+
+    def _try_lock(self, path: str) -> Optional[int]:
+        """fd con el flock tomado, o None si lo tiene otro proceso"""
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        # El dueño anterior pudo borrar el fichero entre open y flock
+        try:
+            if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+        return self._try_lock(path)
+
+    async def _acquire(self, key: str) -> Tuple[Optional[int], bool]:
+        """
+        Toma el lock de la clave; si otro proceso lo tiene espera hasta
+        `wait_seconds` y, pasado ese tiempo, sigue sin lock (el claim
+        atómico en BD sigue evitando el doble procesamiento).
+
+        Returns:
+            (fd del lock o None, si hubo que esperar a otro proceso)
+        """
+        path = self._lock_path(key)
+        try:
+            fd = self._try_lock(path)
+            if fd is not None:
+                return fd, False
+
+            self._counters["waited_for_peer"] += 1
+            single_flight_total.inc(role="waited_for_peer")
+            deadline = time.monotonic() + self.wait_seconds
+            while time.monotonic() < deadline:
+                await asyncio.sleep(LOCK_POLL_SECONDS)
+                fd = self._try_lock(path)
+                if fd is not None:
+                    return fd, True
+        except OSError as e:
+            logger.warning(f"Single-flight lock failed for {key}: {e}")
+            return None, False
+
+        self._counters["wait_timeouts"] += 1
+        logger.warning(f"Timed out waiting for another worker on {key}")
+        return None, True
+
+    def _release(self, key: str, fd: int) -> None:
+        try:
+            os.unlink(self._lock_path(key))
+        except FileNotFoundError:
+            pass
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+# Coalescencia por ticket_id de /process-ticket y de los reintentos
+# individuales de la cola. Los lotes (/process-tickets y los lotes de la
+# cola) no pasan por aquí: un ticket en curso les llega como 409 por el claim.
+ticket_single_flight = SingleFlight()
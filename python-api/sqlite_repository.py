@@ -0,0 +1,664 @@
+"""Embedded SQLite implementation of the ticket repository"""
+
+import re
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from models import ClassificationResult, TicketFilters
+from cache import TTLCache, normalize_description
+from repository import TicketRepository, select_columns
+from config import logger, CLAIM_STALE_SECONDS
+
+
+# Marcas de tiempo en UTC con ancho fijo: el orden lexicográfico es el cronológico
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f+00:00"
+
+STATS_COLUMNS = (
+    "total_tickets",
+    "processed_tickets",
+    "unprocessed_tickets",
+    "positive_sentiment",
+    "neutral_sentiment",
+    "negative_sentiment",
+    "tecnico_category",
+    "facturacion_category",
+    "comercial_category",
+)
+
+
+def _stats_delta(row: str, sign: str) -> str:
+    """SET de ticket_stats_summary que suma (+) o resta (-) la contribución de una fila"""
+    conditions = {
+        "total_tickets": "1",
+        "processed_tickets": f"{row}.processed = 1",
+        "unprocessed_tickets": f"{row}.processed = 0",
+        "positive_sentiment": f"{row}.sentiment = 'Positivo'",
+        "neutral_sentiment": f"{row}.sentiment = 'Neutral'",
+        "negative_sentiment": f"{row}.sentiment = 'Negativo'",
+        "tecnico_category": f"{row}.category = 'Técnico'",
+        "facturacion_category": f"{row}.category = 'Facturación'",
+        "comercial_category": f"{row}.category = 'Comercial'",
+    }
+    return ", ".join(
+        f"{column} = {column} {sign} (CASE WHEN {condition} THEN 1 ELSE 0 END)"
+        for column, condition in conditions.items()
+    )
+
+
+def _timeseries_delta(row: str, sign: str) -> str:
+    """UPSERT en ticket_stats_hourly con la contribución (+/-) de una fila"""
+    processed = f"({row}.processed = 1 AND {row}.processed_at IS NOT NULL)"
+    latency = (
+        f"MAX((julianday({row}.processed_at) - julianday({row}.created_at)) * 86400.0, 0)"
+    )
+    return f"""
+        INSERT INTO ticket_stats_hourly (
+            bucket, category, sentiment, status, tickets, processed_tickets, latency_seconds_sum
+        )
+        VALUES (
+            substr({row}.created_at, 1, 13) || ':00:00+00:00',
+            COALESCE({row}.category, ''),
+            COALESCE({row}.sentiment, ''),
+            COALESCE({row}.status, ''),
+            {sign}1,
+            {sign}(CASE WHEN {processed} THEN 1 ELSE 0 END),
+            {sign}(CASE WHEN {processed} THEN {latency} ELSE 0 END)
+        )
+        ON CONFLICT (bucket, category, sentiment, status) DO UPDATE SET
+            tickets = tickets + excluded.tickets,
+            processed_tickets = processed_tickets + excluded.processed_tickets,
+            latency_seconds_sum = latency_seconds_sum + excluded.latency_seconds_sum;
+    """
+
+
+# Equivalente de supabase/setup.sql: mismos índices, y resumen y rollups
+# horarios mantenidos por triggers en lugar de funciones plpgsql
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS tickets (
+    id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+
+    description TEXT NOT NULL,
+
+    category TEXT CHECK (category IN ('Técnico', 'Facturación', 'Comercial')),
+    sentiment TEXT CHECK (sentiment IN ('Positivo', 'Neutral', 'Negativo')),
+    confidence REAL,
+
+    processed INTEGER NOT NULL DEFAULT 0,
+    status TEXT DEFAULT 'new',
+    priority TEXT,
+    error_message TEXT,
+
+    analysis_stage TEXT,
+    claimed_at TEXT,
+    processed_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets(created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_category ON tickets(category);
+CREATE INDEX IF NOT EXISTS idx_tickets_sentiment ON tickets(sentiment);
+CREATE INDEX IF NOT EXISTS idx_tickets_processed ON tickets(processed);
+CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
+CREATE INDEX IF NOT EXISTS idx_tickets_created_at_id ON tickets(created_at DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS ticket_stats_summary (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    {", ".join(f"{column} INTEGER NOT NULL DEFAULT 0" for column in STATS_COLUMNS)}
+);
+
+CREATE TABLE IF NOT EXISTS ticket_stats_hourly (
+    bucket TEXT NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    sentiment TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT '',
+    tickets INTEGER NOT NULL DEFAULT 0,
+    processed_tickets INTEGER NOT NULL DEFAULT 0,
+    latency_seconds_sum REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket, category, sentiment, status)
+);
+
+CREATE TRIGGER IF NOT EXISTS tickets_stats_insert AFTER INSERT ON tickets
+BEGIN
+    UPDATE ticket_stats_summary SET {_stats_delta("NEW", "+")} WHERE id = 1;
+    {_timeseries_delta("NEW", "+")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_stats_delete AFTER DELETE ON tickets
+BEGIN
+    UPDATE ticket_stats_summary SET {_stats_delta("OLD", "-")} WHERE id = 1;
+    {_timeseries_delta("OLD", "-")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_stats_update
+AFTER UPDATE OF processed, sentiment, category ON tickets
+WHEN OLD.processed IS NOT NEW.processed
+    OR OLD.sentiment IS NOT NEW.sentiment
+    OR OLD.category IS NOT NEW.category
+BEGIN
+    UPDATE ticket_stats_summary SET {_stats_delta("OLD", "-")} WHERE id = 1;
+    UPDATE ticket_stats_summary SET {_stats_delta("NEW", "+")} WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_timeseries_update
+AFTER UPDATE OF created_at, processed, processed_at, sentiment, category, status ON tickets
+WHEN OLD.created_at IS NOT NEW.created_at
+    OR OLD.processed IS NOT NEW.processed
+    OR OLD.processed_at IS NOT NEW.processed_at
+    OR OLD.sentiment IS NOT NEW.sentiment
+    OR OLD.category IS NOT NEW.category
+    OR OLD.status IS NOT NEW.status
+BEGIN
+    {_timeseries_delta("OLD", "-")}
+    {_timeseries_delta("NEW", "+")}
+END;
+"""
+
+
+# Índice de texto completo sobre description (equivalente al GIN de setup.sql).
+# Tabla FTS5 de contenido externo: guarda solo el índice y la mantienen los triggers.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+    description,
+    content='tickets',
+    content_rowid='rowid',
+    tokenize="unicode61 remove_diacritics 2"
+);
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_insert AFTER INSERT ON tickets
+BEGIN
+    INSERT INTO tickets_fts (rowid, description) VALUES (NEW.rowid, NEW.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_delete AFTER DELETE ON tickets
+BEGIN
+    INSERT INTO tickets_fts (tickets_fts, rowid, description) VALUES ('delete', OLD.rowid, OLD.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS tickets_fts_update AFTER UPDATE OF description ON tickets
+BEGIN
+    INSERT INTO tickets_fts (tickets_fts, rowid, description) VALUES ('delete', OLD.rowid, OLD.description);
+    INSERT INTO tickets_fts (rowid, description) VALUES (NEW.rowid, NEW.description);
+END;
+"""
+
+SEARCH_COLUMNS = (
+    "id", "created_at", "description", "category", "sentiment", "confidence",
+    "analysis_stage", "processed", "status", "priority",
+)
+
+# Palabras vacías que no se buscan como término suelto (sí dentro de frases)
+SEARCH_STOP_WORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los",
+    "me", "mi", "para", "por", "que", "se", "su", "un", "una", "y",
+}
+
+# Como max_candidates en search_tickets (setup.sql): el orden por relevancia
+# solo puntúa las coincidencias más recientes
+SEARCH_MAX_CANDIDATES = 1000
+
+_PHRASE = re.compile(r'"([^"]*)"')
+
+
+def _fts_query(query: str) -> str:
+    """
+    Traduce la consulta a sintaxis FTS5. Las frases entre comillas se buscan
+    literales y cada término suelto por prefijo (factura* cubre facturas y
+    facturación), a falta de un stemmer español en FTS5. Todo con AND.
+    """
+    parts = []
+    for phrase in _PHRASE.findall(query):
+        words = normalize_description(phrase).split()
+        if words:
+            parts.append('"' + " ".join(words) + '"')
+    for word in normalize_description(_PHRASE.sub(" ", query)).split():
+        if word not in SEARCH_STOP_WORDS:
+            parts.append(f'"{word}"*')
+    return " AND ".join(parts)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def _timestamp(value: str) -> str:
+    """Normaliza una marca ISO 8601 al formato almacenado (UTC, ancho fijo)"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+
+def _hour_bucket(value: str, ceiling: bool = False) -> str:
+    """Inicio de la hora que contiene `value` (o de la primera hora que empieza en o después)"""
+    moment = datetime.fromisoformat(_timestamp(value))
+    floor = moment.replace(minute=0, second=0, microsecond=0)
+    if ceiling and floor < moment:
+        floor += timedelta(hours=1)
+    return floor.strftime("%Y-%m-%dT%H:00:00+00:00")
+
+
+class SQLiteTicketRepository(TicketRepository):
+    """
+    Tickets en un archivo SQLite local (modo WAL), para despliegues de un
+    solo nodo sin ida y vuelta a Postgres.
+
+    Usa una conexión compartida protegida por un lock, como el outbox de
+    webhooks; WAL permite que otros procesos lean mientras uno escribe.
+    Los claims se hacen dentro de una transacción IMMEDIATE, que toma el
+    bloqueo de escritura del archivo y es atómica también entre procesos.
+    """
+
+    def __init__(self, path: str, cache: Optional[TTLCache] = None):
+        super().__init__(cache)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(SCHEMA)
+
+        has_search_index = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'tickets_fts'"
+        ).fetchone()
+        self._conn.executescript(SEARCH_SCHEMA)
+        if not has_search_index:
+            # Bases creadas antes del índice: indexar los tickets existentes
+            self._conn.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+
+        created = self._conn.execute(
+            "INSERT OR IGNORE INTO ticket_stats_summary (id) VALUES (1)"
+        ).rowcount
+        if created:
+            self.refresh_stats()
+        logger.info(f"SQLite ticket storage initialized at {path}")
+
+    # ============================
+    # Lecturas
+    # ============================
+
+    def get(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        row = self.cached(ticket_id)
+        if row is not None:
+            return row
+        with self._lock:
+            result = self._conn.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+        row = self._to_dict(result)
+        self._remember(row)
+        return row
+
+    def list_tickets(
+        self,
+        limit: int,
+        filters: Optional[TicketFilters] = None,
+        fields: Optional[Sequence[str]] = None,
+        after: Optional[Tuple[str, str]] = None,
+        since: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        clauses: List[str] = []
+        params: List[Any] = []
+
+        if filters is not None:
+            for column, value in filters.model_dump(exclude_none=True).items():
+                clauses.append(f"{column} = ?")
+                params.append(int(value) if isinstance(value, bool) else value)
+
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(_timestamp(since))
+
+        if after is not None:
+            created_at, ticket_id = after
+            clauses.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            params.extend([created_at, created_at, ticket_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            f"SELECT {select_columns(fields)} FROM tickets {where} "
+            "ORDER BY created_at DESC, id DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(STATS_COLUMNS)} FROM ticket_stats_summary WHERE id = 1"
+            ).fetchone()
+        return dict(row) if row else None
+
+    def timeseries(self, start: str, end: str, granularity: str) -> List[Dict[str, Any]]:
+        width = 13 if granularity == "hour" else 10
+        suffix = ":00:00+00:00" if granularity == "hour" else "T00:00:00+00:00"
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT substr(bucket, 1, ?) || ? AS b, category, sentiment, status, "
+                "SUM(tickets) AS tickets, SUM(processed_tickets) AS processed_tickets, "
+                "SUM(latency_seconds_sum) AS latency_seconds_sum "
+                "FROM ticket_stats_hourly WHERE bucket >= ? AND bucket < ? "
+                "GROUP BY b, category, sentiment, status ORDER BY b",
+                (width, suffix, _hour_bucket(start), _hour_bucket(end, ceiling=True))
+            ).fetchall()
+
+        buckets: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            if not row["tickets"]:
+                continue
+            bucket = buckets.setdefault(row["b"], {
+                "bucket": row["b"],
+                "tickets": 0,
+                "processed_tickets": 0,
+                "latency_seconds_sum": 0.0,
+                "by_category": defaultdict(int),
+                "by_sentiment": defaultdict(int),
+                "by_status": defaultdict(int),
+            })
+            bucket["tickets"] += row["tickets"]
+            bucket["processed_tickets"] += row["processed_tickets"]
+            bucket["latency_seconds_sum"] += row["latency_seconds_sum"]
+            for key, breakdown in (("category", "by_category"), ("sentiment", "by_sentiment"), ("status", "by_status")):
+                if row[key]:
+                    bucket[breakdown][row[key]] += row["tickets"]
+
+        series = []
+        for bucket in buckets.values():
+            latency = bucket.pop("latency_seconds_sum")
+            processed = bucket["processed_tickets"]
+            bucket["avg_latency_seconds"] = latency / processed if processed else None
+            for breakdown in ("by_category", "by_sentiment", "by_status"):
+                bucket[breakdown] = {key: count for key, count in bucket[breakdown].items() if count}
+            series.append(bucket)
+        return series
+
+    def search(
+        self,
+        query: str,
+        limit: int,
+        category: Optional[str] = None,
+        sentiment: Optional[str] = None,
+        sort: str = "relevance",
+        after: Optional[Tuple[float, str, str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Búsqueda sobre tickets_fts; rank = -bm25 para que mayor sea más
+        relevante. Por relevancia solo se ordenan las SEARCH_MAX_CANDIDATES
+        coincidencias más recientes, como en Postgres.
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+
+        filters = ["tickets_fts MATCH ?"]
+        filter_params: List[Any] = [match]
+        if category is not None:
+            filters.append("t.category = ?")
+            filter_params.append(category)
+        if sentiment is not None:
+            filters.append("t.sentiment = ?")
+            filter_params.append(sentiment)
+        where = " AND ".join(filters)
+        clauses = [where]
+        params = list(filter_params)
+
+        if sort == "recent":
+            # Mismo orden y cursor que Postgres: (created_at, id) descendente
+            order = "t.created_at DESC, t.id DESC"
+            if after is not None:
+                _, created_at, ticket_id = after
+                clauses.append("(t.created_at < ? OR (t.created_at = ? AND t.id < ?))")
+                params.extend([created_at, created_at, ticket_id])
+        else:
+            order = "score DESC, t.created_at DESC, t.id DESC"
+            # Candidatos acotados antes de puntuar con bm25
+            clauses.append(
+                "t.rowid IN (SELECT t.rowid FROM tickets_fts JOIN tickets t ON t.rowid = tickets_fts.rowid "
+                f"WHERE {where} ORDER BY t.created_at DESC, t.id DESC LIMIT ?)"
+            )
+            params.extend([*filter_params, SEARCH_MAX_CANDIDATES])
+            if after is not None:
+                clauses.append("(-bm25(tickets_fts), t.created_at, t.id) < (?, ?, ?)")
+                params.extend(after)
+
+        sql = (
+            f"SELECT {', '.join(f't.{column}' for column in SEARCH_COLUMNS)}, "
+            "-bm25(tickets_fts) AS score, "
+            "snippet(tickets_fts, 0, '<b>', '</b>', '…', 16) AS headline "
+            "FROM tickets_fts JOIN tickets t ON t.rowid = tickets_fts.rowid "
+            f"WHERE {' AND '.join(clauses)} ORDER BY {order} LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+
+        results = []
+        for row in rows:
+            data = self._to_dict(row)
+            data["rank"] = data.pop("score")
+            results.append(data)
+        return results
+
+    def recoverable_tickets(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, priority, status, claimed_at FROM tickets WHERE processed = 0 "
+                "AND status IN ('new', 'pending', 'processing') ORDER BY created_at LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def training_rows(self, limit: int, min_confidence: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT description, category, sentiment, analysis_stage FROM tickets "
+                "WHERE processed = 1 AND confidence >= ? ORDER BY created_at DESC LIMIT ?",
+                (min_confidence, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    # ============================
+    # Escrituras
+    # ============================
+
+    def create(self, description: str, priority: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        rows = self.create_many([description], [priority])
+        return rows[0] if rows else None
+
+    def create_many(
+        self,
+        descriptions: Sequence[str],
+        priorities: Optional[Sequence[Optional[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        priorities = priorities or [None] * len(descriptions)
+        rows = [
+            {
+                "id": str(uuid.uuid4()),
+                "created_at": None,
+                "description": description,
+                "category": None,
+                "sentiment": None,
+                "confidence": None,
+                "processed": False,
+                "status": "pending",
+                "priority": priority,
+                "error_message": None,
+                "analysis_stage": None,
+                "claimed_at": None,
+                "processed_at": None,
+            }
+            for description, priority in zip(descriptions, priorities)
+        ]
+        with self._lock, self._transaction("IMMEDIATE"):
+            # created_at estrictamente creciente en orden de llegada, también
+            # dentro de un bloque y entre procesos (el lock de escritura serializa)
+            latest = self._conn.execute("SELECT MAX(created_at) FROM tickets").fetchone()[0]
+            start = datetime.now(timezone.utc)
+            if latest is not None:
+                start = max(start, datetime.fromisoformat(latest) + timedelta(microseconds=1))
+            for offset, row in enumerate(rows):
+                row["created_at"] = (start + timedelta(microseconds=offset)).strftime(TIMESTAMP_FORMAT)
+            self._conn.executemany(
+                "INSERT INTO tickets (id, created_at, description, processed, status, priority) "
+                "VALUES (?, ?, ?, 0, 'pending', ?)",
+                [(row["id"], row["created_at"], row["description"], row["priority"]) for row in rows]
+            )
+        for row in rows:
+            self._remember(row)
+        return rows
+
+    def claim(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        rows = self.claim_many([ticket_id])
+        return rows[0] if rows else None
+
+    def claim_many(self, ticket_ids: List[str]) -> List[Dict[str, Any]]:
+        self._forget(ticket_ids)
+        if not ticket_ids:
+            return []
+
+        now = datetime.now(timezone.utc)
+        stale_before = (now - timedelta(seconds=CLAIM_STALE_SECONDS)).strftime(TIMESTAMP_FORMAT)
+        placeholders = ", ".join("?" for _ in ticket_ids)
+
+        with self._lock, self._transaction("IMMEDIATE"):
+            claimed = {
+                row["id"] for row in self._conn.execute(
+                    f"UPDATE tickets SET status = 'processing', claimed_at = ? "
+                    f"WHERE id IN ({placeholders}) AND processed = 0 "
+                    "AND (status IS NOT 'processing' OR claimed_at IS NULL OR claimed_at < ?) "
+                    "RETURNING id",
+                    (now.strftime(TIMESTAMP_FORMAT), *ticket_ids, stale_before)
+                ).fetchall()
+            }
+            rows = self._conn.execute(
+                f"SELECT * FROM tickets WHERE id IN ({placeholders})", tuple(ticket_ids)
+            ).fetchall()
+
+        return [{**self._to_dict(row), "claimed": row["id"] in claimed} for row in rows]
+
+    def complete(
+        self,
+        ticket_id: str,
+        classification: ClassificationResult,
+        claimed_at: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        rows = self.complete_many({ticket_id: classification}, {ticket_id: claimed_at})
+        return rows[0] if rows else None
+
+    def _complete_row(
+        self,
+        ticket_id: str,
+        classification: ClassificationResult,
+        claimed_at: str,
+        processed_at: str
+    ) -> Optional[sqlite3.Row]:
+        """Escribe el resultado si el ticket sigue con ese claim; None si se perdió"""
+        fields = self._result_fields(classification)
+        return self._conn.execute(
+            "UPDATE tickets SET category = ?, sentiment = ?, confidence = ?, analysis_stage = ?, "
+            "processed = 1, status = 'done', processed_at = ? "
+            "WHERE id = ? AND status = 'processing' AND claimed_at = ? RETURNING *",
+            (
+                fields["category"], fields["sentiment"], fields["confidence"],
+                fields["analysis_stage"], processed_at, ticket_id, claimed_at
+            )
+        ).fetchone()
+
+    def complete_many(
+        self,
+        results: Dict[str, ClassificationResult],
+        claims: Dict[str, Optional[str]]
+    ) -> List[Dict[str, Any]]:
+        """Guarda varios resultados en una sola transacción"""
+        self._forget(list(results))
+        processed_at = _now()
+        rows = []
+        with self._lock, self._transaction():
+            for ticket_id, classification in results.items():
+                if claims.get(ticket_id) is None:
+                    continue
+                row = self._complete_row(ticket_id, classification, claims[ticket_id], processed_at)
+                if row is not None:
+                    rows.append(row)
+
+        updated = [self._to_dict(row) for row in rows]
+        for row in updated:
+            self._remember(row)
+        return updated
+
+    def mark_error(self, ticket_ids: List[str]) -> None:
+        self._forget(ticket_ids)
+        if not ticket_ids:
+            return
+        placeholders = ", ".join("?" for _ in ticket_ids)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE tickets SET status = 'error' WHERE id IN ({placeholders})", tuple(ticket_ids)
+            )
+
+    # ============================
+    # Mantenimiento
+    # ============================
+
+    def refresh_stats(self) -> None:
+        """Reconstruye el resumen y los rollups horarios desde la tabla de tickets"""
+        with self._lock, self._transaction():
+            self._conn.execute(
+                "UPDATE ticket_stats_summary SET "
+                "total_tickets = (SELECT COUNT(*) FROM tickets), "
+                "processed_tickets = (SELECT COUNT(*) FROM tickets WHERE processed = 1), "
+                "unprocessed_tickets = (SELECT COUNT(*) FROM tickets WHERE processed = 0), "
+                "positive_sentiment = (SELECT COUNT(*) FROM tickets WHERE sentiment = 'Positivo'), "
+                "neutral_sentiment = (SELECT COUNT(*) FROM tickets WHERE sentiment = 'Neutral'), "
+                "negative_sentiment = (SELECT COUNT(*) FROM tickets WHERE sentiment = 'Negativo'), "
+                "tecnico_category = (SELECT COUNT(*) FROM tickets WHERE category = 'Técnico'), "
+                "facturacion_category = (SELECT COUNT(*) FROM tickets WHERE category = 'Facturación'), "
+                "comercial_category = (SELECT COUNT(*) FROM tickets WHERE category = 'Comercial') "
+                "WHERE id = 1"
+            )
+            self._conn.execute("DELETE FROM ticket_stats_hourly")
+            self._conn.execute(
+                "INSERT INTO ticket_stats_hourly ("
+                "bucket, category, sentiment, status, tickets, processed_tickets, latency_seconds_sum) "
+                "SELECT substr(created_at, 1, 13) || ':00:00+00:00', COALESCE(category, ''), "
+                "COALESCE(sentiment, ''), COALESCE(status, ''), COUNT(*), "
+                "SUM(processed = 1 AND processed_at IS NOT NULL), "
+                "COALESCE(SUM(CASE WHEN processed = 1 AND processed_at IS NOT NULL THEN "
+                "MAX((julianday(processed_at) - julianday(created_at)) * 86400.0, 0) END), 0) "
+                "FROM tickets GROUP BY 1, 2, 3, 4"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, mode: str = "DEFERRED") -> "_Transaction":
+        return _Transaction(self._conn, mode)
+
+    @staticmethod
+    def _to_dict(row: Optional[sqlite3.Row]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        data = dict(row)
+        if "processed" in data and data["processed"] is not None:
+            data["processed"] = bool(data["processed"])
+        return data
+
+
+class _Transaction:
+    """BEGIN/COMMIT explícitos (la conexión está en modo autocommit)"""
+
+    def __init__(self, conn: sqlite3.Connection, mode: str):
+        self.conn = conn
+        self.mode = mode
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute(f"BEGIN {self.mode}")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
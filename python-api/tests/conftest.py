@@ -0,0 +1,11 @@
+"""Configuración común de los tests: módulos planos de python-api y entorno mínimo"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config.py solo lee variables; los tests no contactan Supabase ni Hugging Face
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("HUGGINGFACE_API_TOKEN", "hf_test")
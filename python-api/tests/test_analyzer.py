@@ -0,0 +1,129 @@
+"""Llamadas al modelo con clientes falsos: salida estructurada y empaquetado"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import analyzer
+from exceptions import LLMAnalysisError
+
+
+ANALYSIS = {"category": "Técnico", "sentiment": "Negativo", "confidence": 0.9}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, text):
+        super().__init__(f"{status_code} Client Error")
+        self.response = SimpleNamespace(status_code=status_code, text=text)
+
+
+class ScriptedClient:
+    """Cliente asíncrono que responde con `replies` en orden (excepciones se lanzan)"""
+
+    def __init__(self, model, replies):
+        self.model = model
+        self.replies = list(replies)
+        self.requests = []
+
+    async def chat_completion(self, messages, **options):
+        self.requests.append(options)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return SimpleNamespace(choices=[SimpleNamespace(message={"content": json.dumps(reply)})])
+
+
+@pytest.fixture(autouse=True)
+def isolated_analyzer(monkeypatch):
+    monkeypatch.setattr(analyzer, "analysis_cache", None)
+    monkeypatch.setattr(analyzer, "LLM_STRUCTURED_OUTPUT", True)
+    monkeypatch.setattr(analyzer, "_plain_json_models", set())
+
+
+def test_response_format_rejection_disables_it_for_that_client_only():
+    rejecting = ScriptedClient("model-a", [
+        HTTPError(422, '{"error": "response_format is not supported by this model"}'),
+        ANALYSIS,
+    ])
+    other = ScriptedClient("model-b", [ANALYSIS])
+
+    asyncio.run(analyzer.analyze_ticket_async("No carga la app", rejecting))
+    asyncio.run(analyzer.analyze_ticket_async("No carga la app", other))
+
+    assert "response_format" in rejecting.requests[0]
+    assert "response_format" not in rejecting.requests[1]
+    assert "response_format" in other.requests[0]
+
+
+def test_unrelated_bad_request_is_not_a_structured_output_rejection():
+    client = ScriptedClient("model-a", [HTTPError(400, '{"error": "Input validation error: too many tokens"}')])
+
+    with pytest.raises(LLMAnalysisError):
+        asyncio.run(analyzer.analyze_ticket_async("No carga la app", client))
+
+    assert len(client.requests) == 1
+    assert analyzer._uses_structured_output(client)
+
+
+@pytest.fixture
+def packed_client(monkeypatch):
+    monkeypatch.setattr(analyzer, "LLM_PACK_SIZE", 4)
+
+    def install(replies):
+        client = ScriptedClient("model-a", replies)
+        monkeypatch.setattr(analyzer, "_async_client", client)
+        return client
+
+    return install
+
+
+def test_failed_pack_call_is_not_split_into_single_calls(packed_client):
+    client = packed_client([HTTPError(503, "Service Unavailable")])
+
+    results = asyncio.run(analyzer.analyze_tickets_async(["uno", "dos", "tres"]))
+
+    assert len(client.requests) == 1
+    assert all(isinstance(result, LLMAnalysisError) for result in results)
+
+
+def test_invalid_pack_items_are_retried_individually(packed_client):
+    client = packed_client([
+        {"results": [{"index": 0, **ANALYSIS}, {"index": 1, **ANALYSIS, "category": "Otro"}]},
+        ANALYSIS,
+    ])
+
+    results = asyncio.run(analyzer.analyze_tickets_async(["uno", "dos"]))
+
+    assert len(client.requests) == 2
+    assert [result.category for result in results] == ["Técnico", "Técnico"]
+
+
+def test_latency_excludes_the_wait_for_a_slot():
+    client = ScriptedClient("model-a", [ANALYSIS])
+    latency = analyzer.LatencyTracker()
+
+    async def scenario():
+        semaphore = asyncio.Semaphore(1)
+        await semaphore.acquire()
+        asyncio.get_running_loop().call_later(0.3, semaphore.release)
+        await analyzer.analyze_ticket_async("No carga la app", client, semaphore, latency)
+
+    asyncio.run(scenario())
+
+    assert len(latency) == 1
+    assert latency.percentile(1.0) < 0.1
+
+
+def test_hedge_backend_does_not_wait_for_primary_slots(monkeypatch):
+    hedge = analyzer.HuggingFaceAnalyzerBackend("hedge-model")
+    hedge._client = ScriptedClient("hedge-model", [ANALYSIS])
+
+    async def scenario():
+        saturated = asyncio.Semaphore(1)
+        await saturated.acquire()
+        monkeypatch.setattr(analyzer, "_llm_semaphore", saturated)
+        return await asyncio.wait_for(hedge.analyze("No carga la app"), timeout=1)
+
+    assert asyncio.run(scenario()).category == "Técnico"
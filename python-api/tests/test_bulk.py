@@ -0,0 +1,82 @@
+"""POST /tickets/bulk con JSON y NDJSON: resultados por ítem sobre SQLite"""
+
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import tickets
+from sqlite_repository import SQLiteTicketRepository
+
+
+@pytest.fixture(scope="module")
+def app_state(tmp_path_factory):
+    # El router de tickets es global: se registra una sola vez por módulo
+    repository = SQLiteTicketRepository(str(tmp_path_factory.mktemp("bulk") / "tickets.db"))
+    app = FastAPI()
+    app.include_router(tickets.setup_routes(repository))
+    yield TestClient(app), repository
+    repository.close()
+
+
+@pytest.fixture
+def client(app_state, monkeypatch):
+    notified = []
+    monkeypatch.setattr(tickets, "notify_n8n_webhooks_batch", notified.append)
+    client, _ = app_state
+    client.notified = notified
+    return client
+
+
+def post_ndjson(client, lines):
+    return client.post(
+        "/tickets/bulk",
+        content="\n".join(lines).encode("utf-8"),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+
+
+def test_json_array_reports_each_item_in_order(client, app_state):
+    _, repository = app_state
+    response = client.post("/tickets/bulk", json=[
+        {"description": "No puedo iniciar sesión en la app"},
+        {"description": "abc"},
+        {"texto": "sin descripción"},
+        {"description": "Me cobraron dos veces la factura"},
+    ])
+
+    body = response.json()
+    assert response.status_code == 200
+    assert (body["created"], body["failed"]) == (2, 2)
+    assert [result["index"] for result in body["results"]] == [0, 1, 2, 3]
+    assert [result["status_code"] for result in body["results"]] == [201, 422, 422, 201]
+    created = [result["ticket"]["id"] for result in body["results"] if result["success"]]
+    assert [repository.get(ticket_id)["description"] for ticket_id in created] == [
+        "No puedo iniciar sesión en la app", "Me cobraron dos veces la factura"
+    ]
+    assert [[ticket["ticket_id"] for ticket in batch] for batch in client.notified] == [created]
+
+
+def test_ndjson_mixes_valid_invalid_and_malformed_lines(client):
+    response = post_ndjson(client, [
+        json.dumps({"description": "La aplicación se cierra al abrir"}),
+        "",
+        "{no es json",
+        json.dumps({"description": "   "}),
+        json.dumps({"description": "Quiero ampliar mi plan actual"}),
+    ])
+
+    body = response.json()
+    assert response.status_code == 200
+    assert [(result["index"], result["status_code"]) for result in body["results"]] == [
+        (0, 201), (1, 400), (2, 422), (3, 201)
+    ]
+    assert body["results"][1]["error"].startswith("Invalid JSON")
+    assert (body["created"], body["failed"]) == (2, 2)
+
+
+def test_body_that_is_not_a_list_is_rejected(client):
+    assert client.post("/tickets/bulk", json={"description": "Un solo ticket"}).status_code == 400
+    assert post_ndjson(client, ["", "  "]).status_code == 400
+    assert client.notified == []
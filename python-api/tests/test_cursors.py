@@ -0,0 +1,53 @@
+"""Validación de los cursores de paginación antes de llegar al filtro de PostgREST"""
+
+import base64
+import json
+
+import pytest
+
+from repository import decode_cursor, decode_search_cursor, encode_cursor, encode_search_cursor
+
+
+TICKET_ID = "3f2b8c1e-5d4a-4b7e-9c6f-1a2b3c4d5e6f"
+CREATED_AT = "2025-03-01T10:15:30.123456+00:00"
+
+
+def raw_cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({"created_at": CREATED_AT, "id": TICKET_ID})
+    assert decode_cursor(cursor) == (CREATED_AT, TICKET_ID)
+
+
+def test_search_cursor_round_trip():
+    cursor = encode_search_cursor({"rank": 0.25, "created_at": CREATED_AT, "id": TICKET_ID})
+    assert decode_search_cursor(cursor) == (0.25, CREATED_AT, TICKET_ID)
+
+
+@pytest.mark.parametrize("position", [
+    [CREATED_AT, "1),id.gt.(0"],
+    ['2025-03-01",status.eq."done', TICKET_ID],
+    [CREATED_AT, 42],
+    [CREATED_AT],
+    "not a list",
+])
+def test_cursor_rejects_tampered_fields(position):
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor(position))
+
+
+@pytest.mark.parametrize("position", [
+    ["NaN", CREATED_AT, TICKET_ID],
+    [0.5, "yesterday", TICKET_ID],
+    [0.5, CREATED_AT, "x)"],
+])
+def test_search_cursor_rejects_tampered_fields(position):
+    with pytest.raises(ValueError):
+        decode_search_cursor(raw_cursor(position))
+
+
+def test_cursor_rejects_garbage():
+    with pytest.raises(ValueError):
+        decode_cursor("%%%")
@@ -0,0 +1,61 @@
+"""TicketEventBroker con muchos suscriptores SSE inactivos"""
+
+import asyncio
+import time
+
+from events import TicketEventBroker
+
+
+SUBSCRIBERS = 1000
+
+
+async def read_frames(broker, frames, count):
+    """Lee `count` frames del flujo (el primero es la directiva retry)"""
+    stream = broker.subscribe()
+    try:
+        async for frame in stream:
+            frames.append(frame)
+            if len(frames) == count:
+                return
+    finally:
+        await stream.aclose()
+
+
+def test_thousand_idle_subscribers_share_one_wakeup():
+    async def scenario():
+        broker = TicketEventBroker(buffer_size=100, coalesce_ms=10, heartbeat_seconds=3600, retry_ms=1000)
+        inboxes = [[] for _ in range(SUBSCRIBERS)]
+        readers = [asyncio.create_task(read_frames(broker, inbox, 2)) for inbox in inboxes]
+        await asyncio.sleep(0.1)
+        idle = broker.stats()["subscribers"]
+
+        started = time.monotonic()
+        broker.ticket_created({"id": "t1", "status": "pending", "description": "No carga"})
+        broker.ticket_updated({"id": "t1", "status": "processing"})
+        await asyncio.wait_for(asyncio.gather(*readers), timeout=5)
+        fan_out = time.monotonic() - started
+
+        return broker, idle, inboxes, fan_out
+
+    broker, idle, inboxes, fan_out = asyncio.run(scenario())
+
+    assert idle == SUBSCRIBERS
+    assert broker.stats()["subscribers"] == 0
+    # Las dos publicaciones se coalescen en un único evento created para todos
+    assert all(inbox[1].startswith(f"id: {broker.epoch}-1\nevent: created\n") for inbox in inboxes)
+    assert all('"status": "processing"' in inbox[1] for inbox in inboxes)
+    assert broker.stats()["emitted"] == 1
+    assert fan_out < 2
+
+
+def test_idle_subscribers_receive_keep_alive_from_one_timer():
+    async def scenario():
+        broker = TicketEventBroker(buffer_size=10, coalesce_ms=10, heartbeat_seconds=0.05, retry_ms=1000)
+        inboxes = [[] for _ in range(SUBSCRIBERS)]
+        readers = [asyncio.create_task(read_frames(broker, inbox, 2)) for inbox in inboxes]
+        await asyncio.wait_for(asyncio.gather(*readers), timeout=5)
+        return inboxes
+
+    inboxes = asyncio.run(scenario())
+
+    assert all(inbox[1] == ": keep-alive\n\n" for inbox in inboxes)
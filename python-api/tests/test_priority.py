@@ -0,0 +1,21 @@
+"""Heurística de prioridad inicial"""
+
+import pytest
+
+from priority import estimate_priority
+
+
+@pytest.mark.parametrize("description, expected", [
+    ("URGENTE: el sistema está caído en producción", "high"),
+    ("Me cobraron dos veces la factura, es urgente", "high"),
+    ("No es urgente, pero quería consultar el plan anual", "low"),
+    ("No es urgente", "low"),
+    ("Sin prisa, una sugerencia para el panel", "low"),
+    ("La exportación tarda más de lo normal", "medium"),
+])
+def test_estimate_priority(description, expected):
+    assert estimate_priority(description) == expected
+
+
+def test_urgent_term_outside_the_negation_still_counts():
+    assert estimate_priority("No es urgente lo del logo, pero el cobro es urgente y critico") == "medium"
@@ -0,0 +1,135 @@
+"""Circuit breaker del backend de análisis con backends falsos"""
+
+import asyncio
+
+import pytest
+
+import config
+from analyzer import AnalyzerBackend
+from config import ConfigurationError
+from models import AnalysisStage, TicketAnalysis
+from resilience import CircuitBreaker, ResilientAnalyzerBackend
+
+
+ANALYSIS = TicketAnalysis(category="Técnico", sentiment="Neutral", confidence=0.8)
+
+
+class FakeBackend(AnalyzerBackend):
+    """Responde ANALYSIS, lanza `error` o se queda colgado si `hang`"""
+
+    name = "fake"
+
+    def __init__(self, error=None, hang=False):
+        self.error = error
+        self.hang = hang
+        self.calls = 0
+
+    async def analyze(self, description):
+        self.calls += 1
+        if self.hang:
+            await asyncio.Event().wait()
+        if self.error is not None:
+            raise self.error
+        return ANALYSIS
+
+
+def open_breaker():
+    """Circuito que pasa a half_open en la siguiente llamada"""
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    return breaker
+
+
+def test_unexpected_exception_counts_as_failure():
+    backend = ResilientAnalyzerBackend(
+        FakeBackend(error=RuntimeError("boom")),
+        breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    )
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            asyncio.run(backend.classify("ticket"))
+
+    assert backend.breaker.state == "open"
+
+
+def test_failed_probe_reopens_the_circuit():
+    primary = FakeBackend(error=RuntimeError("boom"))
+    backend = ResilientAnalyzerBackend(primary, fallback=FakeBackend(), breaker=open_breaker())
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(backend.classify("ticket"))
+
+    assert backend.breaker.state == "open"
+    assert primary.calls == 1
+
+
+def test_cancelled_probe_lets_the_next_call_probe():
+    primary = FakeBackend(hang=True)
+    backend = ResilientAnalyzerBackend(primary, fallback=FakeBackend(), breaker=open_breaker())
+
+    async def scenario():
+        probe = asyncio.create_task(backend.classify("ticket"))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+        primary.hang = False
+        return await backend.classify("ticket")
+
+    result = asyncio.run(scenario())
+
+    assert result.stage == AnalysisStage.LLM.value
+    assert backend.breaker.state == "closed"
+
+
+def test_cancelled_batch_probe_lets_the_next_batch_probe():
+    primary = FakeBackend(hang=True)
+    backend = ResilientAnalyzerBackend(primary, fallback=FakeBackend(), breaker=open_breaker())
+
+    async def scenario():
+        probe = asyncio.create_task(backend.classify_many(["a", "b"]))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+
+        primary.hang = False
+        return await backend.classify_many(["a", "b"])
+
+    results = asyncio.run(scenario())
+
+    assert [result.stage for result in results] == [AnalysisStage.LLM.value] * 2
+    assert backend.breaker.state == "closed"
+
+
+class LifecycleBackend(FakeBackend):
+    def __init__(self):
+        super().__init__()
+        self.starts = 0
+        self.closes = 0
+
+    async def start(self):
+        self.starts += 1
+
+    async def close(self):
+        self.closes += 1
+
+
+def test_shared_hedge_and_fallback_start_once():
+    local = LifecycleBackend()
+    backend = ResilientAnalyzerBackend(FakeBackend(), hedge=local, fallback=local)
+
+    asyncio.run(backend.start())
+    asyncio.run(backend.close())
+
+    assert (local.starts, local.closes) == (1, 1)
+
+
+@pytest.mark.parametrize("setting", ["LLM_FALLBACK", "LLM_HEDGE_BACKEND"])
+def test_local_backend_cannot_cover_a_local_primary(monkeypatch, setting):
+    monkeypatch.setattr(config, "ANALYZER_BACKEND", "local")
+    monkeypatch.setattr(config, "LLM_RESILIENCE_ENABLED", True)
+    monkeypatch.setattr(config, setting, "local")
+
+    with pytest.raises(ConfigurationError, match=setting):
+        config.validate_configuration()
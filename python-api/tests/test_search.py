@@ -0,0 +1,106 @@
+"""Búsqueda de texto completo en SQLiteTicketRepository: índice FTS, filtros y paginación"""
+
+import pytest
+
+import sqlite_repository
+from models import AnalysisStage, ClassificationResult, TicketAnalysis
+from repository import decode_search_cursor, encode_search_cursor
+from sqlite_repository import SQLiteTicketRepository
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = SQLiteTicketRepository(str(tmp_path / "tickets.db"))
+    yield repository
+    repository.close()
+
+
+def classify(repository, ticket_id, category, sentiment):
+    """Deja el ticket procesado con esa categoría y sentimiento"""
+    claim = repository.claim(ticket_id)
+    result = ClassificationResult(
+        analysis=TicketAnalysis(category=category, sentiment=sentiment, confidence=0.9),
+        stage=AnalysisStage.LLM
+    )
+    repository.complete(ticket_id, result, claim["claimed_at"])
+
+
+def search_ids(repository, query, **kwargs):
+    return [row["id"] for row in repository.search(query, 100, **kwargs)]
+
+
+def all_pages(repository, query, page_size, sort):
+    """Recorre la búsqueda con el cursor de la API hasta la última página"""
+    ids, after = [], None
+    while True:
+        page = repository.search(query, page_size + 1, sort=sort, after=after)
+        ids.extend(row["id"] for row in page[:page_size])
+        if len(page) <= page_size:
+            return ids
+        after = decode_search_cursor(encode_search_cursor(page[page_size - 1]))
+
+
+def test_search_matches_terms_without_accents(repository):
+    ticket = repository.create("No me llegó la facturación de marzo")
+    repository.create("La aplicación se cierra al abrir")
+
+    assert search_ids(repository, "facturacion") == [ticket["id"]]
+    assert search_ids(repository, '"llegó la facturación"') == [ticket["id"]]
+
+
+def test_index_follows_description_updates(repository):
+    ticket = repository.create("Error 500 al pagar")
+    repository._conn.execute(
+        "UPDATE tickets SET description = ? WHERE id = ?", ("Cobro duplicado en la tarjeta", ticket["id"])
+    )
+    repository._forget([ticket["id"]])
+
+    assert search_ids(repository, "error") == []
+    assert search_ids(repository, "cobro duplicado") == [ticket["id"]]
+
+
+def test_index_follows_deletes(repository):
+    deleted = repository.create("Cobro duplicado en la tarjeta")
+    kept = repository.create("Otro cobro duplicado")
+    repository._conn.execute("DELETE FROM tickets WHERE id = ?", (deleted["id"],))
+
+    assert search_ids(repository, "cobro") == [kept["id"]]
+
+
+def test_search_filters_by_category_and_sentiment(repository):
+    billing = repository.create("Cobro duplicado, muy molesto")
+    technical = repository.create("El cobro falla con error 500")
+    repository.create("Cobro pendiente sin procesar")
+    classify(repository, billing["id"], "Facturación", "Negativo")
+    classify(repository, technical["id"], "Técnico", "Negativo")
+
+    assert search_ids(repository, "cobro", category="Facturación") == [billing["id"]]
+    assert set(search_ids(repository, "cobro", sentiment="Negativo")) == {billing["id"], technical["id"]}
+    assert search_ids(repository, "cobro", category="Técnico", sentiment="Positivo") == []
+
+
+@pytest.mark.parametrize("sort", ["relevance", "recent"])
+def test_pages_cover_every_match_once(repository, sort):
+    # Un solo create_many: varias filas pueden compartir created_at
+    created = repository.create_many([f"Cobro duplicado {'cobro ' * n}" for n in range(7)])
+    repository.create("Sin relación")
+
+    ids = all_pages(repository, "cobro", 3, sort)
+
+    assert sorted(ids) == sorted(row["id"] for row in created)
+    assert len(ids) == len(set(ids))
+
+
+def test_recent_sort_is_newest_first(repository):
+    older = repository.create("Cobro duplicado")
+    newer = repository.create("Cobro duplicado otra vez")
+
+    assert search_ids(repository, "cobro", sort="recent") == [newer["id"], older["id"]]
+
+
+def test_relevance_ranks_only_the_newest_candidates(repository, monkeypatch):
+    monkeypatch.setattr(sqlite_repository, "SEARCH_MAX_CANDIDATES", 2)
+    repository.create("Cobro cobro cobro cobro")
+    newest = [repository.create(f"Cobro número {n}")["id"] for n in range(2)]
+
+    assert set(search_ids(repository, "cobro")) == set(newest)
@@ -0,0 +1,77 @@
+"""SingleFlight: coalescencia en el proceso y espera a otro worker vía flock"""
+
+import asyncio
+
+import pytest
+
+import single_flight
+from models import AnalysisStage, ClassificationResult, TicketAnalysis
+from processing import PROCESSED_MESSAGE, _process_ticket
+from single_flight import SingleFlight
+from sqlite_repository import SQLiteTicketRepository
+
+
+def test_concurrent_callers_share_one_run(tmp_path):
+    calls = []
+
+    async def work(after_peer):
+        calls.append(after_peer)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def scenario():
+        flight = SingleFlight(enabled=True, lock_dir=str(tmp_path))
+        return await asyncio.gather(*(flight.run("t1", work) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert calls == [False]
+
+
+@pytest.mark.skipif(single_flight.fcntl is None, reason="flock no disponible")
+def test_worker_that_waited_for_a_peer_is_told_so(tmp_path):
+    # Dos instancias con el mismo directorio hacen de dos workers del host
+    seen = {}
+
+    async def scenario():
+        started, release = asyncio.Event(), asyncio.Event()
+
+        async def leader_work(after_peer):
+            seen["leader"] = after_peer
+            started.set()
+            await release.wait()
+
+        async def follower_work(after_peer):
+            seen["follower"] = after_peer
+
+        first = SingleFlight(enabled=True, lock_dir=str(tmp_path))
+        second = SingleFlight(enabled=True, lock_dir=str(tmp_path))
+        leader = asyncio.create_task(first.run("t1", leader_work))
+        await started.wait()
+        follower = asyncio.create_task(second.run("t1", follower_work))
+        await asyncio.sleep(0.2)
+        waiting = "follower" not in seen
+        release.set()
+        await asyncio.gather(leader, follower)
+        return waiting, second.stats()["waited_for_peer"]
+
+    assert asyncio.run(scenario()) == (True, 1)
+    assert seen == {"leader": False, "follower": True}
+
+
+def test_result_left_by_a_peer_is_a_normal_response(tmp_path):
+    repository = SQLiteTicketRepository(str(tmp_path / "tickets.db"))
+    ticket = repository.create("Me cobraron dos veces")
+    claim = repository.claim(ticket["id"])
+    result = ClassificationResult(
+        analysis=TicketAnalysis(category="Facturación", sentiment="Negativo", confidence=0.9),
+        stage=AnalysisStage.LLM
+    )
+    repository.complete(ticket["id"], result, claim["claimed_at"])
+
+    after_peer = asyncio.run(_process_ticket(repository, ticket["id"], after_peer=True))
+    repeated = asyncio.run(_process_ticket(repository, ticket["id"]))
+    repository.close()
+
+    assert after_peer.message == PROCESSED_MESSAGE
+    assert after_peer.category == "Facturación"
+    assert repeated.message == "Ticket already processed (idempotent response)"
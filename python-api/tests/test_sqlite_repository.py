@@ -0,0 +1,93 @@
+"""SQLiteTicketRepository: claims y escrituras de resultados"""
+
+import pytest
+
+from analyzer import AnalyzerBackend
+from models import AnalysisStage, ClassificationResult, TicketAnalysis
+from repository import SupabaseTicketRepository, TicketRepository
+from sqlite_repository import SQLiteTicketRepository
+
+
+RESULT = ClassificationResult(
+    analysis=TicketAnalysis(category="Técnico", sentiment="Negativo", confidence=0.9),
+    stage=AnalysisStage.LLM
+)
+
+
+@pytest.fixture
+def repository(tmp_path):
+    repository = SQLiteTicketRepository(str(tmp_path / "tickets.db"))
+    yield repository
+    repository.close()
+
+
+def expire_claim(repository, ticket_id):
+    """Simula que el claim venció (CLAIM_STALE_SECONDS) para permitir otro"""
+    repository._conn.execute(
+        "UPDATE tickets SET claimed_at = '2000-01-01T00:00:00.000000+00:00' WHERE id = ?", (ticket_id,)
+    )
+
+
+def test_complete_saves_result_for_the_current_claim(repository):
+    ticket = repository.create("No puedo entrar a mi cuenta", "high")
+    claim = repository.claim(ticket["id"])
+
+    row = repository.complete(ticket["id"], RESULT, claim["claimed_at"])
+
+    assert claim["claimed"]
+    assert row["status"] == "done" and row["processed"]
+    assert row["category"] == "Técnico"
+
+
+def test_complete_after_a_stale_reclaim_is_discarded(repository):
+    ticket = repository.create("No puedo entrar a mi cuenta", "high")
+    first = repository.claim(ticket["id"])
+    expire_claim(repository, ticket["id"])
+    second = repository.claim(ticket["id"])
+
+    assert second["claimed"] and second["claimed_at"] != first["claimed_at"]
+    assert repository.complete(ticket["id"], RESULT, first["claimed_at"]) is None
+    assert repository.get(ticket["id"])["status"] == "processing"
+    assert repository.complete(ticket["id"], RESULT, second["claimed_at"])["status"] == "done"
+
+
+def test_complete_many_skips_lost_claims_and_never_reinserts(repository):
+    kept, reclaimed, deleted = (repository.create(f"Ticket {n}", "low") for n in range(3))
+    claims = {row["id"]: row["claimed_at"] for row in repository.claim_many([kept["id"], reclaimed["id"], deleted["id"]])}
+    expire_claim(repository, reclaimed["id"])
+    repository.claim(reclaimed["id"])
+    repository._conn.execute("DELETE FROM tickets WHERE id = ?", (deleted["id"],))
+
+    rows = repository.complete_many({ticket_id: RESULT for ticket_id in claims}, claims)
+
+    assert [row["id"] for row in rows] == [kept["id"]]
+    assert repository.get(reclaimed["id"])["status"] == "processing"
+    assert repository._conn.execute(
+        "SELECT COUNT(*) FROM tickets WHERE id = ?", (deleted["id"],)
+    ).fetchone()[0] == 0
+
+
+def test_created_at_increases_within_and_across_chunks(repository):
+    first = repository.create_many([f"Ticket {n}" for n in range(50)])
+    second = repository.create_many(["Otro ticket", "Y otro más"])
+
+    stamps = [row["created_at"] for row in first + second]
+    assert stamps == sorted(stamps) and len(set(stamps)) == len(stamps)
+    listed = repository.list_tickets(limit=52)
+    assert [row["id"] for row in listed] == [row["id"] for row in reversed(first + second)]
+
+
+def test_incomplete_backends_fail_at_instantiation():
+    class PartialRepository(TicketRepository):
+        def get(self, ticket_id):
+            return None
+
+    class PartialAnalyzer(AnalyzerBackend):
+        name = "partial"
+
+    with pytest.raises(TypeError):
+        PartialRepository()
+    with pytest.raises(TypeError):
+        PartialAnalyzer()
+    # Los backends reales implementan toda la interfaz
+    SupabaseTicketRepository(client=None)
@@ -0,0 +1,211 @@
+"""WebhookDispatcher contra un servidor HTTP local que hace de n8n"""
+
+import asyncio
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from webhooks import WebhookDispatcher, WebhookOutbox
+
+
+class StandInWebhook:
+    """Servidor HTTP en un hilo; responde `status` y guarda los payloads recibidos"""
+
+    def __init__(self, status: int = 200, delay: float = 0.0):
+        self.status = status
+        self.delay = delay
+        self.received = []
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if stand_in.delay:
+                    threading.Event().wait(stand_in.delay)
+                with stand_in._lock:
+                    stand_in.received.append(json.loads(body))
+                self.send_response(stand_in.status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            # Las ráfagas concurrentes de los tests superan la cola por defecto (5)
+            request_queue_size = 128
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_port}/webhook"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def outbox_path(tmp_path):
+    return str(tmp_path / "outbox.db")
+
+
+def make_dispatcher(url, outbox_path, **kwargs):
+    kwargs.setdefault("timeout", 2)
+    kwargs.setdefault("retry_interval", 3600)
+    kwargs.setdefault("backoff_seconds", 0)
+    return WebhookDispatcher([url], outbox_path, **kwargs)
+
+
+def test_delivery_removes_outbox_row(outbox_path):
+    async def scenario():
+        with StandInWebhook() as sink:
+            dispatcher = make_dispatcher(sink.url, outbox_path)
+            await dispatcher.deliver_all({"id": "t1"})
+            counts = dispatcher.outbox.counts()
+            await dispatcher.stop()
+            return sink.received, counts
+
+    received, counts = asyncio.run(scenario())
+    assert received == [{"id": "t1"}]
+    assert counts == {"pending": 0, "dead": 0}
+
+
+def test_row_is_written_before_sending(outbox_path):
+    async def scenario():
+        with StandInWebhook(delay=0.5) as sink:
+            dispatcher = make_dispatcher(sink.url, outbox_path)
+            dispatcher.dispatch({"id": "t1"})
+            await asyncio.sleep(0.2)
+            # En curso: una caída ahora no pierde la entrega
+            during = dispatcher.outbox.counts()
+            await dispatcher.stop()
+            return during, WebhookOutbox(outbox_path).counts()
+
+    during, after = asyncio.run(scenario())
+    assert during == {"pending": 1, "dead": 0}
+    assert after == {"pending": 0, "dead": 0}
+
+
+def test_failed_delivery_is_retried(outbox_path):
+    async def scenario():
+        with StandInWebhook(status=503) as sink:
+            dispatcher = make_dispatcher(sink.url, outbox_path)
+            await dispatcher.deliver_all({"id": "t1"})
+            failed = dispatcher.outbox.counts()
+            sink.status = 200
+            delivered = await dispatcher.retry_due()
+            counts = dispatcher.outbox.counts()
+            await dispatcher.stop()
+            return failed, delivered, counts, len(sink.received)
+
+    failed, delivered, counts, requests = asyncio.run(scenario())
+    assert failed == {"pending": 1, "dead": 0}
+    assert delivered == 1
+    assert counts == {"pending": 0, "dead": 0}
+    assert requests == 2
+
+
+def test_gives_up_after_max_attempts(outbox_path):
+    async def scenario():
+        with StandInWebhook(status=500) as sink:
+            dispatcher = make_dispatcher(sink.url, outbox_path, max_attempts=2)
+            await dispatcher.deliver_all({"id": "t1"})
+            await dispatcher.retry_due()
+            counts = dispatcher.outbox.counts()
+            await dispatcher.stop()
+            return counts
+
+    assert asyncio.run(scenario()) == {"pending": 0, "dead": 1}
+
+
+def test_dead_deliveries_are_purged_after_retention(outbox_path):
+    async def scenario():
+        with StandInWebhook(status=500) as sink:
+            dispatcher = make_dispatcher(sink.url, outbox_path, max_attempts=2, dead_retention=60)
+            await dispatcher.deliver_all({"id": "old"})
+            await dispatcher.retry_due()
+            await dispatcher.deliver_all({"id": "pending"})
+            kept = await dispatcher.purge_dead()
+            # La descartada pasa a ser más antigua que la retención
+            dispatcher.outbox._conn.execute("UPDATE webhook_outbox SET next_attempt_at = 0 WHERE dead = 1")
+            purged = await dispatcher.purge_dead()
+            counts = dispatcher.outbox.counts()
+            await dispatcher.stop()
+            return kept, purged, counts
+
+    assert asyncio.run(scenario()) == (0, 1, {"pending": 1, "dead": 0})
+
+
+def test_stats_do_not_create_the_outbox(outbox_path):
+    dispatcher = make_dispatcher("http://unused", outbox_path)
+
+    assert dispatcher.stats()["outbox"] == {"pending": 0, "dead": 0}
+    assert not os.path.exists(outbox_path)
+
+
+def test_crashed_delivery_is_recovered_after_lease(outbox_path):
+    outbox = WebhookOutbox(outbox_path)
+    # Fila de un proceso que murió a mitad de envío: la reserva ya venció
+    outbox.add("http://unused", {"id": "t1"}, locked_until=0)
+    outbox.close()
+
+    async def scenario():
+        with StandInWebhook() as sink:
+            dispatcher = make_dispatcher("http://unused", outbox_path)
+            # La fila guarda la URL original; se redirige al servidor local
+            dispatcher.outbox._conn.execute("UPDATE webhook_outbox SET url = ?", (sink.url,))
+            delivered = await dispatcher.retry_due()
+            await dispatcher.stop()
+            return delivered, sink.received
+
+    assert asyncio.run(scenario()) == (1, [{"id": "t1"}])
+
+
+def test_shared_outbox_is_not_delivered_twice(outbox_path):
+    async def scenario():
+        with StandInWebhook(status=500) as sink:
+            workers = [make_dispatcher(sink.url, outbox_path) for _ in range(3)]
+            for index in range(20):
+                await workers[0].deliver_all({"id": f"t{index}"})
+            sink.status = 200
+            sink.received.clear()
+            delivered = await asyncio.gather(*(worker.retry_due() for worker in workers))
+            for worker in workers:
+                await worker.stop()
+            return delivered, sink.received
+
+    delivered, received = asyncio.run(scenario())
+    assert sum(delivered) == 20
+    assert sorted(payload["id"] for payload in received) == sorted(f"t{index}" for index in range(20))
+
+
+def test_batch_without_batch_target_keeps_the_per_ticket_payload(outbox_path):
+    async def scenario():
+        with StandInWebhook() as sink:
+            dispatcher = make_dispatcher(sink.url, outbox_path)
+            dispatcher.dispatch_batch([{"id": "t1"}, {"id": "t2"}])
+            await dispatcher.stop()
+            return sink.received
+
+    assert asyncio.run(scenario()) == [{"id": "t1"}, {"id": "t2"}]
+
+
+def test_batch_goes_only_to_the_batch_target(outbox_path):
+    async def scenario():
+        with StandInWebhook() as sink, StandInWebhook() as batch_sink:
+            dispatcher = make_dispatcher(sink.url, outbox_path, batch_targets=[batch_sink.url])
+            dispatcher.dispatch_batch([{"id": "t1"}, {"id": "t2"}])
+            await dispatcher.stop()
+            return sink.received, batch_sink.received
+
+    received, batch_received = asyncio.run(scenario())
+    assert received == []
+    assert batch_received == [{"event": "tickets_created", "count": 2, "tickets": [{"id": "t1"}, {"id": "t2"}]}]
@@ -1,31 +1,384 @@
 """Webhook notification logic for n8n integration"""
 
-import requests
-from typing import Dict, Any
-from config import logger, N8N_WEBHOOK_TEST, N8N_WEBHOOK_PROD
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Coroutine, Dict, List, Optional, Set
+
+import httpx
+
+from config import (
+    logger,
+    WEBHOOK_TARGETS,
+    WEBHOOK_BATCH_TARGETS,
+    WEBHOOK_TIMEOUT_SECONDS,
+    WEBHOOK_OUTBOX_PATH,
+    WEBHOOK_MAX_ATTEMPTS,
+    WEBHOOK_RETRY_INTERVAL_SECONDS,
+    WEBHOOK_BACKOFF_SECONDS,
+    WEBHOOK_DEAD_RETENTION_SECONDS
+)
+from metrics import span, webhook_deliveries_total
+
+
+class WebhookOutbox:
+    """
+    Bandeja de salida persistente (SQLite) de entregas pendientes.
+
+    Cada fila es una entrega a una URL concreta, con el número de intentos
+    y el instante del próximo reintento. La fila se escribe antes del
+    primer envío y se borra tras un 2xx, así que una caída con entregas en
+    curso no las pierde (entrega al menos una vez).
+
+    Varios procesos pueden compartir el archivo: claim_due() reserva las
+    filas (locked_until) dentro de una transacción IMMEDIATE antes de
+    enviarlas, de modo que cada reintento lo hace un solo proceso.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS webhook_outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "url TEXT NOT NULL, "
+            "payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "next_attempt_at REAL NOT NULL, "
+            "last_error TEXT, "
+            "dead INTEGER NOT NULL DEFAULT 0, "
+            "locked_until REAL NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(webhook_outbox)")}
+        if "locked_until" not in columns:
+            # Outbox creados antes del claim de filas
+            self._conn.execute("ALTER TABLE webhook_outbox ADD COLUMN locked_until REAL NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_webhook_outbox_due "
+            "ON webhook_outbox(dead, next_attempt_at)"
+        )
+
+    def add(self, url: str, payload: Dict[str, Any], locked_until: float) -> int:
+        """Registra una entrega nueva, ya reservada por quien la va a enviar"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO webhook_outbox (url, payload, attempts, next_attempt_at, locked_until) "
+                "VALUES (?, ?, 0, ?, ?)",
+                (url, json.dumps(payload), time.time(), locked_until)
+            )
+        return cursor.lastrowid
+
+    def claim_due(self, now: float, locked_until: float, limit: int = 100) -> List[Dict[str, Any]]:
+        """Reserva hasta `limit` entregas vencidas y no reservadas por otro proceso"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, url, payload, attempts FROM webhook_outbox "
+                    "WHERE dead = 0 AND next_attempt_at <= ? AND locked_until <= ? "
+                    "ORDER BY next_attempt_at LIMIT ?",
+                    (now, now, limit)
+                ).fetchall()
+                claimed = []
+                for row in rows:
+                    updated = self._conn.execute(
+                        "UPDATE webhook_outbox SET locked_until = ? WHERE id = ? AND locked_until <= ?",
+                        (locked_until, row[0], now)
+                    ).rowcount
+                    if updated == 1:
+                        claimed.append(row)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [
+            {"id": row[0], "url": row[1], "payload": json.loads(row[2]), "attempts": row[3]}
+            for row in claimed
+        ]
+
+    def remove(self, entry_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM webhook_outbox WHERE id = ?", (entry_id,))
+
+    def reschedule(self, entry_id: int, attempts: int, next_attempt_at: float, error: str, dead: bool) -> None:
+        """
+        Registra un intento fallido y libera la reserva. En las descartadas
+        (dead) next_attempt_at guarda cuándo se dieron por perdidas.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE webhook_outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, dead = ?, "
+                "locked_until = 0 WHERE id = ?",
+                (attempts, next_attempt_at, error, int(dead), entry_id)
+            )
+
+    def purge_dead(self, before: float) -> int:
+        """Borra las entregas descartadas antes de `before`; retorna cuántas"""
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM webhook_outbox WHERE dead = 1 AND next_attempt_at < ?", (before,)
+            ).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            pending, dead = self._conn.execute(
+                "SELECT COALESCE(SUM(dead = 0), 0), COALESCE(SUM(dead = 1), 0) FROM webhook_outbox"
+            ).fetchone()
+        return {"pending": pending, "dead": dead}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class WebhookDispatcher:
+    """
+    Entrega notificaciones fuera del camino de la petición.
+
+    dispatch() retorna de inmediato; cada entrega se registra en el outbox
+    antes de enviarse, se envía en paralelo con un cliente HTTP asíncrono
+    compartido y se borra tras un 2xx. Las fallidas (o las que quedaron a
+    medias por una caída, al vencer su reserva) las reintenta un bucle en
+    segundo plano con backoff exponencial.
+    """
+
+    def __init__(
+        self,
+        targets: List[str],
+        outbox_path: str,
+        batch_targets: Optional[List[str]] = None,
+        timeout: float = WEBHOOK_TIMEOUT_SECONDS,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        retry_interval: float = WEBHOOK_RETRY_INTERVAL_SECONDS,
+        backoff_seconds: float = WEBHOOK_BACKOFF_SECONDS,
+        dead_retention: float = WEBHOOK_DEAD_RETENTION_SECONDS
+    ):
+        self.targets = [url for url in targets if url]
+        self.batch_targets = [url for url in batch_targets or [] if url]
+        self.outbox_path = outbox_path
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_interval = retry_interval
+        self.backoff_seconds = backoff_seconds
+        self.dead_retention = dead_retention
+        # Reserva de una fila mientras se envía: si el proceso muere, otro la retoma al vencer
+        self.lease_seconds = max(30.0, 3 * timeout)
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._outbox: Optional[WebhookOutbox] = None
+        self._retry_task: Optional[asyncio.Task] = None
+        self._inflight: Set[asyncio.Task] = set()
+        self._counters = {"delivered": 0, "failed": 0, "retried": 0, "dead": 0}
+
+    @property
+    def outbox(self) -> WebhookOutbox:
+        if self._outbox is None:
+            self._outbox = WebhookOutbox(self.outbox_path)
+        return self._outbox
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                headers={"Content-Type": "application/json"}
+            )
+        return self._client
+
+    async def start(self) -> None:
+        """Arranca el bucle de reintentos del outbox"""
+        if self._retry_task is None:
+            self._retry_task = asyncio.create_task(self._retry_loop(), name="webhook-outbox-retry")
+            logger.info(f"Webhook dispatcher started with {len(self.targets)} targets")
+
+    async def stop(self) -> None:
+        """Espera las entregas en curso y libera el cliente HTTP"""
+        if self._retry_task is not None:
+            self._retry_task.cancel()
+            await asyncio.gather(self._retry_task, return_exceptions=True)
+            self._retry_task = None
+        if self._inflight:
+            await asyncio.wait(self._inflight, timeout=self.timeout)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._outbox is not None:
+            self._outbox.close()
+            self._outbox = None
+
+    def dispatch(self, payload: Dict[str, Any]) -> None:
+        """Programa la entrega del payload a todos los destinos sin esperar"""
+        self._schedule(self.deliver_all(payload))
+
+    def dispatch_batch(self, payloads: List[Dict[str, Any]]) -> None:
+        """
+        Programa la notificación de varios tickets sin esperar: un único
+        payload agrupado a batch_targets si hay alguno configurado; si no,
+        un payload por ticket a los destinos normales, uno tras otro.
+        """
+        if self.batch_targets:
+            self._schedule(self.deliver_all(
+                {"event": "tickets_created", "count": len(payloads), "tickets": payloads},
+                self.batch_targets
+            ))
+        else:
+            self._schedule(self._deliver_each(payloads))
+
+    def _schedule(self, delivery: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.create_task(delivery)
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def deliver_all(self, payload: Dict[str, Any], targets: Optional[List[str]] = None) -> None:
+        """Entrega el payload a todos los destinos (por defecto self.targets) en paralelo"""
+        urls = self.targets if targets is None else targets
+        await asyncio.gather(*(self._deliver_new(url, payload) for url in urls))
+
+    async def _deliver_each(self, payloads: List[Dict[str, Any]]) -> None:
+        for payload in payloads:
+            await self.deliver_all(payload)
+
+    async def _post(self, url: str, payload: Dict[str, Any]) -> Optional[str]:
+        """Envía el payload; retorna None si tuvo éxito o el motivo del fallo"""
+        try:
+            with span("webhook_delivery"):
+                response = await self._get_client().post(url, json=payload)
+        except Exception as e:
+            webhook_deliveries_total.inc(outcome="failed")
+            return f"{type(e).__name__}: {e}"
+        if 200 <= response.status_code < 300:
+            webhook_deliveries_total.inc(outcome="delivered")
+            return None
+        webhook_deliveries_total.inc(outcome="failed")
+        return f"HTTP {response.status_code}"
+
+    async def _deliver_new(self, url: str, payload: Dict[str, Any]) -> None:
+        try:
+            entry_id: Optional[int] = await asyncio.to_thread(
+                self.outbox.add, url, payload, time.time() + self.lease_seconds
+            )
+        except Exception as e:
+            # Sin outbox se intenta igual, sin garantía de reintento
+            logger.error(f"Webhook outbox write failed, sending without retry: {e}")
+            entry_id = None
+
+        error = await self._post(url, payload)
+        if error is None:
+            self._counters["delivered"] += 1
+            logger.info(f"Webhook notification sent successfully to {url}")
+            if entry_id is not None:
+                await asyncio.to_thread(self.outbox.remove, entry_id)
+            return
+
+        # No lanzamos excepción para que un webhook fallido no impida el proceso
+        self._counters["failed"] += 1
+        logger.warning(f"Webhook {url} failed ({error}), queued for retry")
+        if entry_id is not None:
+            await asyncio.to_thread(
+                self.outbox.reschedule, entry_id, 1, time.time() + self.backoff_seconds, error, False
+            )
+
+    async def retry_due(self) -> int:
+        """
+        Reintenta las entregas vencidas del outbox.
+
+        Returns:
+            Número de entregas completadas
+        """
+        now = time.time()
+        entries = await asyncio.to_thread(self.outbox.claim_due, now, now + self.lease_seconds)
+        results = await asyncio.gather(*(self._post(entry["url"], entry["payload"]) for entry in entries))
+
+        delivered = 0
+        for entry, error in zip(entries, results):
+            self._counters["retried"] += 1
+            if error is None:
+                delivered += 1
+                self._counters["delivered"] += 1
+                await asyncio.to_thread(self.outbox.remove, entry["id"])
+                continue
+
+            attempts = entry["attempts"] + 1
+            dead = attempts >= self.max_attempts
+            next_attempt_at = time.time() + self.backoff_seconds * (2 ** (attempts - 1))
+            if dead:
+                self._counters["dead"] += 1
+                logger.error(f"Webhook {entry['url']} gave up after {attempts} attempts: {error}")
+                next_attempt_at = time.time()
+            await asyncio.to_thread(
+                self.outbox.reschedule, entry["id"], attempts, next_attempt_at, error, dead
+            )
+
+        if entries:
+            logger.info(f"Webhook outbox retry: {delivered}/{len(entries)} delivered")
+        return delivered
+
+    async def purge_dead(self) -> int:
+        """
+        Borra las entregas descartadas más antiguas que dead_retention
+        (0 = se conservan siempre).
+
+        Returns:
+            Número de filas borradas
+        """
+        if self.dead_retention <= 0:
+            return 0
+        purged = await asyncio.to_thread(self.outbox.purge_dead, time.time() - self.dead_retention)
+        if purged:
+            logger.info(f"Webhook outbox: purged {purged} dead deliveries")
+        return purged
+
+    async def _retry_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                await self.retry_due()
+                await self.purge_dead()
+            except Exception as e:
+                logger.error(f"Webhook outbox retry failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "targets": len(self.targets),
+            "batch_targets": len(self.batch_targets),
+            "inflight": len(self._inflight),
+            "outbox": self._outbox_counts(),
+            **self._counters
+        }
+
+    def _outbox_counts(self) -> Dict[str, int]:
+        # Consultar las estadísticas no debe crear el archivo del outbox
+        if self._outbox is None and not os.path.exists(self.outbox_path):
+            return {"pending": 0, "dead": 0}
+        return self.outbox.counts()
+
+
+webhook_dispatcher = WebhookDispatcher(WEBHOOK_TARGETS, WEBHOOK_OUTBOX_PATH, WEBHOOK_BATCH_TARGETS)
 
 
 def notify_n8n_webhooks(ticket_data: Dict[str, Any]) -> None:
     """
     Envía notificación de nuevo ticket a los webhooks de n8n.
-    
+    La entrega ocurre en segundo plano; esta función no bloquea.
+
     Args:
         ticket_data: Diccionario con los datos del ticket creado
     """
-    webhooks = [N8N_WEBHOOK_TEST, N8N_WEBHOOK_PROD]
-    
-    for webhook_url in webhooks:
-        try:
-            response = requests.post(
-                webhook_url,
-                json=ticket_data,
-                timeout=10,
-                headers={"Content-Type": "application/json"}
-            )
-            if response.status_code in [200, 201, 204]:
-                logger.info(f"Webhook notification sent successfully to {webhook_url}")
-            else:
-                logger.warning(f"Webhook {webhook_url} returned status {response.status_code}")
-        except Exception as e:
-            logger.error(f"Failed to send webhook notification to {webhook_url}: {e}")
-            # No lanzamos excepción para que un webhook fallido no impida el proceso
+    webhook_dispatcher.dispatch(ticket_data)
+
+
+def notify_n8n_webhooks_batch(tickets: List[Dict[str, Any]]) -> None:
+    """
+    Notifica varios tickets creados a la vez (carga masiva). Con
+    N8N_WEBHOOK_BATCH configurado se envía una única notificación
+    {"event": "tickets_created", "count", "tickets"} a esa URL; sin él,
+    los webhooks de n8n reciben un payload por ticket, igual que
+    notify_n8n_webhooks.
+    """
+    webhook_dispatcher.dispatch_batch(tickets)
@@ -24,9 +24,43 @@ CREATE TABLE IF NOT EXISTS tickets (
     processed BOOLEAN DEFAULT FALSE,
     status TEXT DEFAULT 'new',          -- new, processing, done, error
     priority TEXT,                     -- high, medium, low
-    error_message TEXT
+    error_message TEXT,
+
+    -- Cascade stage that produced the classification: preclassifier, llm
+    analysis_stage TEXT,
+
+    -- When the ticket was last claimed for processing
+    claimed_at TIMESTAMP WITH TIME ZONE,
+
+    -- When the classification was stored (set by trigger)
+    processed_at TIMESTAMP WITH TIME ZONE
 );
 
+-- Columns added after the initial release (safe to re-run on existing tables)
+ALTER TABLE tickets ADD COLUMN IF NOT EXISTS analysis_stage TEXT;
+ALTER TABLE tickets ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE tickets ADD COLUMN IF NOT EXISTS processed_at TIMESTAMP WITH TIME ZONE;
+
+-- Stamps processed_at whenever a ticket becomes processed
+CREATE OR REPLACE FUNCTION tickets_set_processed_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.processed = true AND (TG_OP = 'INSERT' OR OLD.processed IS DISTINCT FROM true) THEN
+        NEW.processed_at := NOW();
+    ELSIF NEW.processed IS DISTINCT FROM true THEN
+        NEW.processed_at := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tickets_processed_at ON tickets;
+CREATE TRIGGER tickets_processed_at
+    BEFORE INSERT OR UPDATE OF processed ON tickets
+    FOR EACH ROW EXECUTE FUNCTION tickets_set_processed_at();
+
 -- ============================
 -- Row Level Security
 -- ============================
@@ -64,11 +98,69 @@ CREATE INDEX IF NOT EXISTS idx_tickets_sentiment ON tickets(sentiment);
 CREATE INDEX IF NOT EXISTS idx_tickets_processed ON tickets(processed);
 CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
 
+-- Keyset pagination on (created_at, id), newest first
+CREATE INDEX IF NOT EXISTS idx_tickets_created_at_id ON tickets(created_at DESC, id DESC);
+
+-- Full-text search over descriptions (Spanish stemming and stop words).
+-- Expression index instead of a stored tsvector column so `select *` keeps
+-- returning only the ticket fields; queries must use the same expression.
+CREATE INDEX IF NOT EXISTS idx_tickets_description_search
+    ON tickets USING GIN (to_tsvector('spanish', description));
+
 -- ============================
--- Statistics Function
+-- Statistics Summary
 -- ============================
 
-CREATE OR REPLACE FUNCTION get_ticket_stats()
+-- Counters kept up to date by triggers, so reading the statistics is O(1)
+-- instead of a full scan of tickets. They are split into 16 shards: each
+-- ticket only updates the row of its shard (ticket_stats_shard), so
+-- concurrent writers rarely wait on the same row lock. Readers sum the shards.
+
+-- The first version kept a single row keyed by id; the summary is derived
+-- data, so it is dropped and rebuilt by refresh_ticket_stats() below.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'ticket_stats_summary' AND column_name = 'id'
+    ) THEN
+        DROP TABLE ticket_stats_summary;
+    END IF;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS ticket_stats_summary (
+    shard SMALLINT PRIMARY KEY CHECK (shard >= 0 AND shard < 16),
+
+    total_tickets BIGINT NOT NULL DEFAULT 0,
+    processed_tickets BIGINT NOT NULL DEFAULT 0,
+    unprocessed_tickets BIGINT NOT NULL DEFAULT 0,
+
+    positive_sentiment BIGINT NOT NULL DEFAULT 0,
+    neutral_sentiment BIGINT NOT NULL DEFAULT 0,
+    negative_sentiment BIGINT NOT NULL DEFAULT 0,
+
+    tecnico_category BIGINT NOT NULL DEFAULT 0,
+    facturacion_category BIGINT NOT NULL DEFAULT 0,
+    comercial_category BIGINT NOT NULL DEFAULT 0,
+
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Only reachable through the SECURITY DEFINER functions below
+ALTER TABLE ticket_stats_summary ENABLE ROW LEVEL SECURITY;
+
+-- Shard of a ticket's counters: 0..15 from the hash of its id
+CREATE OR REPLACE FUNCTION ticket_stats_shard(p_id UUID)
+RETURNS SMALLINT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT (hashtext(p_id::TEXT) & 15)::SMALLINT;
+$$;
+
+-- Full-scan computation, used to (re)build the summary
+CREATE OR REPLACE FUNCTION compute_ticket_stats()
 RETURNS TABLE (
     total_tickets BIGINT,
     processed_tickets BIGINT,
@@ -102,3 +194,563 @@ BEGIN
     FROM tickets;
 END;
 $$;
+
+-- Rebuilds the summary from scratch (run once after creating it, or to repair drift).
+-- Only the sum across shards is meaningful, so the full counts go to shard 0
+-- and the other shards restart at zero. Rows are updated in place, never
+-- deleted, so trigger updates waiting on them are not lost.
+CREATE OR REPLACE FUNCTION refresh_ticket_stats()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    INSERT INTO ticket_stats_summary (shard)
+    SELECT generate_series(0, 15)
+    ON CONFLICT (shard) DO NOTHING;
+
+    UPDATE ticket_stats_summary s SET
+        total_tickets = c.total_tickets,
+        processed_tickets = c.processed_tickets,
+        unprocessed_tickets = c.unprocessed_tickets,
+        positive_sentiment = c.positive_sentiment,
+        neutral_sentiment = c.neutral_sentiment,
+        negative_sentiment = c.negative_sentiment,
+        tecnico_category = c.tecnico_category,
+        facturacion_category = c.facturacion_category,
+        comercial_category = c.comercial_category,
+        updated_at = NOW()
+    FROM compute_ticket_stats() c
+    WHERE s.shard = 0;
+
+    UPDATE ticket_stats_summary SET
+        total_tickets = 0,
+        processed_tickets = 0,
+        unprocessed_tickets = 0,
+        positive_sentiment = 0,
+        neutral_sentiment = 0,
+        negative_sentiment = 0,
+        tecnico_category = 0,
+        facturacion_category = 0,
+        comercial_category = 0,
+        updated_at = NOW()
+    WHERE shard <> 0;
+END;
+$$;
+
+-- Adds (p_sign = 1) or removes (p_sign = -1) one row's contribution to the summary
+CREATE OR REPLACE FUNCTION apply_ticket_stats(r tickets, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    UPDATE ticket_stats_summary SET
+        total_tickets = total_tickets + p_sign,
+        processed_tickets = processed_tickets + CASE WHEN r.processed = true THEN p_sign ELSE 0 END,
+        unprocessed_tickets = unprocessed_tickets + CASE WHEN r.processed = false THEN p_sign ELSE 0 END,
+
+        positive_sentiment = positive_sentiment + CASE WHEN r.sentiment = 'Positivo' THEN p_sign ELSE 0 END,
+        neutral_sentiment = neutral_sentiment + CASE WHEN r.sentiment = 'Neutral' THEN p_sign ELSE 0 END,
+        negative_sentiment = negative_sentiment + CASE WHEN r.sentiment = 'Negativo' THEN p_sign ELSE 0 END,
+
+        tecnico_category = tecnico_category + CASE WHEN r.category = 'Técnico' THEN p_sign ELSE 0 END,
+        facturacion_category = facturacion_category + CASE WHEN r.category = 'Facturación' THEN p_sign ELSE 0 END,
+        comercial_category = comercial_category + CASE WHEN r.category = 'Comercial' THEN p_sign ELSE 0 END,
+
+        updated_at = NOW()
+    WHERE shard = ticket_stats_shard(r.id);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION tickets_stats_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_ticket_stats(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_ticket_stats(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tickets_stats_insert_delete ON tickets;
+CREATE TRIGGER tickets_stats_insert_delete
+    AFTER INSERT OR DELETE ON tickets
+    FOR EACH ROW EXECUTE FUNCTION tickets_stats_trigger();
+
+-- Status-only updates (processing, error) do not touch the counters
+DROP TRIGGER IF EXISTS tickets_stats_update ON tickets;
+CREATE TRIGGER tickets_stats_update
+    AFTER UPDATE OF processed, sentiment, category ON tickets
+    FOR EACH ROW
+    WHEN (
+        OLD.processed IS DISTINCT FROM NEW.processed
+        OR OLD.sentiment IS DISTINCT FROM NEW.sentiment
+        OR OLD.category IS DISTINCT FROM NEW.category
+    )
+    EXECUTE FUNCTION tickets_stats_trigger();
+
+SELECT refresh_ticket_stats();
+
+-- ============================
+-- Statistics Function
+-- ============================
+
+CREATE OR REPLACE FUNCTION get_ticket_stats()
+RETURNS TABLE (
+    total_tickets BIGINT,
+    processed_tickets BIGINT,
+    unprocessed_tickets BIGINT,
+
+    positive_sentiment BIGINT,
+    neutral_sentiment BIGINT,
+    negative_sentiment BIGINT,
+
+    tecnico_category BIGINT,
+    facturacion_category BIGINT,
+    comercial_category BIGINT
+) 
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        COALESCE(SUM(s.total_tickets), 0)::BIGINT,
+        COALESCE(SUM(s.processed_tickets), 0)::BIGINT,
+        COALESCE(SUM(s.unprocessed_tickets), 0)::BIGINT,
+
+        COALESCE(SUM(s.positive_sentiment), 0)::BIGINT,
+        COALESCE(SUM(s.neutral_sentiment), 0)::BIGINT,
+        COALESCE(SUM(s.negative_sentiment), 0)::BIGINT,
+
+        COALESCE(SUM(s.tecnico_category), 0)::BIGINT,
+        COALESCE(SUM(s.facturacion_category), 0)::BIGINT,
+        COALESCE(SUM(s.comercial_category), 0)::BIGINT
+    FROM ticket_stats_summary s;
+END;
+$$;
+
+-- ============================
+-- Statistics Timeseries
+-- ============================
+
+-- Hourly rollups keyed on the created_at bucket, maintained by triggers.
+-- Unclassified tickets use '' for category/sentiment so they can be part of the key.
+CREATE TABLE IF NOT EXISTS ticket_stats_hourly (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+    category TEXT NOT NULL DEFAULT '',
+    sentiment TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT '',
+
+    tickets BIGINT NOT NULL DEFAULT 0,
+    processed_tickets BIGINT NOT NULL DEFAULT 0,
+
+    -- Sum of (processed_at - created_at) over processed tickets, in seconds
+    latency_seconds_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+
+    PRIMARY KEY (bucket, category, sentiment, status)
+);
+
+ALTER TABLE ticket_stats_hourly ENABLE ROW LEVEL SECURITY;
+
+-- Adds (p_sign = 1) or removes (p_sign = -1) one row's contribution to its bucket
+CREATE OR REPLACE FUNCTION apply_ticket_timeseries(r tickets, p_sign INTEGER)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+    v_processed INTEGER := CASE WHEN r.processed = true AND r.processed_at IS NOT NULL THEN 1 ELSE 0 END;
+BEGIN
+    IF r.created_at IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO ticket_stats_hourly AS h (
+        bucket, category, sentiment, status, tickets, processed_tickets, latency_seconds_sum
+    )
+    VALUES (
+        date_trunc('hour', r.created_at, 'UTC'),
+        COALESCE(r.category::TEXT, ''),
+        COALESCE(r.sentiment::TEXT, ''),
+        COALESCE(r.status, ''),
+        p_sign,
+        p_sign * v_processed,
+        p_sign * v_processed * GREATEST(EXTRACT(EPOCH FROM r.processed_at - r.created_at), 0)
+    )
+    ON CONFLICT (bucket, category, sentiment, status) DO UPDATE SET
+        tickets = h.tickets + EXCLUDED.tickets,
+        processed_tickets = h.processed_tickets + EXCLUDED.processed_tickets,
+        latency_seconds_sum = h.latency_seconds_sum + EXCLUDED.latency_seconds_sum;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION tickets_timeseries_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM apply_ticket_timeseries(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM apply_ticket_timeseries(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS tickets_timeseries_insert_delete ON tickets;
+CREATE TRIGGER tickets_timeseries_insert_delete
+    AFTER INSERT OR DELETE ON tickets
+    FOR EACH ROW EXECUTE FUNCTION tickets_timeseries_trigger();
+
+DROP TRIGGER IF EXISTS tickets_timeseries_update ON tickets;
+CREATE TRIGGER tickets_timeseries_update
+    AFTER UPDATE OF created_at, processed, processed_at, sentiment, category, status ON tickets
+    FOR EACH ROW
+    WHEN (
+        OLD.created_at IS DISTINCT FROM NEW.created_at
+        OR OLD.processed IS DISTINCT FROM NEW.processed
+        OR OLD.processed_at IS DISTINCT FROM NEW.processed_at
+        OR OLD.sentiment IS DISTINCT FROM NEW.sentiment
+        OR OLD.category IS DISTINCT FROM NEW.category
+        OR OLD.status IS DISTINCT FROM NEW.status
+    )
+    EXECUTE FUNCTION tickets_timeseries_trigger();
+
+-- Rebuilds the rollups from scratch (backfill after creating them, or to repair drift)
+CREATE OR REPLACE FUNCTION refresh_ticket_timeseries()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    DELETE FROM ticket_stats_hourly;
+
+    INSERT INTO ticket_stats_hourly (
+        bucket, category, sentiment, status, tickets, processed_tickets, latency_seconds_sum
+    )
+    SELECT
+        date_trunc('hour', t.created_at, 'UTC'),
+        COALESCE(t.category::TEXT, ''),
+        COALESCE(t.sentiment::TEXT, ''),
+        COALESCE(t.status, ''),
+        COUNT(*),
+        COUNT(*) FILTER (WHERE t.processed = true AND t.processed_at IS NOT NULL),
+        COALESCE(SUM(GREATEST(EXTRACT(EPOCH FROM t.processed_at - t.created_at), 0))
+            FILTER (WHERE t.processed = true AND t.processed_at IS NOT NULL), 0)
+    FROM tickets t
+    WHERE t.created_at IS NOT NULL
+    GROUP BY 1, 2, 3, 4;
+END;
+$$;
+
+SELECT refresh_ticket_timeseries();
+
+-- One row per bucket in [p_from, p_to) with totals, processing latency and
+-- per-category/sentiment/status breakdowns. p_granularity is 'hour' or 'day'
+-- (UTC days); only the rollups are read, never the tickets table.
+CREATE OR REPLACE FUNCTION get_ticket_timeseries(
+    p_from TIMESTAMP WITH TIME ZONE,
+    p_to TIMESTAMP WITH TIME ZONE,
+    p_granularity TEXT DEFAULT 'hour'
+)
+RETURNS TABLE (
+    bucket TIMESTAMP WITH TIME ZONE,
+    tickets BIGINT,
+    processed_tickets BIGINT,
+    avg_latency_seconds DOUBLE PRECISION,
+    by_category JSONB,
+    by_sentiment JSONB,
+    by_status JSONB
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    IF p_granularity NOT IN ('hour', 'day') THEN
+        RAISE EXCEPTION 'Invalid granularity: %', p_granularity;
+    END IF;
+
+    RETURN QUERY
+    WITH f AS (
+        SELECT date_trunc(p_granularity, h.bucket, 'UTC') AS b, h.*
+        FROM ticket_stats_hourly h
+        WHERE h.bucket >= date_trunc('hour', p_from, 'UTC')
+          AND h.bucket < p_to
+    ),
+    totals AS (
+        SELECT
+            f.b,
+            SUM(f.tickets)::BIGINT AS tickets,
+            SUM(f.processed_tickets)::BIGINT AS processed_tickets,
+            (SUM(f.latency_seconds_sum) / NULLIF(SUM(f.processed_tickets), 0))::DOUBLE PRECISION AS avg_latency
+        FROM f
+        GROUP BY f.b
+        HAVING SUM(f.tickets) > 0
+    ),
+    categories AS (
+        SELECT x.b, jsonb_object_agg(x.k, x.n) AS j
+        FROM (SELECT f.b, f.category AS k, SUM(f.tickets) AS n FROM f
+              WHERE f.category <> '' GROUP BY 1, 2 HAVING SUM(f.tickets) > 0) x
+        GROUP BY x.b
+    ),
+    sentiments AS (
+        SELECT x.b, jsonb_object_agg(x.k, x.n) AS j
+        FROM (SELECT f.b, f.sentiment AS k, SUM(f.tickets) AS n FROM f
+              WHERE f.sentiment <> '' GROUP BY 1, 2 HAVING SUM(f.tickets) > 0) x
+        GROUP BY x.b
+    ),
+    statuses AS (
+        SELECT x.b, jsonb_object_agg(x.k, x.n) AS j
+        FROM (SELECT f.b, f.status AS k, SUM(f.tickets) AS n FROM f
+              WHERE f.status <> '' GROUP BY 1, 2 HAVING SUM(f.tickets) > 0) x
+        GROUP BY x.b
+    )
+    SELECT
+        t.b,
+        t.tickets,
+        t.processed_tickets,
+        t.avg_latency,
+        COALESCE(c.j, '{}'::JSONB),
+        COALESCE(s.j, '{}'::JSONB),
+        COALESCE(st.j, '{}'::JSONB)
+    FROM totals t
+    LEFT JOIN categories c ON c.b = t.b
+    LEFT JOIN sentiments s ON s.b = t.b
+    LEFT JOIN statuses st ON st.b = t.b
+    ORDER BY t.b;
+END;
+$$;
+
+-- ============================
+-- Processing Claim Functions
+-- ============================
+
+-- Atomically moves a ticket to 'processing' and returns it in one round-trip.
+-- `claimed` is true only for the caller that won the claim; a ticket already
+-- in 'processing' can be re-claimed once its claim is older than p_stale_seconds.
+-- The returned claimed_at identifies the claim: the result write is conditioned
+-- on it, so a slower owner whose claim went stale cannot overwrite the new one.
+-- CREATE OR REPLACE cannot change the RETURNS TABLE columns of an existing
+-- function, so both are dropped first (claim_ticket wraps claim_tickets).
+DROP FUNCTION IF EXISTS claim_ticket(UUID, INTEGER);
+DROP FUNCTION IF EXISTS claim_tickets(UUID[], INTEGER);
+
+CREATE OR REPLACE FUNCTION claim_tickets(p_ticket_ids UUID[], p_stale_seconds INTEGER DEFAULT 600)
+RETURNS TABLE (
+    id UUID,
+    created_at TIMESTAMP WITH TIME ZONE,
+    description TEXT,
+    category ticket_category,
+    sentiment ticket_sentiment,
+    confidence FLOAT,
+    analysis_stage TEXT,
+    processed BOOLEAN,
+    status TEXT,
+    priority TEXT,
+    claimed_at TIMESTAMP WITH TIME ZONE,
+    claimed BOOLEAN
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH claimed_rows AS (
+        UPDATE tickets t
+        SET status = 'processing',
+            claimed_at = NOW()
+        WHERE t.id = ANY(p_ticket_ids)
+          AND t.processed = false
+          AND (
+              t.status IS DISTINCT FROM 'processing'
+              OR t.claimed_at IS NULL
+              OR t.claimed_at < NOW() - make_interval(secs => p_stale_seconds)
+          )
+        RETURNING t.id, t.claimed_at
+    )
+    SELECT
+        t.id,
+        t.created_at,
+        t.description,
+        t.category,
+        t.sentiment,
+        t.confidence,
+        t.analysis_stage,
+        t.processed,
+        CASE WHEN c.id IS NOT NULL THEN 'processing' ELSE t.status END,
+        t.priority,
+        COALESCE(c.claimed_at, t.claimed_at),
+        c.id IS NOT NULL
+    FROM tickets t
+    LEFT JOIN claimed_rows c ON c.id = t.id
+    WHERE t.id = ANY(p_ticket_ids);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION claim_ticket(p_ticket_id UUID, p_stale_seconds INTEGER DEFAULT 600)
+RETURNS TABLE (
+    id UUID,
+    created_at TIMESTAMP WITH TIME ZONE,
+    description TEXT,
+    category ticket_category,
+    sentiment ticket_sentiment,
+    confidence FLOAT,
+    analysis_stage TEXT,
+    processed BOOLEAN,
+    status TEXT,
+    priority TEXT,
+    claimed_at TIMESTAMP WITH TIME ZONE,
+    claimed BOOLEAN
+)
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+    SELECT * FROM claim_tickets(ARRAY[p_ticket_id], p_stale_seconds);
+$$;
+
+-- Saves a batch of analysis results in one statement. p_results is a JSON
+-- array of {id, category, sentiment, confidence, analysis_stage, claimed_at}.
+-- Like the single-ticket write, each row is updated only while it is still
+-- 'processing' with the claimed_at returned by its claim; deleted or
+-- re-claimed tickets are skipped (never re-inserted) and left out of the result.
+CREATE OR REPLACE FUNCTION complete_tickets(p_results JSONB)
+RETURNS SETOF tickets
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+    UPDATE tickets t
+    SET category = r.category::ticket_category,
+        sentiment = r.sentiment::ticket_sentiment,
+        confidence = r.confidence,
+        analysis_stage = r.analysis_stage,
+        processed = true,
+        status = 'done'
+    FROM jsonb_to_recordset(p_results) AS r(
+        id UUID,
+        category TEXT,
+        sentiment TEXT,
+        confidence FLOAT,
+        analysis_stage TEXT,
+        claimed_at TIMESTAMP WITH TIME ZONE
+    )
+    WHERE t.id = r.id
+      AND t.status = 'processing'
+      AND t.claimed_at = r.claimed_at
+    RETURNING t.*;
+$$;
+
+-- ============================
+-- Full-text Search
+-- ============================
+
+-- Ranked search over descriptions using idx_tickets_description_search.
+-- p_query uses web search syntax: "factura duplicada" (phrase), error 500
+-- (all terms), cobro or cargo, -demo. Results are paged by keyset:
+-- pass the rank, created_at and id of the last row of the previous page.
+-- p_sort 'relevance' orders by ts_rank_cd; 'recent' walks the newest
+-- tickets first, which stays fast for very common terms.
+-- Relevance mode is bounded: only the 1000 newest matching tickets
+-- (max_candidates) are ranked, so ts_rank_cd never runs over every match of
+-- a common term. Older matches are only reachable with p_sort 'recent'.
+CREATE OR REPLACE FUNCTION search_tickets(
+    p_query TEXT,
+    p_category ticket_category DEFAULT NULL,
+    p_sentiment ticket_sentiment DEFAULT NULL,
+    p_sort TEXT DEFAULT 'relevance',
+    p_limit INTEGER DEFAULT 20,
+    p_after_rank DOUBLE PRECISION DEFAULT NULL,
+    p_after_created_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    created_at TIMESTAMP WITH TIME ZONE,
+    description TEXT,
+    category ticket_category,
+    sentiment ticket_sentiment,
+    confidence FLOAT,
+    analysis_stage TEXT,
+    processed BOOLEAN,
+    status TEXT,
+    priority TEXT,
+    rank DOUBLE PRECISION,
+    headline TEXT
+)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+AS $$
+#variable_conflict use_column
+DECLARE
+    q tsquery := websearch_to_tsquery('spanish', p_query);
+    max_candidates CONSTANT INTEGER := 1000;
+BEGIN
+    IF p_sort NOT IN ('relevance', 'recent') THEN
+        RAISE EXCEPTION 'Invalid sort: %', p_sort;
+    END IF;
+
+    IF p_sort = 'recent' THEN
+        RETURN QUERY
+        WITH page AS (
+            SELECT t.*
+            FROM tickets t
+            WHERE to_tsvector('spanish', t.description) @@ q
+              AND (p_category IS NULL OR t.category = p_category)
+              AND (p_sentiment IS NULL OR t.sentiment = p_sentiment)
+              AND (p_after_id IS NULL OR (t.created_at, t.id) < (p_after_created_at, p_after_id))
+            ORDER BY t.created_at DESC, t.id DESC
+            LIMIT p_limit
+        )
+        SELECT
+            p.id, p.created_at, p.description, p.category, p.sentiment, p.confidence,
+            p.analysis_stage, p.processed, p.status, p.priority,
+            ts_rank_cd(to_tsvector('spanish', p.description), q)::DOUBLE PRECISION,
+            ts_headline('spanish', p.description, q, 'MaxFragments=1, MaxWords=20, MinWords=8')
+        FROM page p
+        ORDER BY p.created_at DESC, p.id DESC;
+    ELSE
+        RETURN QUERY
+        WITH candidates AS (
+            -- Coincidencias del índice GIN acotadas antes de calcular el rank
+            SELECT t.*
+            FROM tickets t
+            WHERE to_tsvector('spanish', t.description) @@ q
+              AND (p_category IS NULL OR t.category = p_category)
+              AND (p_sentiment IS NULL OR t.sentiment = p_sentiment)
+            ORDER BY t.created_at DESC, t.id DESC
+            LIMIT max_candidates
+        ),
+        matches AS (
+            SELECT c.*, ts_rank_cd(to_tsvector('spanish', c.description), q)::DOUBLE PRECISION AS r
+            FROM candidates c
+        ),
+        page AS (
+            SELECT m.*
+            FROM matches m
+            WHERE p_after_id IS NULL
+               OR (m.r, m.created_at, m.id) < (p_after_rank, p_after_created_at, p_after_id)
+            ORDER BY m.r DESC, m.created_at DESC, m.id DESC
+            LIMIT p_limit
+        )
+        SELECT
+            p.id, p.created_at, p.description, p.category, p.sentiment, p.confidence,
+            p.analysis_stage, p.processed, p.status, p.priority,
+            p.r,
+            ts_headline('spanish', p.description, q, 'MaxFragments=1, MaxWords=20, MinWords=8')
+        FROM page p
+        ORDER BY p.r DESC, p.created_at DESC, p.id DESC;
+    END IF;
+END;
+$$;